@@ -0,0 +1,124 @@
+"""
+Microbenchmark for the script tokenizer.
+
+Parses a synthetic (or real) corpus held in memory with the previous line-by-line parser
+and with processor.scan_script, checks that both produce exactly the same records, and
+reports lines per second for each.
+
+    python -m benchmarks.bench_parser --output bench_parser.json
+"""
+import argparse
+import io
+import random
+import re
+import time
+from src.processor import list_script_files, scan_script
+from src.script_reader import read_script
+from .common import synthetic_corpus, write_results
+
+SCENE_HEADING = re.compile(r'^\d*\s*(INT|EXT)\.')
+
+# Lines that exercise the parser's edge cases: cues that aren't, parentheticals spanning
+# lines, quotes, unusual whitespace, scene headings and blank-looking lines
+TRICKY_LINES = [
+    "DATA", "PICARD", "  WORF  ", "PICARD (V.O.)", "RIKER'S", "INT.", "12  INT. MAIN BRIDGE", "EXT. PLANET",
+    "42", "D4TA", "data", "Data", "LA FORGE", "O'BRIEN", "Q", "ÉCOLE", "---", "",
+    "   ", "\t", "\x0c", " ", "\x85", "Captain, (beat) I believe", "(quietly", "continued) so.",
+    'He said "engage".', "()", "(a) b (c)", "Fascinating.", "\tIndented text\t", "CONTINUED:",
+]
+
+def tricky_script(rng, lines=200):
+    """
+    Returns a random script of lines from TRICKY_LINES, with or without a final newline.
+    """
+    text = "\n".join(rng.choice(TRICKY_LINES) for _ in range(lines))
+    return text + "\n" if rng.random() < 0.5 else text
+
+def reference_scan(text):
+    """
+    The previous parser: readlines(), a split and an uncompiled regex per line, and the
+    dialogue built by string concatenation. Kept as the baseline that scan_script must match.
+    """
+    results = []
+    is_character_line = False
+    current_line = ''
+    current_character = ''
+    cue_line = 0
+    scene = 0
+    for line_number, line in enumerate(io.StringIO(text).readlines()):
+        strippedLine = line.strip()
+        if SCENE_HEADING.match(strippedLine):
+            scene += 1
+        words = strippedLine.split()
+        if len(words) == 1 and not re.search(r'\d', words[0]) and words[0].isupper():
+            is_character_line = True
+            current_character = strippedLine
+            cue_line = line_number
+        elif (line.strip() == '') and is_character_line:
+            is_character_line = False
+            dialog_line = re.sub(r'\(.*?\)', '', current_line).strip()
+            dialog_line = dialog_line.replace('"', "'")
+            if len(dialog_line) > 0:
+                results.append((current_character, scene, cue_line, dialog_line))
+            current_line = ''
+        elif is_character_line:
+            current_line += line.strip() + ' '
+    return results
+
+def load_texts(args):
+    if args.scripts_dir is None:
+        texts = list(synthetic_corpus(args.episodes, args.lines_per_episode, args.seed).values())
+    else:
+        texts = [read_script(file_path)[0] for file_path in list_script_files(args.scripts_dir)]
+    rng = random.Random(args.seed)
+    # A few edge-case scripts, so the output check covers more than the happy path
+    return texts + [tricky_script(rng) for _ in range(args.tricky_scripts)]
+
+def time_parser(parse, texts, runs):
+    """
+    Returns the best time in seconds to parse every text, over runs repetitions.
+    """
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        for text in texts:
+            parse(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(args):
+    texts = load_texts(args)
+    mismatches = [i for i, text in enumerate(texts) if reference_scan(text) != list(scan_script(text))]
+    line_count = sum(len(io.StringIO(text).readlines()) for text in texts)
+    parsers = {"reference": reference_scan, "scan_script": lambda text: list(scan_script(text))}
+    results = {"scripts": len(texts), "lines": line_count, "mismatched_scripts": len(mismatches), "parsers": {}}
+    for name, parse in parsers.items():
+        elapsed = time_parser(parse, texts, args.runs)
+        results["parsers"][name] = {"seconds": elapsed, "lines_per_second": line_count / elapsed}
+        print(f"{name:>12}: {line_count / elapsed:,.0f} lines/s")
+    results["speedup"] = results["parsers"]["reference"]["seconds"] / results["parsers"]["scan_script"]["seconds"]
+    print(f"{'speedup':>12}: {results['speedup']:.2f}x, {len(mismatches)} scripts parsed differently")
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_parser.json")
+    parser.add_argument("--runs", type=int, default=5, help="passes over the corpus; the fastest counts")
+    parser.add_argument("--scripts-dir", help="parse real scripts instead of a synthetic corpus")
+    parser.add_argument("--episodes", type=int, default=200)
+    parser.add_argument("--lines-per-episode", type=int, default=400)
+    parser.add_argument("--tricky-scripts", type=int, default=50, help="edge-case scripts added to the corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    write_results(results, args.output)
+    print(f"Results written to {args.output}")
+    if results["mismatched_scripts"]:
+        raise SystemExit("scan_script output differs from the reference parser")
+
+if __name__ == "__main__":
+    main()
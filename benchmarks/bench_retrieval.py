@@ -0,0 +1,182 @@
+"""
+Recall-vs-latency benchmark for the retrieval layer.
+
+Builds every index type for every chunking strategy from a synthetic (or real) dialogue
+corpus with offline hashing embeddings, then measures build time, index size, query
+latency percentiles, QPS across thread counts and recall@k against exact search.
+
+    python -m benchmarks.bench_retrieval --output bench_retrieval.json
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import faiss
+import numpy as np
+from langchain_experimental.text_splitter import SemanticChunker
+from src.chunking import scene_spans
+from src.index_factory import INDEX_TYPES, default_index_config, train_index, set_search_params
+from src.processor import collect_dialogues
+from src.rerank import estimate_tokens
+from src.vector_store import split_text
+from .common import HashingEmbeddings, synthetic_corpus, write_corpus, percentiles, write_results
+
+CHUNKING_STRATEGIES = ("scene", "recursive", "semantic", "lines")
+
+def chunk_texts(records, strategy, embeddings):
+    """
+    Returns the chunk texts for the parsed records using the given chunking strategy.
+    """
+    if strategy == "lines":
+        return records.texts()
+    chunks = []
+    for code, episode in enumerate(records.episode_names):
+        if strategy == "scene":
+            positions = [i for i in range(len(records)) if records.episodes[i] == code]
+            texts = [records.text(i) for i in positions]
+            spans = scene_spans(texts, [records.scenes[i] for i in positions])
+            chunks.extend("\n".join(texts[start:end]) for start, end in spans)
+            continue
+        text = "\n".join(records.texts(episode=episode))
+        if strategy == "recursive":
+            docs = split_text(text)
+        elif strategy == "semantic":
+            docs = SemanticChunker(embeddings, breakpoint_threshold_type="percentile").create_documents([text])
+        else:
+            raise ValueError(f"Unknown chunking strategy '{strategy}'")
+        chunks.extend(doc.page_content for doc in docs)
+    return chunks
+
+def make_queries(records, count, seed=0):
+    """
+    Samples dialogue lines and keeps a random half of their words, like a half-remembered quote.
+    """
+    rng = random.Random(seed)
+    texts = records.texts()
+    queries = []
+    for text in rng.sample(texts, min(count, len(texts))):
+        words = text.split()
+        queries.append(" ".join(rng.sample(words, max(1, len(words) // 2))))
+    return queries
+
+def measure_qps(index, query_vectors, k, threads):
+    """
+    Runs every query once from a pool of threads and returns queries per second.
+    """
+    def search(i):
+        index.search(query_vectors[i:i + 1], k)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(search, range(len(query_vectors))))
+    return len(query_vectors) / (time.perf_counter() - start)
+
+def benchmark_index(index_type, vectors, query_vectors, exact_ids, args):
+    config = default_index_config(index_type)
+    for key in ("nlist", "nprobe", "ef_search", "hnsw_m", "pq_m"):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    start = time.perf_counter()
+    index = train_index(vectors.shape[1], config, vectors)
+    index.add(vectors)
+    build_seconds = time.perf_counter() - start
+    set_search_params(index, config["nprobe"], config["ef_search"])
+
+    latencies = []
+    found = []
+    for i in range(len(query_vectors)):
+        start = time.perf_counter()
+        _, ids = index.search(query_vectors[i:i + 1], args.k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0])
+
+    recall = np.mean([
+        len(set(f[f >= 0]) & set(e[e >= 0])) / max(1, len(e[e >= 0]))
+        for f, e in zip(found, exact_ids)
+    ])
+    return {
+        "index_type": index_type,
+        "params": config,
+        "build_seconds": build_seconds,
+        "index_bytes": int(faiss.serialize_index(index).nbytes),
+        "latency_ms": percentiles(latencies),
+        "qps": {str(threads): measure_qps(index, query_vectors, args.k, threads) for threads in args.threads},
+        f"recall_at_{args.k}": float(recall),
+    }
+
+def run(args):
+    faiss.omp_set_num_threads(1)  # Measure concurrency with our threads, not OpenMP's
+    embeddings = HashingEmbeddings(args.dim)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scripts_dir = args.scripts_dir
+        if scripts_dir is None:
+            scripts_dir = os.path.join(tmp, "scripts")
+            write_corpus(synthetic_corpus(args.episodes, args.lines_per_episode, args.seed), scripts_dir)
+        records = collect_dialogues(scripts_dir)
+
+    queries = make_queries(records, args.queries, args.seed)
+    query_vectors = np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+
+    results = []
+    for strategy in args.chunking:
+        start = time.perf_counter()
+        chunks = chunk_texts(records, strategy, embeddings)
+        vectors = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+        chunk_seconds = time.perf_counter() - start
+
+        exact = faiss.IndexFlatL2(vectors.shape[1])
+        exact.add(vectors)
+        _, exact_ids = exact.search(query_vectors, args.k)
+
+        for index_type in args.index_types:
+            result = benchmark_index(index_type, vectors, query_vectors, exact_ids, args)
+            result.update({
+                "chunking": strategy, "chunks": len(chunks), "chunk_and_embed_seconds": chunk_seconds,
+                "embedded_tokens": sum(estimate_tokens(chunk) for chunk in chunks),
+            })
+            results.append(result)
+            print(f"{strategy:>9} {index_type:>6}: recall@{args.k}={result[f'recall_at_{args.k}']:.3f} "
+                  f"p50={result['latency_ms']['p50']:.3f}ms build={result['build_seconds']:.2f}s")
+
+    return {
+        "corpus": {
+            "source": args.scripts_dir or "synthetic",
+            "dialogue_lines": len(records),
+            "episodes": len(records.episode_names),
+            "queries": len(queries),
+        },
+        "k": args.k,
+        "results": results,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_retrieval.json")
+    parser.add_argument("--scripts-dir", help="benchmark on real scripts instead of a synthetic corpus")
+    parser.add_argument("--episodes", type=int, default=40)
+    parser.add_argument("--lines-per-episode", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--chunking", nargs="+", choices=CHUNKING_STRATEGIES, default=list(CHUNKING_STRATEGIES))
+    parser.add_argument("--nlist", type=int)
+    parser.add_argument("--nprobe", type=int)
+    parser.add_argument("--ef-search", type=int)
+    parser.add_argument("--hnsw-m", type=int)
+    parser.add_argument("--pq-m", type=int)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    write_results(results, args.output)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark for semantic chunking at ingest.
+
+Indexes a synthetic (or real) corpus with semantic chunking twice: with LangChain's
+SemanticChunker, whose chunks are then embedded again to build the index, and with
+PooledEmbeddings, which embeds each sentence once and indexes the chunks with the mean of
+their sentences' vectors. Reports the texts and tokens embedded, embedding requests, wall
+time and how often a sentence finds its own chunk. Embeddings are offline hashing vectors
+with a simulated per-token latency standing in for the embedding server.
+
+    python -m benchmarks.bench_semantic --output bench_semantic.json
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_experimental.text_splitter import SemanticChunker
+from src.chunking import PooledEmbeddings, sentence_spans
+from src.config import SEMANTIC_BREAKPOINT_PERCENTILE
+from src.index_factory import default_index_config
+from src.processor import collect_dialogues
+from src.rerank import estimate_tokens
+from src.vector_store import add_documents_batched
+from .common import HashingEmbeddings, synthetic_corpus, write_corpus, write_results
+
+class CountingEmbeddings(Embeddings):
+    """
+    Counts the requests, texts and estimated tokens sent to the wrapped embeddings,
+    sleeping latency seconds per token to mimic an embedding server.
+    """
+
+    def __init__(self, embeddings, latency=0.0):
+        self.embeddings = embeddings
+        self.latency = latency
+        self.requests = 0
+        self.texts = 0
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        tokens = sum(estimate_tokens(text) for text in texts)
+        with self._lock:
+            self.requests += 1
+            self.texts += len(texts)
+            self.tokens += tokens
+        time.sleep(self.latency * tokens)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+def semantic_chunker_index(texts, embeddings, percentile):
+    docs = []
+    splitter = SemanticChunker(embeddings, breakpoint_threshold_type="percentile",
+                               breakpoint_threshold_amount=percentile)
+    for text in texts:
+        docs.extend(splitter.create_documents([text]))
+    return add_documents_batched(None, docs, embeddings=embeddings, index_config=default_index_config("flat"))
+
+def pooled_index(texts, embeddings, percentile):
+    pooled = PooledEmbeddings(embeddings, percentile=percentile)
+    docs = [Document(page_content=chunk) for text in texts for chunk in pooled.semantic_chunks(text)]
+    return add_documents_batched(None, docs, embeddings=pooled, index_config=default_index_config("flat"))
+
+def hit_rate(vector_store, queries, k):
+    """
+    Returns the fraction of sentences found in one of the k chunks retrieved for them.
+    """
+    hits = sum(
+        any(query in doc.page_content for doc in vector_store.similarity_search(query, k=k)) for query in queries
+    )
+    return hits / len(queries)
+
+def run(args):
+    if args.scripts_dir is None:
+        with tempfile.TemporaryDirectory() as scripts_dir:
+            write_corpus(synthetic_corpus(args.episodes, args.lines_per_episode, args.seed), scripts_dir)
+            records = collect_dialogues(scripts_dir)
+    else:
+        records = collect_dialogues(args.scripts_dir)
+    texts = ["\n".join(records.texts(episode=episode)) for episode in records.episode_names]
+    sentences = [text[start:end] for text in texts for start, end in sentence_spans(text)]
+    queries = random.Random(args.seed).sample(sentences, min(args.queries, len(sentences)))
+
+    results = {"episodes": len(texts), "sentences": len(sentences), "modes": {}}
+    for name, build in [("semantic_chunker", semantic_chunker_index), ("pooled", pooled_index)]:
+        embeddings = CountingEmbeddings(HashingEmbeddings(args.dim), args.token_latency / 1e6)
+        start = time.perf_counter()
+        vector_store = build(texts, embeddings, args.percentile)
+        elapsed = time.perf_counter() - start
+        results["modes"][name] = {
+            "seconds": elapsed,
+            "chunks": vector_store.index.ntotal,
+            "embedded_texts": embeddings.texts,
+            "embedded_tokens": embeddings.tokens,
+            "embedding_requests": embeddings.requests,
+            f"hit_rate_at_{args.k}": hit_rate(vector_store, queries, args.k),
+        }
+        print(f"{name:>16}: {elapsed:.2f}s, {vector_store.index.ntotal} chunks, {embeddings.texts} texts "
+              f"({embeddings.tokens} tokens) embedded in {embeddings.requests} requests, hit@{args.k}={results['modes'][name][f'hit_rate_at_{args.k}']:.3f}")
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_semantic.json")
+    parser.add_argument("--scripts-dir", help="index real scripts instead of a synthetic corpus")
+    parser.add_argument("--episodes", type=int, default=20)
+    parser.add_argument("--lines-per-episode", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--token-latency", type=float, default=20.0,
+                        help="simulated embedding time per token in microseconds")
+    parser.add_argument("--percentile", type=float, default=SEMANTIC_BREAKPOINT_PERCENTILE)
+    parser.add_argument("--queries", type=int, default=200, help="sentences searched for the hit rate")
+    parser.add_argument("--k", type=int, default=5)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    write_results(results, args.output)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Load test for server mode.
+
+Starts the chat server in-process on a synthetic index with offline hashing embeddings
+and the stub LLM (or targets a running server with --url), then drives it with
+increasing numbers of concurrent clients and measures throughput, latency and time to
+first token percentiles and how many requests were turned away.
+
+    python -m benchmarks.bench_server --concurrency 1 8 32 --output bench_server.json
+    python -m benchmarks.bench_server --no-tracing   # to measure what tracing costs
+    python main.py --serve --stub-llm &  python -m benchmarks.bench_server --url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import aiohttp
+from aiohttp import web
+from langchain_community.vectorstores import FAISS
+from src.chatbot import build_rag_chain, StubChatModel
+from src.processor import collect_dialogues
+from src.server import ChatServer
+from src.tracing import Tracer, set_tracer
+from src.web_search import SearchService, FixtureBackend, set_search_service
+from src.vector_store import split_text
+from .bench_retrieval import make_queries
+from .common import HashingEmbeddings, synthetic_corpus, write_corpus, percentiles, write_results
+
+def build_chain(records, args):
+    """
+    Returns an agent over an in-memory index of the records that answers with the stub LLM.
+    """
+    chunks = []
+    for episode in records.episode_names:
+        chunks.extend(doc.page_content for doc in split_text("\n".join(records.texts(episode=episode))))
+    vector_store = FAISS.from_texts(chunks, HashingEmbeddings(args.dim))
+    chain = build_rag_chain(
+        vector_store.as_retriever(search_kwargs={"k": args.k}),
+        llm=StubChatModel(latency=args.llm_latency, token_delay=args.token_delay),
+    )
+    chain.verbose = False
+    return chain
+
+async def drive(url, queries, concurrency, requests):
+    """
+    Sends requests questions to url from concurrency clients, one at a time per client.
+    """
+    latencies, ttfts, statuses = [], [], {}
+    remaining = iter(range(requests))
+
+    async def client(session):
+        for i in remaining:
+            start = time.perf_counter()
+            async with session.post(f"{url}/chat", json={"question": queries[i % len(queries)]}) as response:
+                body = await response.json()
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+            if response.status == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+                if body.get("ttft") is not None:
+                    ttfts.append(body["ttft"] * 1000)
+
+    start = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[client(session) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": statuses.get(200, 0),
+        "rejected": statuses.get(503, 0),
+        "errors": requests - statuses.get(200, 0) - statuses.get(503, 0),
+        "throughput_rps": statuses.get(200, 0) / elapsed,
+        "latency_ms": percentiles(latencies),
+        "ttft_ms": percentiles(ttfts),
+    }
+
+async def run_load(args, queries, chain=None):
+    runner = None
+    url = args.url
+    if url is None:
+        server = ChatServer(chain, workers=args.workers, queue_size=args.queue_size)
+        runner = web.AppRunner(server.make_app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        url = f"http://{host}:{port}"
+    try:
+        results = []
+        for concurrency in args.concurrency:
+            result = await drive(url, queries, concurrency, args.requests_per_client * concurrency)
+            results.append(result)
+            print(f"{concurrency:>4} clients: {result['throughput_rps']:.1f} req/s "
+                  f"p50={result['latency_ms']['p50'] or 0:.0f}ms ok={result['ok']} rejected={result['rejected']}")
+        return results
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        scripts_dir = args.scripts_dir
+        if scripts_dir is None:
+            scripts_dir = os.path.join(tmp, "scripts")
+            write_corpus(synthetic_corpus(args.episodes, args.lines_per_episode, args.seed), scripts_dir)
+        records = collect_dialogues(scripts_dir)
+
+    queries = make_queries(records, args.queries, args.seed)
+    chain = None
+    if args.url is None:
+        # The agent prefetches web searches; keep them offline, with a simulated network delay
+        set_search_service(SearchService(FixtureBackend({"*": []}, latency=args.search_latency)))
+        # Metrics only: traces written to disk would measure the disk
+        set_tracer(Tracer(enabled=args.tracing))
+        chain = build_chain(records, args)
+    results = asyncio.run(run_load(args, queries, chain))
+    return {
+        "target": args.url or "in-process",
+        "server": None if args.url else {"workers": args.workers, "queue_size": args.queue_size},
+        "llm": None if args.url else {"latency": args.llm_latency, "token_delay": args.token_delay},
+        "search_latency": None if args.url else args.search_latency,
+        "tracing": None if args.url else args.tracing,
+        "results": results,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_server.json")
+    parser.add_argument("--url", help="load test a running server instead of an in-process one")
+    parser.add_argument("--scripts-dir", help="index real scripts instead of a synthetic corpus")
+    parser.add_argument("--episodes", type=int, default=10)
+    parser.add_argument("--lines-per-episode", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests-per-client", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=32)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="stub LLM seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="stub LLM seconds between tokens")
+    parser.add_argument("--no-tracing", dest="tracing", action="store_false", help="serve without tracing turns")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="simulated web search seconds")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    write_results(results, args.output)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Cold start benchmark for the CLI.
+
+Builds a synthetic index with offline hashing embeddings, then starts the chatbot in
+fresh interpreters and measures the time until it prints "Ready!" and until the index
+and agent, which load in the background, are ready to answer. Also times importing the
+main modules and running `ingest.py --help`. Nothing is sent to Ollama: the chatbot is
+quit as soon as it has loaded.
+
+    python -m benchmarks.bench_startup --runs 5 --output bench_startup.json
+    python -m benchmarks.bench_startup --profile-imports   # the slowest imports at startup
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from src.pipeline import incremental_ingest
+from .common import HashingEmbeddings, synthetic_corpus, write_corpus, percentiles, write_results
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Starts main.py with the index, caches and traces redirected to a scratch directory
+STARTUP_SCRIPT = """
+import sys
+import src.config as config
+config.INDEX_PATH = {index_path!r}
+config.EMBEDDING_CACHE_DIR = {cache_dir!r}
+config.ANSWER_CACHE_PATH = {answer_cache_path!r}
+config.TRACE_PATH = None
+import main
+load_chatbot = main.load_chatbot
+def timed_load_chatbot(*args):
+    loaded = load_chatbot(*args)
+    print("\\nLoaded!", flush=True)
+    return loaded
+main.load_chatbot = timed_load_chatbot
+sys.argv = ["main.py"] + {argv!r}
+main.main()
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+def startup_command(work_dir, argv):
+    script = STARTUP_SCRIPT.format(
+        index_path=os.path.join(work_dir, "faiss_index"),
+        cache_dir=os.path.join(work_dir, "embedding_cache"),
+        answer_cache_path=os.path.join(work_dir, "answer_cache.json"),
+        argv=argv,
+    )
+    return [sys.executable, "-u", "-c", script]
+
+def time_until(command, marker):
+    """
+    Runs the chatbot and returns the seconds until it printed a line starting with
+    marker, then quits it.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True)
+    try:
+        for line in process.stdout:
+            if line.startswith(marker):
+                elapsed = time.perf_counter() - start
+                process.communicate("quit\n", timeout=60)
+                return elapsed
+        raise RuntimeError(f"The chatbot exited with {process.wait()} before printing {marker!r}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+def time_command(command):
+    start = time.perf_counter()
+    subprocess.run(command, cwd=PROJECT_ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def profile_imports(command, top=20):
+    """
+    Runs command under -X importtime and returns its slowest imports, as (module,
+    cumulative ms, own ms) tuples, and the total import time in ms.
+    """
+    command = [command[0], "-X", "importtime", *command[1:]]
+    process = subprocess.run(command, cwd=PROJECT_ROOT, input="quit\n", capture_output=True, text=True)
+    imports = []
+    total = 0
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            imports.append((module, int(cumulative) / 1000, int(own) / 1000))
+            if len(indent) == 1:  # Top-level imports; their cumulative times add up to the total
+                total += int(cumulative) / 1000
+    return sorted(imports, key=lambda item: -item[1])[:top], total
+
+def build_index(work_dir, args):
+    scripts_dir = args.scripts_dir
+    if scripts_dir is None:
+        scripts_dir = os.path.join(work_dir, "scripts")
+        write_corpus(synthetic_corpus(args.episodes, args.lines_per_episode, args.seed), scripts_dir)
+    incremental_ingest(scripts_dir, os.path.join(work_dir, "faiss_index"), None, workers=1,
+                       embeddings=HashingEmbeddings(args.dim))
+
+def run(args):
+    with tempfile.TemporaryDirectory() as work_dir:
+        build_index(work_dir, args)
+        chat = startup_command(work_dir, ["--no-cache"])
+        stub_chat = startup_command(work_dir, ["--no-cache", "--stub-llm"])
+        if args.profile_imports:
+            imports, total = profile_imports(chat, args.top)
+            return {"import_ms": total, "slowest_imports": [
+                {"module": module, "cumulative_ms": cumulative, "own_ms": own} for module, cumulative, own in imports
+            ]}
+
+        commands = {
+            "python": lambda: time_command([sys.executable, "-c", "pass"]),
+            "import_chatbot": lambda: time_command([sys.executable, "-c", "import src.chatbot"]),
+            "import_vector_store": lambda: time_command([sys.executable, "-c", "import src.vector_store"]),
+            "ingest_help": lambda: time_command([sys.executable, "ingest.py", "--help"]),
+            "ready": lambda: time_until(chat, "Ready!"),
+            "loaded": lambda: time_until(chat, "Loaded!"),
+            "loaded_stub_llm": lambda: time_until(stub_chat, "Loaded!"),
+        }
+        results = {}
+        for name, measure in commands.items():
+            samples = [measure() * 1000 for _ in range(args.runs)]
+            results[name] = {"min_ms": min(samples), **percentiles(samples, (50, 95))}
+            print(f"{name:>20}: p50={results[name]['p50']:.0f}ms min={results[name]['min_ms']:.0f}ms")
+        _, results["import_ms"] = profile_imports(chat, 0)
+        return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_startup.json")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters started per measurement")
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="print the slowest imports until the chatbot has loaded instead of timing startup")
+    parser.add_argument("--top", type=int, default=20, help="imports listed by --profile-imports")
+    parser.add_argument("--scripts-dir", help="index real scripts instead of a synthetic corpus")
+    parser.add_argument("--episodes", type=int, default=10)
+    parser.add_argument("--lines-per-episode", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=256)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    if args.profile_imports:
+        print(f"{results['import_ms']:.0f}ms importing modules until loaded; slowest:")
+        for item in results["slowest_imports"]:
+            print(f"  {item['cumulative_ms']:8.1f}ms {item['own_ms']:8.1f}ms  {item['module']}")
+    write_results(results, args.output)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Shared helpers for the benchmarks: an offline embedding model, a synthetic dialogue
+corpus and result reporting.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+SPEAKERS = ["PICARD", "DATA", "RIKER", "WORF", "TROI", "CRUSHER", "LAFORGE"]
+WORDS = (
+    "captain android starship enterprise warp core shields phaser sensor anomaly borg "
+    "romulan klingon federation prime directive holodeck engineering bridge away team "
+    "transporter emotion human curious stardate nebula subspace signal treaty diplomacy "
+    "command officer ensign crew logic probability fascinating understand humor friendship "
+    "duty honor question answer course heading engage report analysis temporal"
+).split()
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings using feature hashing. Texts that share words
+    end up close together, so retrieval behaves sensibly without an embedding server.
+    """
+
+    def __init__(self, size=256):
+        self.size = size
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in re.findall(r"[a-z']+", text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), "little")
+            vector[digest % self.size] += 1.0 if (digest >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+def synthetic_corpus(episodes=40, lines_per_episode=120, seed=0):
+    """
+    Returns {episode name: script text} with randomly generated dialogue in the script
+    format the processor parses.
+    """
+    rng = random.Random(seed)
+    corpus = {}
+    for episode in range(episodes):
+        scene = []
+        for number in range(lines_per_episode):
+            if number % 20 == 0:
+                scene.append(f"{number // 20 + 1}  INT. MAIN BRIDGE\n")
+            words = rng.choices(WORDS, k=rng.randint(6, 24))
+            scene.append(f"{rng.choice(SPEAKERS)}\n{' '.join(words).capitalize()}.\n")
+        corpus[f"episode{episode:03d}.txt"] = "\n".join(scene) + "\n"
+    return corpus
+
+def write_corpus(corpus, directory):
+    """
+    Writes a corpus from synthetic_corpus to script files in directory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, text in corpus.items():
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+def percentiles(samples, points=(50, 95, 99)):
+    """
+    Returns {"p50": ..., ...} for a list of samples.
+    """
+    if not samples:
+        return {f"p{p}": None for p in points}
+    values = np.percentile(np.asarray(samples), points)
+    return {f"p{p}": float(v) for p, v in zip(points, values)}
+
+def write_results(results, path):
+    """
+    Writes benchmark results as stable, diffable JSON.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
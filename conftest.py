@@ -4,6 +4,7 @@ Pytest configuration and shared fixtures.
 import pytest
 import sys
 import os
+from unittest.mock import patch
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -37,3 +38,22 @@ WORF
 Shields are at maximum.
 
 """
+
+
+@pytest.fixture
+def fake_embeddings():
+    """Patch the embeddings client with a deterministic offline fake."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    embeddings = DeterministicFakeEmbedding(size=16)
+    with patch('src.vector_store.get_embeddings', return_value=embeddings):
+        yield embeddings
+
+
+@pytest.fixture(autouse=True)
+def isolated_tracer():
+    """Trace into a fresh in-memory tracer, so tests neither share metrics nor write trace files."""
+    from src.tracing import Tracer, set_tracer
+    tracer = Tracer()
+    set_tracer(tracer)
+    yield tracer
+    set_tracer(None)
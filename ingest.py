@@ -1,42 +1,74 @@
-from src.config import SCRIPTS_DIR, DATA_OUTPUT_PATH
-from src.processor import process_directory, save_dialogues
-from src.vector_store import create_index_semantic  # or create_index_recursive
+import argparse
+from src.config import (
+    SCRIPTS_DIR, DATA_OUTPUT_PATH, INDEX_PATH, INGEST_WORKERS, CHARACTERS, INDEX_TYPE, SHARD_KEYS, SHARD_BY,
+    SHARDS_PATH, SERIES_DIRS
+)
+from src.index_factory import INDEX_TYPES, default_index_config
+
+def print_progress(done):
+    print(f"\r  embedded {done} chunks", end="", flush=True)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parse TNG scripts and build the vector index.")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and rebuild from scratch")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE, help="FAISS index type")
+    parser.add_argument("--shard-by", choices=SHARD_KEYS, default=SHARD_BY,
+                        help=f"build one index shard per series or season under '{SHARDS_PATH}'")
+    parser.add_argument("--shard", action="append", metavar="NAME",
+                        help="only rebuild this shard (repeatable), e.g. tng-season3")
+    return parser.parse_args()
+
+def print_decodings(decodings):
+    for file_path, decoding in sorted(decodings.items()):
+        if decoding.substitutions:
+            print(f"  warning: {file_path} has {decoding.substitutions} undecodable byte sequences "
+                  f"({decoding.encoding}), replaced")
+        else:
+            print(f"  warning: {file_path} is not UTF-8, decoded as {decoding.encoding}")
+
+def ingest_sharded(args):
+    from src.shards import ingest_shards
+    print(f"Processing scripts of {', '.join(SERIES_DIRS)} into shards by {args.shard_by}...")
+    results = ingest_shards(SHARDS_PATH, SERIES_DIRS, args.shard_by, only=args.shard, full=args.full,
+                            characters=CHARACTERS, workers=INGEST_WORKERS, progress=print_progress,
+                            index_config=default_index_config(args.index_type))
+    print()
+    for name, result in results.items():
+        if result is None:
+            print(f"  {name}: removed, no scripts left")
+        else:
+            print(f"  {name}: {len(result.changed_files)} new or changed scripts, {len(result.deleted_files)} removed, "
+                  f"{result.added_chunks} chunks embedded, {result.removed_chunks} deleted")
+            print_decodings(result.decodings)
+    print(f"Shards saved to '{SHARDS_PATH}'.")
 
 def main():
+    args = parse_args()
+    # Imported after parsing, so --help doesn't wait for LangChain and FAISS to load
+    from src.pipeline import incremental_ingest
+    from src.vector_store import embedding_cache_stats
+    if args.shard_by is not None:
+        ingest_sharded(args)
+        return
+
     print(f"Processing scripts from {SCRIPTS_DIR}...")
-    # 1. Extract dialogues
-    dialogues = process_directory(SCRIPTS_DIR, 'DATA')
-    print(f"Extracted {len(dialogues)} lines.")
-    
-    # 2. Save processed data
-    save_dialogues(dialogues, DATA_OUTPUT_PATH)
-    print(f"Saved processed data to {DATA_OUTPUT_PATH}")
-    
-    # 3. Create Vector Store (Optional step here, or could be separate)
-    # Reading back the file to ensure we process exactly what was saved
-    with open(DATA_OUTPUT_PATH, encoding="utf-8") as f:
-        data_lines = f.read()
-
-    print("Creating vector index...")
-    # Using semantic chunking as per original script
-    # Note: Original script had recursive splitting AFTER semantic? 
-    # Let's check the original script logic.
-    # Original: 
-    # 1. SemanticChunker to create docs (lines 86-92 in original file shown in Step 151 actually shows Recursive replacing Semantic??)
-    # Wait, in Step 151, lines 77-80 create SemanticChunker, then line 86 reassigns text_splitter to RecursiveCharacterTextSplitter.
-    # The 'docs' are created using the Recursive splitter (line 92).
-    # So the SemanticChunker was unused code in the final version of the user's file.
-    
-    # I should check src/vector_store.py again. I implemented both.
-    # I'll use Recursive to match the effective logic of the user's script.
-    
-    from src.vector_store import create_index_recursive, save_index
-    
-    vector_store = create_index_recursive(data_lines)
-    
-    # Save index locally for main.py to use
-    save_index(vector_store, "faiss_index")
-    print("Vector index created and saved to 'faiss_index'.")
+    # The processed dump is only rewritten when every script is re-parsed
+    result = incremental_ingest(SCRIPTS_DIR, INDEX_PATH, CHARACTERS, workers=INGEST_WORKERS, full=args.full,
+                                progress=print_progress, dump_path=DATA_OUTPUT_PATH,
+                                index_config=default_index_config(args.index_type))
+    print()
+    print(f"Parsed {len(result.changed_files)} new or changed scripts, {len(result.deleted_files)} removed.")
+    print(f"Extracted {result.dialogue_lines} lines for {result.speakers} speakers.")
+    print_decodings(result.decodings)
+    for file_path, elapsed in sorted(result.timings.items(), key=lambda item: item[1], reverse=True)[:5]:
+        print(f"  slowest: {file_path} ({elapsed:.3f}s)")
+
+    print(f"Embedded {result.added_chunks} new chunks, removed {result.removed_chunks} stale chunks.")
+    print(f"Vector index saved to '{INDEX_PATH}'.")
+    stats = embedding_cache_stats()
+    print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries.")
+    if result.peak_rss_mb is not None:
+        print(f"Peak RSS: {result.peak_rss_mb:.1f} MB")
 
 if __name__ == "__main__":
     main()
@@ -1,29 +1,159 @@
-from src.vector_store import load_index
-from src.chatbot import build_rag_chain, query_chain
+import argparse
+import atexit
+import logging
+import threading
+from src.config import (
+    INDEX_PATH, RETRIEVER_K, INDEX_MMAP, HYBRID_RETRIEVAL, RERANK, RERANK_SCORER, ANSWER_CACHE_PATH,
+    ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_SAVE_INTERVAL,
+    QUERY_ROUTER, SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_QUEUE_SIZE, SHARD_BY, SHARDS_PATH,
+    SHARD_REFRESH_INTERVAL
+)
 import os
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Chat with Lt. Commander Data about TNG.")
+    parser.add_argument("--k", type=int, default=RETRIEVER_K,
+                        help="chunks retrieved per query (candidates, when reranking)")
+    parser.add_argument("--nprobe", type=int, help="IVF lists searched per query (higher: better recall, slower)")
+    parser.add_argument("--ef-search", type=int, help="HNSW search beam width (higher: better recall, slower)")
+    parser.add_argument("--no-mmap", dest="mmap", action="store_false", default=INDEX_MMAP,
+                        help="read the whole index into memory instead of memory-mapping it")
+    parser.add_argument("--no-hybrid", dest="hybrid", action="store_false", default=HYBRID_RETRIEVAL,
+                        help="use vector search only, without BM25 keyword search")
+    parser.add_argument("--no-rerank", dest="rerank", action="store_false", default=RERANK,
+                        help="pass the retrieved chunks to the model as they are, without reranking and trimming")
+    parser.add_argument("--rerank-scorer", choices=["lexical", "embedding", "cross-encoder"], default=RERANK_SCORER)
+    parser.add_argument("--sharded", action="store_true", default=SHARD_BY is not None,
+                        help=f"search the index shards in '{SHARDS_PATH}' built with 'ingest.py --shard-by'")
+    parser.add_argument("--no-router", dest="router", action="store_false", default=QUERY_ROUTER,
+                        help="send every question through the agent, even plain script lookups")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", help="don't reuse earlier answers")
+    parser.add_argument("--show-steps", action="store_true", help="print the agent's tool calls as they happen")
+    parser.add_argument("--serve", action="store_true", help="serve concurrent chat sessions over HTTP/WebSocket")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="agent runs executing at once")
+    parser.add_argument("--queue-size", type=int, default=SERVER_QUEUE_SIZE,
+                        help="questions allowed to wait for a worker before new ones are refused")
+    parser.add_argument("--stub-llm", action="store_true",
+                        help="answer with a canned offline model instead of Ollama (for load tests)")
+    return parser.parse_args()
+
+def load_chatbot(args, index_path):
+    """
+    Loads the index and builds the agent and the answer cache; returns (chain, cache).
+    LangChain, FAISS and Ollama are imported here rather than at the top of the module.
+    """
+    from src.vector_store import load_index, get_embeddings
+    from src.chatbot import build_rag_chain, build_routed_chain, StubChatModel
+    from src.answer_cache import AnswerCache, index_fingerprint
+    from src.retrievers import build_retriever
+
+    if args.sharded:
+        from src.shards import build_sharded_retriever
+        # Shards are loaded as questions need them
+        retriever = build_sharded_retriever(
+            SHARDS_PATH, args.k, hybrid=args.hybrid, rerank=args.rerank, scorer=args.rerank_scorer, mmap=args.mmap,
+            nprobe=args.nprobe, ef_search=args.ef_search
+        )
+    else:
+        vector_store = load_index(INDEX_PATH, nprobe=args.nprobe, ef_search=args.ef_search, mmap=args.mmap)
+        retriever = build_retriever(
+            vector_store, INDEX_PATH, args.k, hybrid=args.hybrid, rerank=args.rerank, scorer=args.rerank_scorer
+        )
+
+    llm = StubChatModel() if args.stub_llm else None
+    chain = build_rag_chain(retriever, llm=llm)
+    # The answer is streamed instead; LangChain's verbose trace would interleave with it
+    chain.verbose = False
+    if args.router:
+        chain = build_routed_chain(chain, retriever, llm=llm)
+    cache = None
+    if args.cache:
+        cache = AnswerCache(
+            ANSWER_CACHE_PATH, index_fingerprint(index_path), get_embeddings(), ANSWER_CACHE_TTL,
+            ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY,
+            # Answers from before a shard is rebuilt and swapped in are dropped
+            fingerprint_source=lambda: index_fingerprint(index_path), check_interval=SHARD_REFRESH_INTERVAL,
+            save_interval=ANSWER_CACHE_SAVE_INTERVAL
+        )
+        # Answers since the last (throttled) save are written on the way out
+        atexit.register(cache.flush)
+    return chain, cache
+
+def load_in_background(args, index_path):
+    """
+    Starts load_chatbot in a daemon thread, so quitting never waits for it, and returns
+    a function that waits for its (chain, cache) and raises what it raised.
+    """
+    done = threading.Event()
+    result = {}
+
+    def run():
+        try:
+            result["value"] = load_chatbot(args, index_path)
+        except Exception as e:
+            result["error"] = e
+        finally:
+            done.set()
+
+    threading.Thread(target=run, name="load-chatbot", daemon=True).start()
+
+    def wait():
+        done.wait()
+        if "error" in result:
+            raise result["error"]
+        return result["value"]
+
+    return wait
+
 def main():
-    if not os.path.exists("faiss_index"):
+    args = parse_args()
+    index_path = SHARDS_PATH if args.sharded else INDEX_PATH
+    if not os.path.exists(index_path):
         print("Index not found. Please run 'python ingest.py' first.")
         return
 
-    print("Loading index...")
-    vector_store = load_index("faiss_index")
-    retriever = vector_store.as_retriever(search_kwargs={"k": 10})
-    
-    print("Building brain...")
-    chain = build_rag_chain(retriever)
-    
+    if args.serve:
+        from src.server import run_server
+        print("Loading index...")
+        chain, cache = load_chatbot(args, index_path)
+        # Requests and routing decisions are logged
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+        run_server(chain, cache, args.host, args.port, args.workers, args.queue_size)
+        return
+
+    # The index and the agent load in the background while the first question is typed
+    loading = load_in_background(args, index_path)
     print("Ready! Ask Data a question (or type 'quit' to exit).")
+    from src.chatbot import stream_chain
     
     while True:
         user_input = input("\nYou: ")
         if user_input.lower() in ["quit", "exit"]:
             break
-        
+
+        try:
+            chain, cache = loading()
+        except Exception as e:
+            print(f"Could not load the index: {e}")
+            return
+
         try:
-            answer = query_chain(chain, user_input)
-            print(f"Data: {answer}")
+            print("Data: ", end="", flush=True)
+            streamed = False
+            for kind, payload in stream_chain(chain, user_input, cache):
+                if kind == "token":
+                    print(payload, end="", flush=True)
+                    streamed = True
+                elif kind == "step" and args.show_steps and not streamed:
+                    print(f"\n  [{payload}]", end="", flush=True)
+                elif kind == "done":
+                    if not streamed and payload["output"]:
+                        print(payload["output"], end="")
+                    ttft = f"{payload['ttft']:.2f}s" if payload["ttft"] is not None else "n/a"
+                    route = f"{payload['route']} route, " if payload["route"] else ""
+                    print(f"\n  ({route}first token {ttft}, total {payload['elapsed']:.2f}s)")
         except Exception as e:
             print(f"Error: {e}")
 
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from .config import LLM_MODEL_NAME, EMBEDDING_MODEL_NAME
+
+def normalize_question(question):
+    """
+    Lowercases the question, collapses whitespace and drops surrounding punctuation.
+    """
+    return re.sub(r"\s+", " ", question.lower()).strip(" \t?!.,;:'\"")
+
+def index_fingerprint(index_path):
+    """
+    Identifies the models and the current contents of the index, so cached answers are
+    dropped whenever either changes.
+    """
+    parts = [LLM_MODEL_NAME, EMBEDDING_MODEL_NAME]
+    for filename in ("index.faiss", "index.pkl"):
+        file_path = os.path.join(index_path, filename)
+        if os.path.exists(file_path):
+            stat = os.stat(file_path)
+            parts.append(f"{filename}:{stat.st_size}:{stat.st_mtime_ns}")
+    # A sharded index changes whenever a shard publishes a new version
+    if os.path.isdir(index_path):
+        for name in sorted(os.listdir(index_path)):
+            current_path = os.path.join(index_path, name, "CURRENT")
+            if os.path.isfile(current_path):
+                with open(current_path, encoding="utf-8") as f:
+                    parts.append(f"{name}:{f.read().strip()}")
+    return hashlib.sha256("\n".join(parts).encode('utf-8')).hexdigest()
+
+class AnswerCache:
+    """
+    Cache of final answers keyed on the normalized question text.
+
+    If embeddings are given, a question that misses the exact lookup is embedded and
+    matched against the cached questions, so close paraphrases hit as well. Entries expire
+    after ttl seconds and the least recently used ones are evicted beyond max_entries.
+    With a path the cache is persisted as JSON; a file written with a different
+    fingerprint (other models or another index) is ignored. If fingerprint_source is
+    given, it is called at most every check_interval seconds from get and put to
+    recompute the fingerprint, and the cache is cleared when that changes (e.g. when a
+    rebuilt shard is swapped in while the chatbot runs). save writes the file at most
+    every save_interval seconds; call flush at exit to write the answers since.
+    """
+
+    def __init__(self, path=None, fingerprint="", embeddings=None, ttl=3600, max_entries=1000,
+                 similarity_threshold=0.95, fingerprint_source=None, check_interval=5.0, save_interval=60.0):
+        self.path = path
+        self.save_interval = save_interval
+        self._saved = None
+        self._dirty = False
+        self.fingerprint = fingerprint
+        self.fingerprint_source = fingerprint_source
+        self.check_interval = check_interval
+        self._checked = time.monotonic()
+        self.embeddings = embeddings
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # normalized question -> {"answer", "created", "vector"}
+        if path is not None:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("fingerprint") != self.fingerprint:
+            return
+        for key, entry in data.get("entries", []):
+            self._entries[key] = entry
+        self._expire(time.time())
+
+    def save(self):
+        """
+        Writes the cache if it changed, unless it was written less than save_interval seconds ago.
+        """
+        if self._saved is not None and time.monotonic() - self._saved < self.save_interval:
+            return
+        self.flush()
+
+    def flush(self):
+        """
+        Writes the cache if it changed since it was last written.
+        """
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"fingerprint": self.fingerprint, "entries": list(self._entries.items())}
+            self._dirty = False
+            self._saved = time.monotonic()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _check_fingerprint(self):
+        if self.fingerprint_source is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < self.check_interval:
+                return
+            self._checked = now
+        fingerprint = self.fingerprint_source()
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                self.fingerprint = fingerprint
+                self._entries.clear()
+                self._dirty = True
+
+    def _expire(self, now):
+        for key in [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl]:
+            del self._entries[key]
+
+    def _similar(self, vector):
+        keys = [key for key, entry in self._entries.items() if entry.get("vector") is not None]
+        if not keys:
+            return None
+        matrix = np.asarray([self._entries[key]["vector"] for key in keys], dtype=np.float32)
+        query = np.asarray(vector, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        similarities = matrix @ query / np.where(norms == 0, 1.0, norms)
+        best = int(np.argmax(similarities))
+        return keys[best] if similarities[best] >= self.similarity_threshold else None
+
+    def get(self, question):
+        """
+        Returns the cached answer for the question or a paraphrase of it, or None.
+        """
+        self._check_fingerprint()
+        key = normalize_question(question)
+        with self._lock:
+            self._expire(time.time())
+            exact = key in self._entries
+            has_entries = bool(self._entries)
+        if not exact and self.embeddings is not None and has_entries:
+            # Embed outside the lock; it's a round trip to the embedding server
+            vector = self.embeddings.embed_query(key)
+            with self._lock:
+                key = self._similar(vector) or key
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["answer"]
+
+    def put(self, question, answer):
+        self._check_fingerprint()
+        key = normalize_question(question)
+        vector = self.embeddings.embed_query(key) if self.embeddings is not None else None
+        with self._lock:
+            self._entries[key] = {"answer": answer, "created": time.time(), "vector": vector}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
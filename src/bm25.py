@@ -0,0 +1,91 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+
+BM25_FILENAME = "bm25.json"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over the chunks of a vector store. Documents are identified
+    by their position in the FAISS index, which is also how the mmap docstore is laid out.
+    """
+
+    def __init__(self, k1=1.5, b=0.75, doc_lengths=None, postings=None):
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = doc_lengths or []
+        self.postings = postings or {}  # term -> [[position, term frequency], ...]
+
+    @classmethod
+    def from_texts(cls, texts, **kwargs):
+        index = cls(**kwargs)
+        for text in texts:
+            index.add(text)
+        return index
+
+    @classmethod
+    def from_vector_store(cls, vector_store, **kwargs):
+        """
+        Builds the index from the documents of a vector store, in index order.
+        """
+        def texts():
+            for position in range(vector_store.index.ntotal):
+                yield vector_store.docstore.search(vector_store.index_to_docstore_id[position]).page_content
+        return cls.from_texts(texts(), **kwargs)
+
+    def add(self, text):
+        position = len(self.doc_lengths)
+        tokens = tokenize(text)
+        self.doc_lengths.append(len(tokens))
+        for term, count in Counter(tokens).items():
+            self.postings.setdefault(term, []).append([position, count])
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def search(self, query, k, positions=None):
+        """
+        Returns up to k (position, score) pairs for the query, best first. With positions,
+        only the documents at those positions are scored.
+        """
+        n = len(self.doc_lengths)
+        if n == 0:
+            return []
+        allowed = set(positions.tolist() if hasattr(positions, "tolist") else positions) if positions is not None else None
+        avg_length = sum(self.doc_lengths) / n
+        scores = Counter()
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, count in postings:
+                if allowed is not None and position not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[position] / avg_length)
+                scores[position] += idf * count * (self.k1 + 1) / (count + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save(self, path):
+        with open(os.path.join(path, BM25_FILENAME), "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "doc_lengths": self.doc_lengths, "postings": self.postings}, f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads the index saved next to a vector store, or returns None if there is none.
+        """
+        file_path = os.path.join(path, BM25_FILENAME)
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["k1"], data["b"], data["doc_lengths"], data["postings"])
@@ -1,17 +1,37 @@
-from langchain_ollama import ChatOllama
-from langchain_classic.agents import create_react_agent, AgentExecutor
-from langchain_classic.tools.retriever import create_retriever_tool
+import asyncio
+import queue
+import threading
+import time
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_core.tools import Tool
-from ddgs import DDGS
-from .config import LLM_MODEL_NAME
+from .web_search import get_search_service
+from .router import QueryRouter, RETRIEVAL_ROUTE
+from .prefetch import ToolPrefetcher
+from .tracing import get_tracer
+from .lazy import LazyImports
+from .config import LLM_MODEL_NAME, AGENT_MAX_ITERATIONS, AGENT_MAX_EXECUTION_TIME, AGENT_PREFETCH_TOOLS
+
+# The agent framework and Ollama's client take over a second to import; a process that
+# never builds an agent (or only a stub one) doesn't load them
+lazy = LazyImports(globals(), {
+    "ChatOllama": "langchain_ollama:ChatOllama",
+    "create_react_agent": "langchain_classic.agents:create_react_agent",
+    "AgentExecutor": "langchain_classic.agents:AgentExecutor",
+    "create_retriever_tool": "langchain_classic.tools.retriever:create_retriever_tool",
+})
+__getattr__ = lazy.__getattr__
 
 def duckduckgo_search_func(query):
     """
-    Performs a DuckDuckGo search and returns formatted results.
+    Performs a web search (DuckDuckGo unless configured otherwise) and returns formatted results.
     """
     try:
-        results = DDGS().text(query, max_results=5)
+        results = get_search_service().search(query, max_results=5)
         if not results:
             return "No results found."
         formatted = []
@@ -21,28 +41,109 @@ def duckduckgo_search_func(query):
     except Exception as e:
         return f"Search error: {str(e)}"
 
-def build_rag_chain(retriever):
+class StubChatModel(BaseChatModel):
+    """
+    Offline stand-in for the Ollama model, for tests and load tests. It plays the ReAct
+    game deterministically: first it looks the question up in the knowledge base, then
+    answers with the first line of what it found. Given the single-shot retrieval prompt,
+    it answers with the first line of the excerpts.
+
+    latency is the delay in seconds before the first token and token_delay the delay
+    between tokens, to simulate generation speed.
+    """
+
+    latency: float = 0.0
+    token_delay: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    def _reply(self, messages):
+        if EXCERPTS_HEADER in messages[-1].content:
+            # The single-shot retrieval prompt: answer straight from the first excerpt
+            excerpts = messages[-1].content.split(EXCERPTS_HEADER, 1)[1].strip()
+            return excerpts.splitlines()[0][:200] if excerpts else "I do not know."
+        # Only look past the instructions, which describe the format with examples
+        prompt = messages[-1].content.split("Begin!")[-1]
+        if "Observation:" in prompt:
+            observation = prompt.rsplit("Observation:", 1)[1].split("\nThought:")[0].strip()
+            answer = observation.splitlines()[0][:200] if observation else "I do not know."
+            return f" I now know the final answer\nFinal Answer: {answer}"
+        question = prompt.split("Question:", 1)[1].split("\n")[0].strip() if "Question:" in prompt else ""
+        return f" I should search the scripts.\nAction: tng_knowledge_base\nAction Input: {question}"
+
+    def _pieces(self, messages):
+        reply = self._reply(messages)
+        return [piece for piece in reply.replace(" ", "\0 ").split("\0") if piece]
+
+    def _usage(self, messages, pieces):
+        # Counted in words, like the pieces it streams; Ollama reports real token counts
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        return {"input_tokens": input_tokens, "output_tokens": len(pieces),
+                "total_tokens": input_tokens + len(pieces)}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        pieces = self._pieces(messages)
+        reply = "".join(pieces)
+        time.sleep(self.latency + self.token_delay * len(reply.split()))
+        message = AIMessage(content=reply, usage_metadata=self._usage(messages, pieces))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        pieces = self._pieces(messages)
+        for piece in pieces:
+            time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, pieces)))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        # Sleep on the event loop, so many concurrent sessions cost no threads
+        await asyncio.sleep(self.latency)
+        pieces = self._pieces(messages)
+        for piece in pieces:
+            await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, pieces)))
+
+def build_rag_chain(retriever, llm=None, prefetch_tools=AGENT_PREFETCH_TOOLS):
     """
-    Constructs the Agent chain with tools.
+    Constructs the Agent chain with tools. llm defaults to the Ollama chat model.
+    The tools named in prefetch_tools start on the raw question as soon as a turn begins.
     """
     # 1. Define Tools
+    prefetcher = ToolPrefetcher() if prefetch_tools else None
+
+    def prefetched(name, func):
+        return prefetcher.wrap(name, func) if prefetcher and name in prefetch_tools else func
+
     search = Tool(
         name="duckduckgo_search",
-        func=duckduckgo_search_func,
+        func=prefetched("duckduckgo_search", duckduckgo_search_func),
         description="Search the web for general knowledge, current events, or definitions. Use this when the internal knowledge base doesn't have the answer."
     )
     
-    retriever_tool = create_retriever_tool(
+    retriever_tool = lazy.create_retriever_tool(
         retriever,
         "tng_knowledge_base",
         "Search for lines and exact dialogues from Star Trek: The Next Generation scripts. Use this when asked about specific quotes or plot points from the show."
     )
     
+    if prefetcher and "tng_knowledge_base" in prefetch_tools:
+        retriever_tool.func = prefetched("tng_knowledge_base", retriever_tool.func)
+        # Async runs go through the wrapped function too, in a worker thread
+        retriever_tool.coroutine = None
+
     tools = [search, retriever_tool]
 
     # 2. Setup LLM
     # Stop sequences are important for ReAct to stop generating after an action
-    llm = ChatOllama(model=LLM_MODEL_NAME, temperature=0)
+    if llm is None:
+        llm = lazy.ChatOllama(model=LLM_MODEL_NAME, temperature=0)
 
     # 3. Create ReAct Prompt
     template = '''Answer the following questions as best you can. You are Lt. Commander Data from Star Trek: The Next Generation. You have access to the following tools:
@@ -68,18 +169,244 @@ Thought:{agent_scratchpad}'''
     prompt = PromptTemplate.from_template(template)
 
     # 4. Create Agent
-    agent = create_react_agent(llm, tools, prompt)
+    agent = lazy.create_react_agent(llm, tools, prompt)
     
     # 5. Create Executor
-    agent_executor = AgentExecutor(
+    agent_executor = lazy.AgentExecutor(
         agent=agent, 
         tools=tools, 
         verbose=True, 
-        handle_parsing_errors=True
+        handle_parsing_errors=True,
+        max_iterations=AGENT_MAX_ITERATIONS,
+        max_execution_time=AGENT_MAX_EXECUTION_TIME,
+        callbacks=[prefetcher] if prefetcher else None,
     )
     
     return agent_executor
 
-def query_chain(chain, question):
-    result = chain.invoke({"input": question})
-    return result["output"]
+EXCERPTS_HEADER = "Script excerpts:"
+
+def build_retrieval_chain(retriever, llm=None):
+    """
+    Constructs a single-shot chain that retrieves script excerpts for the question and
+    answers from them in one generation, without the agent's tool-picking round trip.
+    Like the agent, it takes {"input": question} and returns {"output": answer}.
+    """
+    if llm is None:
+        llm = lazy.ChatOllama(model=LLM_MODEL_NAME, temperature=0)
+
+    template = '''You are Lt. Commander Data from Star Trek: The Next Generation. Answer the question using the excerpts from the show's scripts below. If they do not contain the answer, say so.
+
+Question: {input}
+
+''' + EXCERPTS_HEADER + '''
+{context}
+
+Answer:'''
+    prompt = PromptTemplate.from_template(template)
+
+    def add_context(inputs):
+        docs = retriever.invoke(inputs["input"])
+        return {"input": inputs["input"], "context": "\n\n".join(doc.page_content for doc in docs)}
+
+    return (
+        RunnableLambda(add_context, name="retrieve")
+        | prompt
+        | llm
+        | StrOutputParser()
+        | RunnableLambda(lambda answer: {"output": answer.strip()}, name="answer")
+    ).with_config(run_name="RetrievalChain")
+
+def build_routed_chain(agent, retriever, llm=None):
+    """
+    Puts a QueryRouter in front of the agent that sends clear script questions to a
+    single-shot retrieval chain instead.
+    """
+    return QueryRouter(agent, build_retrieval_chain(retriever, llm))
+
+# What AgentExecutor answers when it hits max_iterations or max_execution_time
+AGENT_STOPPED_OUTPUT = "Agent stopped due to iteration limit or time limit."
+
+def should_cache(output):
+    """
+    Whether an answer may be cached: not when the agent was stopped before answering.
+    """
+    return output is not None and output != AGENT_STOPPED_OUTPUT
+
+def query_chain(chain, question, cache=None):
+    """
+    Runs the agent (or the chain a QueryRouter picks) on a question and returns its
+    final answer. With an AnswerCache, repeated (or paraphrased) questions are answered
+    from the cache instead. The turn is traced by the shared Tracer.
+    """
+    tracer = get_tracer()
+    with tracer.turn(question) as trace:
+        if cache is not None:
+            answer = cache.get(question)
+            if answer is not None:
+                trace.attributes["cached"] = True
+                return answer
+        router = None
+        if isinstance(chain, QueryRouter):
+            router = chain
+            route, _, chain = router.route(question)
+            trace.attributes["route"] = route
+            start = time.perf_counter()
+        result = chain.invoke({"input": question}, config={"callbacks": tracer.callbacks(trace)})
+        if router is not None:
+            router.record(route, time.perf_counter() - start)
+        if cache is not None and should_cache(result["output"]):
+            cache.put(question, result["output"])
+            cache.save()
+        return result["output"]
+
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+class FinalAnswerFilter:
+    """
+    Watches the tokens of one ReAct generation and passes through only what follows
+    the "Final Answer:" marker, which may arrive split across several tokens.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._buffer = ""
+        self._found = False
+        self._started = False
+
+    def feed(self, text):
+        if not self._found:
+            self._buffer += text
+            position = self._buffer.find(FINAL_ANSWER_MARKER)
+            if position < 0:
+                return ""
+            self._found = True
+            text = self._buffer[position + len(FINAL_ANSWER_MARKER):]
+        if not self._started:
+            # Drop the whitespace between the marker and the answer, however it is tokenized
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+
+async def astream_chain(chain, question, cache=None):
+    """
+    Runs the agent (or the chain a QueryRouter picks) on a question and yields
+    (kind, payload) events as they happen: ("step", text) for the route and each tool
+    call and observation, ("token", text) for each piece of the final answer as the
+    model generates it, and finally ("done", stats) with the full output, the route,
+    the time to the first answer token, the total time in seconds and the trace id.
+    """
+    tracer = get_tracer()
+    with tracer.turn(question) as trace:
+        start = time.perf_counter()
+        first_token = None
+        if cache is not None:
+            # The lookup embeds the question, a blocking call to the embedding server
+            answer = await asyncio.to_thread(cache.get, question)
+            if answer is not None:
+                trace.attributes["cached"] = True
+                first_token = time.perf_counter() - start
+                yield "token", answer
+                yield "done", {
+                    "output": answer, "route": None, "ttft": first_token, "elapsed": first_token, "cached": True,
+                    "trace_id": trace.trace_id,
+                }
+                return
+
+        router, route = None, None
+        if isinstance(chain, QueryRouter):
+            router = chain
+            route, reason, chain = router.route(question)
+            trace.attributes["route"] = route
+            yield "step", f"Route: {route} ({reason})"
+
+        # The retrieval chain's only generation is the answer; the agent's answer follows its marker
+        answer_filter = FinalAnswerFilter() if route != RETRIEVAL_ROUTE else None
+        output = None
+        config = {"callbacks": tracer.callbacks(trace)}
+        async for event in chain.astream_events({"input": question}, config=config, version="v2"):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                token = event["data"]["chunk"].content
+                if answer_filter is not None:
+                    token = answer_filter.feed(token)
+                if token:
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    yield "token", token
+            elif kind == "on_chat_model_end" and answer_filter is not None:
+                answer_filter.reset()
+            elif kind == "on_tool_end":
+                yield "step", f"Observation: {str(event['data'].get('output'))[:200]}"
+            elif kind == "on_retriever_end" and route == RETRIEVAL_ROUTE:
+                yield "step", f"Retrieved {len(event['data'].get('output') or [])} excerpts"
+            elif not event.get("parent_ids"):
+                # The executor's own events: its planned actions carry the tool input,
+                # which on_tool_start leaves empty for plain string tools
+                if kind == "on_chain_stream" and isinstance(event["data"]["chunk"], dict):
+                    for action in event["data"]["chunk"].get("actions", []):
+                        yield "step", f"Action: {action.tool} ({action.tool_input})"
+                elif kind == "on_chain_end":
+                    output = event["data"]["output"]["output"]
+
+        elapsed = time.perf_counter() - start
+        if router is not None:
+            router.record(route, elapsed)
+        if cache is not None and should_cache(output):
+            await asyncio.to_thread(cache.put, question, output)
+            await asyncio.to_thread(cache.save)
+        trace.attributes["ttft"] = first_token
+        yield "done", {
+            "output": output, "route": route, "ttft": first_token, "elapsed": elapsed, "cached": False,
+            "trace_id": trace.trace_id,
+        }
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def _background_loop():
+    """
+    Returns the event loop that stream_chain runs agents on, starting it in a daemon
+    thread on first use. The loop lives as long as the process, because ChatOllama keeps
+    an async HTTP client bound to the loop it was first used on.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="stream-chain-loop", daemon=True).start()
+        return _loop
+
+def stream_chain(chain, question, cache=None):
+    """
+    Synchronous version of astream_chain for the REPL: runs the agent on a long-lived
+    event loop in a background thread and yields its events as they arrive.
+    """
+    events = queue.Queue()
+    finished = object()
+
+    async def produce():
+        try:
+            async for event in astream_chain(chain, question, cache):
+                events.put(event)
+        except Exception as e:
+            events.put(("error", e))
+        finally:
+            events.put(finished)
+
+    future = asyncio.run_coroutine_threadsafe(produce(), _background_loop())
+    try:
+        while True:
+            event = events.get()
+            if event is finished:
+                return
+            if event[0] == "error":
+                raise event[1]
+            yield event
+    finally:
+        # Stop the turn if the caller stops reading early
+        future.cancel()
@@ -0,0 +1,157 @@
+import re
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .config import CHUNK_TOKENS, SEMANTIC_BREAKPOINT_PERCENTILE, SEMANTIC_BUFFER_SIZE
+from .rerank import estimate_tokens
+
+# Where SemanticChunker splits sentences: whitespace after a period, question or exclamation mark
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.?!])\s+')
+
+def scene_spans(texts, scenes, max_tokens=CHUNK_TOKENS):
+    """
+    Groups one script's dialogue lines into chunks along the script's structure and
+    returns them as (start, end) ranges of line positions, in order. scenes holds the
+    scene of each line.
+
+    Whole scenes are packed into a chunk while they fit in max_tokens estimated tokens. A
+    scene too long for one chunk is split between speaker turns, so chunks never overlap
+    and only a single turn longer than max_tokens makes one go over budget.
+    """
+    spans = []
+    start = end = 0
+    tokens = 0
+    while end < len(texts):
+        scene_end = end
+        while scene_end < len(texts) and scenes[scene_end] == scenes[end]:
+            scene_end += 1
+        line_tokens = [estimate_tokens(text) for text in texts[end:scene_end]]
+        if tokens + sum(line_tokens) > max_tokens:
+            if end > start:
+                spans.append((start, end))
+                start, tokens = end, 0
+            # Split between turns only if the scene doesn't fit a chunk of its own either
+            for i, count in enumerate(line_tokens, end):
+                if i > start and tokens + count > max_tokens:
+                    spans.append((start, i))
+                    start, tokens = i, 0
+                tokens += count
+        else:
+            tokens += sum(line_tokens)
+        end = scene_end
+    if end > start:
+        spans.append((start, end))
+    return spans
+
+def sentence_spans(text):
+    """
+    Returns the (start, end) offsets of the sentences in text.
+    """
+    spans = []
+    start = 0
+    for boundary in SENTENCE_BOUNDARY.finditer(text):
+        spans.append((start, boundary.start()))
+        start = boundary.end()
+    spans.append((start, len(text)))
+    return [(start, end) for start, end in spans if end > start]
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+def semantic_breaks(vectors, percentile=SEMANTIC_BREAKPOINT_PERCENTILE, buffer_size=SEMANTIC_BUFFER_SIZE):
+    """
+    Returns the positions of the sentences that start a new chunk, given the sentences'
+    embeddings: those after which the cosine distance between the mean embeddings of the
+    buffer_size sentences around each is above the given percentile. This mirrors
+    SemanticChunker, which embeds each sentence joined with its neighbours instead.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) < 2:
+        return []
+    sums = np.concatenate([np.zeros((1, vectors.shape[1]), dtype=np.float32), np.cumsum(vectors, axis=0)])
+    positions = np.arange(len(vectors))
+    lower = np.maximum(positions - buffer_size, 0)
+    upper = np.minimum(positions + buffer_size + 1, len(vectors))
+    windows = _normalize(sums[upper] - sums[lower])
+    distances = 1 - np.sum(windows[:-1] * windows[1:], axis=1)
+    threshold = np.percentile(distances, percentile)
+    return [int(i) + 1 for i in np.flatnonzero(distances > threshold)]
+
+class PooledEmbeddings(Embeddings):
+    """
+    Semantic chunking that embeds each sentence once.
+
+    semantic_chunks embeds a text's sentences to find where its meaning shifts and
+    remembers each chunk with the normalized mean of its sentences' embeddings;
+    embed_documents then serves those chunks from memory and only sends other texts to
+    the wrapped embeddings, so indexing the chunks costs no further embedding calls.
+    Queries are embedded by the wrapped embeddings.
+
+    A pooled vector is held until its chunk is embedded or discard()ed; chunks that won't
+    be indexed (already in the index, duplicates) must be discarded. With pool False, only
+    the chunk boundaries are computed and nothing is held.
+    """
+
+    def __init__(self, embeddings, percentile=SEMANTIC_BREAKPOINT_PERCENTILE, buffer_size=SEMANTIC_BUFFER_SIZE,
+                 pool=True):
+        self.embeddings = embeddings
+        self.percentile = percentile
+        self.buffer_size = buffer_size
+        self.pool = pool
+        # chunk text -> [vector, chunks with that text not yet embedded or discarded]
+        self._pooled = {}
+        self._lock = threading.Lock()
+
+    def semantic_chunks(self, text):
+        """
+        Splits text where the meaning shifts and returns the chunks, each a slice of text
+        from the start of its first sentence to the end of its last.
+        """
+        sentences = sentence_spans(text)
+        if not sentences:
+            return []
+        vectors = np.asarray(
+            self.embeddings.embed_documents([text[start:end] for start, end in sentences]), dtype=np.float32
+        )
+        starts = [0, *semantic_breaks(vectors, self.percentile, self.buffer_size)]
+        ends = [*starts[1:], len(sentences)]
+        chunks = []
+        with self._lock:
+            for first, last in zip(starts, ends):
+                chunk = text[sentences[first][0]:sentences[last - 1][1]]
+                if self.pool:
+                    entry = self._pooled.setdefault(chunk, [None, 0])
+                    entry[0] = _normalize(vectors[first:last].mean(axis=0)).tolist()
+                    entry[1] += 1
+                chunks.append(chunk)
+        return chunks
+
+    def _take(self, text):
+        # Called with the lock held; returns the pooled vector of text, if any
+        entry = self._pooled.get(text)
+        if entry is None:
+            return None
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._pooled[text]
+        return entry[0]
+
+    def discard(self, text):
+        """
+        Drops the pooled vector of a chunk that won't be embedded.
+        """
+        with self._lock:
+            self._take(text)
+
+    def embed_documents(self, texts):
+        with self._lock:
+            vectors = [self._take(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, self.embeddings.embed_documents([texts[i] for i in missing])):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
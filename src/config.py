@@ -6,10 +6,183 @@ PROJECT_ROOT = os.getcwd()
 # You might want to make this configurable via env var
 SCRIPTS_DIR = "/Users/rajanmehta/Documents/MLProjects/scripts_tng" 
 DATA_OUTPUT_PATH = os.path.join(PROJECT_ROOT, "data", "processed", "data_lines.txt")
+INDEX_PATH = "faiss_index"
+
+# Ingestion
+# Speakers whose dialogue is indexed (None keeps every speaker)
+CHARACTERS = ["DATA"]
+# Number of worker processes used to parse scripts (1 disables the process pool)
+INGEST_WORKERS = os.cpu_count() or 1
+# Number of script files handed to a worker at a time
+INGEST_CHUNK_SIZE = 16
+# Encodings tried in turn for each script; if none fits, the first is used with
+# undecodable bytes replaced (and the script reported)
+SCRIPT_ENCODINGS = ("utf-8", "cp1252")
+
+# Chunking
+# "scene" packs whole scenes of a script into chunks of at most CHUNK_TOKENS estimated
+# tokens, splitting long scenes between speaker turns; "recursive" cuts the dialogue into
+# overlapping windows of CHUNK_SIZE characters; "semantic" splits where the meaning of
+# consecutive sentences shifts
+CHUNKING = "scene"
+CHUNK_TOKENS = 256
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+# Semantic chunking splits where the distance between sentences (averaged over this many
+# neighbours on each side) is above this percentile of all such distances
+SEMANTIC_BREAKPOINT_PERCENTILE = 95
+SEMANTIC_BUFFER_SIZE = 1
+# Give semantic chunks the mean of their sentences' embeddings instead of embedding them again
+SEMANTIC_POOLED = True
 
 # Models
 LLM_MODEL_NAME = "qwen2.5:7b-instruct"
 EMBEDDING_MODEL_NAME = "nomic-embed-text:latest"
 
+# Embedding requests
+# Chunks sent to the embedding server per request
+EMBED_BATCH_SIZE = 64
+# Requests in flight at once; raise together with OLLAMA_NUM_PARALLEL on the server
+EMBED_MAX_IN_FLIGHT = 4
+# Retries per failed request, with exponential backoff starting at EMBED_RETRY_DELAY seconds
+EMBED_RETRIES = 3
+EMBED_RETRY_DELAY = 1.0
+
+# Vector index
+# One of "flat" (exact), "hnsw", "ivf" or "ivfpq" (IVF with product-quantized vectors)
+INDEX_TYPE = "flat"
+# HNSW graph degree, build-time and default query-time beam width
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 40
+HNSW_EF_SEARCH = 64
+# IVF inverted lists and how many of them a query visits by default
+IVF_NLIST = 256
+IVF_NPROBE = 8
+# PQ sub-quantizers (must divide the embedding dimension) and bits per code
+PQ_M = 16
+PQ_NBITS = 8
+# Vectors buffered to train IVF indexes before anything is added
+INDEX_TRAIN_SIZE = 10000
+# Memory-map the index and documents when the chatbot starts instead of unpickling them
+INDEX_MMAP = True
+# Chunks the retriever returns per query
+RETRIEVER_K = 10
+# Filtered searches over at most this many chunks scan them exactly instead of using the index
+FILTER_EXACT_MAX = 4096
+
+# Sharded index
+# None for one index over every script, or one of SHARD_KEYS for one shard per series / season
+SHARD_KEYS = ("series", "season")
+SHARD_BY = None
+SHARDS_PATH = "faiss_shards"
+# Script directory of each series
+SERIES_DIRS = {"tng": SCRIPTS_DIR}
+# Words that name a series in a question, besides its key
+SERIES_ALIASES = {"tng": ["next generation"]}
+# Shards searched at the same time
+SHARD_SEARCH_THREADS = 4
+# Seconds between checks for rebuilt shards while the chatbot is running
+SHARD_REFRESH_INTERVAL = 5
+# Versions of a shard kept on disk, so searches still using an old one can finish
+SHARD_KEEP_VERSIONS = 2
+
+# Chunk metadata
+# Speakers a question can restrict the search to by naming them, capitalized ("What does
+# Worf say about honor?"); None accepts any capitalized word that is a speaker in the index,
+# which includes cues like COMPUTER, CAPTAIN or VOICE
+SPEAKER_FILTER_NAMES = [
+    "PICARD", "RIKER", "DATA", "WORF", "TROI", "CRUSHER", "LAFORGE", "GEORDI", "WESLEY", "GUINAN", "YAR",
+    "PULASKI", "O'BRIEN", "RO", "BARCLAY", "LWAXANA", "LORE", "ALEXANDER", "KEIKO", "GOWRON", "LAL", "SELA",
+]
+# Number of the first script of each season, for transcripts named by episode number (101-277)
+SEASON_FIRST_EPISODES = [101, 127, 149, 175, 201, 227, 253]
+
+# Reranking
+# Over-fetch candidates, rerank them, drop repeated chunk overlap and keep the best few
+RERANK = True
+# Candidates fetched for reranking
+RERANK_FETCH_K = 20
+# Chunks passed on to the model, at most
+RERANK_TOP_N = 4
+# Estimated tokens of retrieved text passed on to the model, at most
+RERANK_TOKEN_BUDGET = 600
+# "lexical" (BM25 over the candidates), "embedding" (cosine to the query) or
+# "cross-encoder" (needs sentence-transformers)
+RERANK_SCORER = "lexical"
+RERANK_CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Hybrid retrieval
+# Combine BM25 keyword search with vector search when a BM25 index was built at ingest
+HYBRID_RETRIEVAL = True
+# Candidates taken from each of BM25 and vector search before fusion
+HYBRID_FETCH_K = 30
+# Reciprocal rank fusion constant
+RRF_K = 60
+# How far the top BM25 hit must outscore the next one to skip vector search
+LEXICAL_CONFIDENCE_RATIO = 1.5
+
+# Agent
+# Tool calls per turn before the agent is stopped
+AGENT_MAX_ITERATIONS = 6
+# Seconds per turn before the agent is stopped
+AGENT_MAX_EXECUTION_TIME = 90
+# Run these tools on the raw question while the model is still deciding what to call.
+# Add "duckduckgo_search" to also prefetch web searches; every turn then sends the
+# question to the search engine, whether or not the agent uses the results
+AGENT_PREFETCH_TOOLS = ["tng_knowledge_base"]
+
+# Send clear script questions to a single-shot retrieval chain instead of the agent
+QUERY_ROUTER = True
+
+# Answer cache
+ANSWER_CACHE_PATH = os.path.join(PROJECT_ROOT, "data", "answer_cache.json")
+# Seconds a cached answer stays valid
+ANSWER_CACHE_TTL = 24 * 3600
+ANSWER_CACHE_MAX_ENTRIES = 1000
+# Cosine similarity above which a differently worded question counts as the same one
+ANSWER_CACHE_SIMILARITY = 0.95
+# Seconds between writes of the cache file; the rest is written at exit
+ANSWER_CACHE_SAVE_INTERVAL = 60
+
+# Web search
+# "ddgs" for DuckDuckGo, or "fixture" to answer from WEB_SEARCH_FIXTURE_PATH without network
+WEB_SEARCH_BACKEND = "ddgs"
+WEB_SEARCH_FIXTURE_PATH = os.path.join(PROJECT_ROOT, "data", "web_search_fixture.json")
+WEB_SEARCH_CACHE_PATH = os.path.join(PROJECT_ROOT, "data", "web_search_cache.json")
+# Seconds a cached result stays valid
+WEB_SEARCH_CACHE_TTL = 24 * 3600
+# Hard limit in seconds for one search
+WEB_SEARCH_TIMEOUT = 10
+WEB_SEARCH_MAX_CONCURRENT = 2
+# Minimum seconds between two requests to the search engine
+WEB_SEARCH_MIN_INTERVAL = 1.0
+
+# Server mode
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+# Agent runs executing at the same time
+SERVER_WORKERS = 4
+# Requests allowed to wait for a worker before new ones are turned away
+SERVER_QUEUE_SIZE = 32
+# Hard limit in seconds for one agent run
+SERVER_REQUEST_TIMEOUT = 120
+
+# Tracing
+# Record the spans (LLM calls, tools, searches, embeddings) of every turn as metrics
+TRACING = True
+# Turns are also appended here as JSON lines; None to keep only the metrics
+TRACE_PATH = os.path.join(PROJECT_ROOT, "data", "traces.jsonl")
+# Fraction of turns written to TRACE_PATH
+TRACE_SAMPLE_RATE = 0.01
+# Size in MB past which TRACE_PATH is moved to TRACE_PATH + ".1" and started afresh; None for no limit
+TRACE_MAX_MB = 64
+# Write the text of each question with its trace
+TRACE_QUESTIONS = False
+
+# Embedding cache
+EMBEDDING_CACHE_DIR = os.path.join(PROJECT_ROOT, "data", "embedding_cache")
+# Size limit of the cached vectors before least recently used entries are evicted
+EMBEDDING_CACHE_MAX_MB = 1024
+
 # Environment
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
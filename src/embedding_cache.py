@@ -0,0 +1,313 @@
+import atexit
+import json
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .manifest import hash_text
+from .tracing import span
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (model name, text hash).
+
+    Vectors are stored as rows of a memory-mapped float32 matrix (vectors.f32) and the
+    key -> row mapping lives in index.json. Once the matrix reaches max_bytes the least
+    recently used eighth of the entries is evicted and their rows are reused. Nothing is
+    read or written until the cache is first used.
+
+    Several processes may share the directory (the chatbot and a running ingest, say):
+    new vectors are held in memory by put() and only written by flush(), which holds an
+    exclusive lock on the directory's lock file while it merges them with whatever other
+    processes wrote since. Reads hold a shared lock and reload the index when another
+    process changed it. Without fcntl (Windows) there is no locking.
+    """
+
+    VECTORS_FILENAME = "vectors.f32"
+    INDEX_FILENAME = "index.json"
+    LOCK_FILENAME = "lock"
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._stamp = None
+        self._dim = None
+        self._capacity = 0
+        self._size = 0
+        self._clock = 0
+        self._entries = {}  # key -> [row, last used]
+        self._free = []
+        self._vectors = None
+        # Not yet flushed: new vectors, and keys read since the last flush (in order of use)
+        self._pending = {}
+        self._used = {}
+
+    @staticmethod
+    def key(model_name, text):
+        return hash_text(model_name + "\0" + text)
+
+    def _vectors_path(self):
+        return os.path.join(self.path, self.VECTORS_FILENAME)
+
+    def _index_path(self):
+        return os.path.join(self.path, self.INDEX_FILENAME)
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        if fcntl is None or (not exclusive and not os.path.isdir(self.path)):
+            yield
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, self.LOCK_FILENAME), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _index_stamp(self):
+        try:
+            stat = os.stat(self._index_path())
+        except FileNotFoundError:
+            return None
+        # index.json is replaced, never rewritten, so a new inode means another writer
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        # Called with the file lock held; (re)reads the index if it changed on disk
+        stamp = self._index_stamp()
+        if self._loaded and stamp == self._stamp:
+            return
+        self._loaded = True
+        self._stamp = stamp
+        self._vectors = None
+        self._dim = None
+        self._capacity = self._size = self._clock = 0
+        self._entries = {}
+        self._free = []
+        if stamp is None or not os.path.exists(self._vectors_path()):
+            return
+        with open(self._index_path(), encoding="utf-8") as f:
+            data = json.load(f)
+        self._dim = data["dim"]
+        self._capacity = data["capacity"]
+        self._size = data["size"]
+        self._clock = data["clock"]
+        self._entries = data["entries"]
+        used = {row for row, _ in self._entries.values()}
+        self._free = [row for row in range(self._size) if row not in used]
+        self._vectors = np.memmap(self._vectors_path(), dtype=np.float32, mode="r+", shape=(self._capacity, self._dim))
+
+    def _max_rows(self):
+        return max(1, self.max_bytes // (self._dim * 4))
+
+    def _grow(self, capacity):
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._vectors_path(), "ab") as f:
+            f.truncate(capacity * self._dim * 4)
+        self._capacity = capacity
+        self._vectors = np.memmap(self._vectors_path(), dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+
+    def _evict(self):
+        by_age = sorted(self._entries, key=lambda key: self._entries[key][1])
+        for key in by_age[:max(1, len(by_age) // 8)]:
+            self._free.append(self._entries.pop(key)[0])
+
+    def _allocate(self):
+        if not self._free and self._size >= self._max_rows():
+            self._evict()
+        if self._free:
+            return self._free.pop()
+        if self._size >= self._capacity:
+            self._grow(min(self._max_rows(), max(1024, self._capacity * 2)))
+        self._size += 1
+        return self._size - 1
+
+    def _reset(self):
+        # Called with the exclusive file lock held
+        self._vectors = None
+        for filename in (self.VECTORS_FILENAME, self.INDEX_FILENAME):
+            if os.path.exists(os.path.join(self.path, filename)):
+                os.remove(os.path.join(self.path, filename))
+        self._loaded = True
+        self._stamp = None
+        self._dim = None
+        self._capacity = self._size = self._clock = 0
+        self._entries = {}
+        self._free = []
+
+    def clear(self):
+        with self._lock, self._file_lock(exclusive=True):
+            self._reset()
+            self._pending = {}
+            self._used = {}
+
+    def get(self, keys):
+        """
+        Returns a list with the cached vector (a float32 array) or None for each key.
+        """
+        with self._lock, self._file_lock(exclusive=False):
+            self._load()
+            results = []
+            for key in keys:
+                vector = self._pending.get(key)
+                entry = self._entries.get(key) if vector is None else None
+                if vector is None and entry is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.hits += 1
+                self._used.pop(key, None)
+                self._used[key] = True
+                results.append(np.array(vector if vector is not None else self._vectors[entry[0]]))
+            return results
+
+    def put(self, keys, vectors):
+        """
+        Adds vectors to the cache; they are written to disk by flush().
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(keys) == 0:
+            return
+        with self._lock:
+            pending_dim = len(next(iter(self._pending.values()))) if self._pending else None
+            if pending_dim is not None and vectors.shape[1] != pending_dim:
+                self._pending = {}
+            with self._file_lock(exclusive=False):
+                self._load()
+                stale = self._dim is not None and vectors.shape[1] != self._dim
+            if stale:
+                # A model with a different dimension; the old vectors are useless now
+                with self._file_lock(exclusive=True):
+                    self._reset()
+            for key, vector in zip(keys, vectors):
+                if key not in self._entries:
+                    self._pending[key] = vector
+
+    def flush(self):
+        """
+        Writes the new vectors and the order entries were used in to disk, merged with
+        what other processes wrote meanwhile.
+        """
+        with self._lock:
+            if not self._pending and not self._used:
+                return
+            with self._file_lock(exclusive=True):
+                self._load()
+                if self._pending:
+                    dim = len(next(iter(self._pending.values())))
+                    if self._dim is not None and dim != self._dim:
+                        self._reset()
+                    self._dim = dim
+                for key in self._used:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        self._clock += 1
+                        entry[1] = self._clock
+                for key, vector in self._pending.items():
+                    if key in self._entries:
+                        continue
+                    row = self._allocate()
+                    self._vectors[row] = vector
+                    self._clock += 1
+                    self._entries[key] = [row, self._clock]
+                self._pending = {}
+                self._used = {}
+                if self._vectors is None:
+                    return
+                self._vectors.flush()
+                tmp_path = self._index_path() + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({
+                        "dim": self._dim,
+                        "capacity": self._capacity,
+                        "size": self._size,
+                        "clock": self._clock,
+                        "entries": self._entries,
+                    }, f)
+                os.replace(tmp_path, self._index_path())
+                self._stamp = self._index_stamp()
+
+    def stats(self):
+        with self._lock, self._file_lock(exclusive=False):
+            self._load()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries) + sum(1 for key in self._pending if key not in self._entries),
+                "bytes": self._size * (self._dim or 0) * 4,
+            }
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated texts from an EmbeddingCache and only sends
+    the misses (deduplicated) to the wrapped model.
+
+    Instead of the model, a factory for it may be given; it is then created on first
+    use, so a process answering from the cache never loads the client at all.
+    """
+
+    def __init__(self, embeddings, cache, model_name, factory=None):
+        self._embeddings = embeddings
+        self._factory = factory
+        self._factory_lock = threading.Lock()
+        self.cache = cache
+        self.model_name = model_name
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._factory_lock:
+                if self._embeddings is None:
+                    self._embeddings = self._factory()
+        return self._embeddings
+
+    def embed_documents(self, texts):
+        keys = [self.cache.key(self.model_name, text) for text in texts]
+        vectors = self.cache.get(keys)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            with span("embedding", "documents", texts=len(unique_texts)):
+                new_vectors = self.embeddings.embed_documents(unique_texts)
+            self.cache.put([self.cache.key(self.model_name, text) for text in unique_texts], new_vectors)
+            self.cache.flush()
+            by_text = dict(zip(unique_texts, new_vectors))
+            for i in missing:
+                vectors[i] = by_text[texts[i]]
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_query(self, text):
+        key = self.cache.key(self.model_name, text)
+        vector = self.cache.get([key])[0]
+        if vector is None:
+            with span("embedding", "query"):
+                vector = self.embeddings.embed_query(text)
+            self.cache.put([key], [vector])
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+_caches = {}
+
+def get_embedding_cache(path, max_bytes):
+    """
+    Returns the shared cache for a directory, so hit/miss counters cover the whole process.
+    Pending query-time entries are flushed at exit.
+    """
+    cache = _caches.get(path)
+    if cache is None:
+        cache = _caches[path] = EmbeddingCache(path, max_bytes)
+        atexit.register(cache.flush)
+    return cache
@@ -0,0 +1,178 @@
+import json
+import os
+import numpy as np
+from .config import (
+    INDEX_TYPE, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, IVF_NLIST, IVF_NPROBE, PQ_M, PQ_NBITS,
+    FILTER_EXACT_MAX
+)
+from .lazy import LazyImports
+
+lazy = LazyImports(globals(), {"faiss": "faiss"})
+__getattr__ = lazy.__getattr__
+
+INDEX_CONFIG_FILENAME = "index_config.json"
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq")
+# Parameters that only affect searching, so changing them doesn't require a rebuild
+SEARCH_PARAMS = ("nprobe", "ef_search")
+# FAISS k-means warns below this many training vectors per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+def default_index_config(index_type=INDEX_TYPE):
+    """
+    Returns the index type and its build and search parameters from the config module.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    return {
+        "index_type": index_type,
+        "hnsw_m": HNSW_M,
+        "ef_construction": HNSW_EF_CONSTRUCTION,
+        "ef_search": HNSW_EF_SEARCH,
+        "nlist": IVF_NLIST,
+        "nprobe": IVF_NPROBE,
+        "pq_m": PQ_M,
+        "pq_nbits": PQ_NBITS,
+    }
+
+def needs_training(index_config):
+    return index_config["index_type"] in ("ivf", "ivfpq")
+
+def make_faiss_index(dim, index_config, n_train=None):
+    """
+    Creates an empty FAISS index of the configured type. When the number of training
+    vectors is known, nlist and the PQ code size are reduced so a small corpus can still
+    be trained.
+    """
+    index_type = index_config["index_type"]
+    if index_type == "flat":
+        return lazy.faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        index = lazy.faiss.IndexHNSWFlat(dim, index_config["hnsw_m"])
+        index.hnsw.efConstruction = index_config["ef_construction"]
+        index.hnsw.efSearch = index_config["ef_search"]
+        return index
+
+    nlist = index_config["nlist"]
+    if n_train is not None:
+        # Enough lists for every one to get MIN_POINTS_PER_CENTROID training vectors
+        nlist = max(1, min(nlist, n_train // MIN_POINTS_PER_CENTROID))
+    quantizer = lazy.faiss.IndexFlatL2(dim)
+    if index_type == "ivf":
+        index = lazy.faiss.IndexIVFFlat(quantizer, dim, nlist)
+    elif index_type == "ivfpq":
+        if dim % index_config["pq_m"] != 0:
+            raise ValueError(f"pq_m={index_config['pq_m']} must divide the embedding dimension {dim}")
+        nbits = index_config["pq_nbits"]
+        while n_train is not None and nbits > 1 and n_train < 2 ** nbits:
+            nbits -= 1
+        index = lazy.faiss.IndexIVFPQ(quantizer, dim, nlist, index_config["pq_m"], nbits)
+    else:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    index.nprobe = index_config["nprobe"]
+    return index
+
+def train_index(dim, index_config, vectors):
+    """
+    Creates an index of the configured type and trains it on vectors if it needs training.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    index = make_faiss_index(dim, index_config, len(vectors))
+    if not index.is_trained:
+        index.train(vectors)
+    return index
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """
+    Applies query-time knobs: nprobe for IVF indexes, efSearch for HNSW indexes.
+    Knobs that don't apply to the index are ignored.
+    """
+    if isinstance(index, lazy.faiss.IndexHNSW):
+        if ef_search is not None:
+            index.hnsw.efSearch = ef_search
+        return
+    if nprobe is not None:
+        try:
+            lazy.faiss.extract_index_ivf(index).nprobe = nprobe
+        except RuntimeError:
+            pass  # Not an IVF index
+
+def search_subset(index, vectors, k, positions, exact_max=FILTER_EXACT_MAX):
+    """
+    Searches only the vectors at the given positions (sorted) and returns (distances,
+    positions) like index.search. Small subsets are scanned exactly from reconstructed
+    vectors; larger ones are searched through the index with an ID selector, so vectors
+    outside the subset are never scored.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    if len(positions) <= exact_max:
+        subset = _reconstruct(index, positions)
+        if subset is not None:
+            if index.metric_type == lazy.faiss.METRIC_INNER_PRODUCT:
+                scores = -(vectors @ subset.T)
+            else:
+                scores = (vectors ** 2).sum(1)[:, None] - 2 * vectors @ subset.T + (subset ** 2).sum(1)[None, :]
+            order = np.argsort(scores, axis=1)[:, :k]
+            distances = np.take_along_axis(scores, order, axis=1)
+            if index.metric_type == lazy.faiss.METRIC_INNER_PRODUCT:
+                distances = -distances
+            found = positions[order]
+            if found.shape[1] < k:
+                pad = k - found.shape[1]
+                found = np.pad(found, ((0, 0), (0, pad)), constant_values=-1)
+                distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=np.inf)
+            return distances.astype(np.float32), found
+
+    selector = lazy.faiss.IDSelectorBatch(positions)
+    if isinstance(index, lazy.faiss.IndexHNSW):
+        params = lazy.faiss.SearchParametersHNSW(sel=selector, efSearch=max(index.hnsw.efSearch, k))
+    else:
+        try:
+            params = lazy.faiss.SearchParametersIVF(sel=selector, nprobe=lazy.faiss.extract_index_ivf(index).nprobe)
+        except RuntimeError:  # Not an IVF index
+            params = lazy.faiss.SearchParameters(sel=selector)
+    return index.search(vectors, k, params=params)
+
+def _reconstruct(index, positions):
+    try:
+        return index.reconstruct_batch(positions)
+    except RuntimeError:
+        pass
+    try:
+        # IVF indexes need a direct map from positions to inverted list entries first
+        lazy.faiss.extract_index_ivf(index).make_direct_map()
+        return index.reconstruct_batch(positions)
+    except RuntimeError:
+        return None
+
+def rebuild_without(index, positions, index_config):
+    """
+    Returns a copy of index without the vectors at the given positions, with the rest
+    renumbered in order. Used for HNSW, which can't remove vectors in place, and for IVF
+    indexes, which keep the old positions as ids after removing vectors. IVF indexes
+    keep their trained centroids (and PQ codebooks) rather than being retrained.
+    """
+    drop = set(positions)
+    keep = np.asarray([i for i in range(index.ntotal) if i not in drop], dtype=np.int64)
+    vectors = _reconstruct(index, keep) if len(keep) else np.zeros((0, index.d), dtype=np.float32)
+    if needs_training(index_config):
+        rebuilt = lazy.faiss.clone_index(index)
+        rebuilt.reset()
+    else:
+        rebuilt = make_faiss_index(index.d, index_config)
+    if len(vectors):
+        rebuilt.add(vectors)
+    return rebuilt
+
+def save_index_config(index_config, path):
+    with open(os.path.join(path, INDEX_CONFIG_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(index_config, f, indent=1, sort_keys=True)
+
+def load_index_config(path):
+    """
+    Returns the index config saved next to the index, or None for indexes built before it existed.
+    """
+    config_path = os.path.join(path, INDEX_CONFIG_FILENAME)
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,30 @@
+import importlib
+
+class LazyImports:
+    """
+    Heavy dependencies of a module, each imported the first time it is used, so code
+    paths (and CLI commands) that never touch one don't pay for loading it.
+
+    names maps an attribute to "module" or "module:name". Code in the module refers to
+    them as lazy.<attribute>. Imported values are stored in the module's globals, where
+    tests can patch them like regular imports; a patched value takes precedence. Set the
+    module's __getattr__ to the instance's, so `module.<attribute>` works from outside.
+    """
+
+    def __init__(self, module_globals, names):
+        self._globals = module_globals
+        self._names = names
+
+    def __getattr__(self, name):
+        try:
+            return self._globals[name]
+        except KeyError:
+            pass
+        if name not in self._names:
+            raise AttributeError(f"module {self._globals['__name__']!r} has no attribute {name!r}")
+        module_name, _, attribute = self._names[name].partition(":")
+        value = importlib.import_module(module_name)
+        if attribute:
+            value = getattr(value, attribute)
+        self._globals[name] = value
+        return value
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+
+MANIFEST_FILENAME = "manifest.json"
+
+def hash_text(text):
+    """
+    Returns the SHA-256 hex digest of a string.
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def hash_file(path, block_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class Manifest:
+    """
+    Records, for every source script, the hash of its contents and the ids of the chunks it
+    produced. Chunk ids are content hashes, so a chunk shared by two scripts is stored once.
+    The settings dict captures everything that affects chunking and embedding; if it changes
+    the existing index can't be reused.
+    """
+
+    def __init__(self, settings=None, files=None):
+        self.settings = settings or {}
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("settings"), data.get("files"))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "files": self.files}, f, indent=1, sort_keys=True)
+
+    def changed_files(self, file_hashes):
+        """
+        Returns the names from file_hashes that are new or whose hash differs, in sorted order.
+        """
+        return sorted(
+            name for name, file_hash in file_hashes.items()
+            if self.files.get(name, {}).get("hash") != file_hash
+        )
+
+    def deleted_files(self, file_hashes):
+        """
+        Returns the recorded names that no longer appear in file_hashes, in sorted order.
+        """
+        return sorted(name for name in self.files if name not in file_hashes)
+
+    def set_file(self, name, file_hash, chunk_ids):
+        self.files[name] = {"hash": file_hash, "chunks": list(chunk_ids)}
+
+    def remove_file(self, name):
+        self.files.pop(name, None)
+
+    def chunk_ids(self):
+        """
+        Returns the set of chunk ids referenced by any recorded file.
+        """
+        return {chunk_id for entry in self.files.values() for chunk_id in entry["chunks"]}
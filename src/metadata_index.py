@@ -0,0 +1,136 @@
+import json
+import os
+import re
+import numpy as np
+from .config import SEASON_FIRST_EPISODES, SPEAKER_FILTER_NAMES
+
+METADATA_INDEX_FILENAME = "metadata_index.json"
+# Chunk metadata fields the index covers; "speakers" holds a list per chunk
+METADATA_FIELDS = ("episode", "season", "speakers")
+
+SEASON_PATTERN = re.compile(r"\bseason\s+(\d+)\b|\bs(\d{1,2})(?:e\d+)?\b", re.IGNORECASE)
+EPISODE_PATTERN = re.compile(r"\bepisode\s+([\w.-]+)", re.IGNORECASE)
+NAME_PATTERN = re.compile(r"[A-Za-z][A-Za-z']*")
+
+def season_of(episode):
+    """
+    Returns the season of a script file: from an "s03e05"-style name, or from the
+    leading episode number of numbered transcripts ("149.txt") and SEASON_FIRST_EPISODES.
+    Returns None if the name says neither.
+    """
+    name = os.path.splitext(os.path.basename(episode))[0]
+    match = re.search(r"s(\d{1,2})e\d+", name, re.IGNORECASE)
+    if match:
+        return int(match.group(1))
+    match = re.match(r"(\d+)", name)
+    if not match or int(match.group(1)) < SEASON_FIRST_EPISODES[0]:
+        return None
+    number = int(match.group(1))
+    return sum(1 for first in SEASON_FIRST_EPISODES if number >= first)
+
+def _values(field, value):
+    if value is None:
+        return []
+    values = value if isinstance(value, (list, tuple)) else [value]
+    return [str(v).upper() if field == "speakers" else str(v) for v in values]
+
+class MetadataIndex:
+    """
+    Secondary index from chunk metadata (episode, season and speakers) to positions in
+    the FAISS index, so a search can be limited to the matching chunks up front.
+    Like BM25Index, it is rebuilt from the vector store whenever the index is saved.
+    """
+
+    def __init__(self, size=0, fields=None):
+        self.size = size
+        # field -> value -> positions, in increasing order
+        self.fields = fields or {field: {} for field in METADATA_FIELDS}
+        self._arrays = {}
+
+    @classmethod
+    def from_vector_store(cls, vector_store):
+        """
+        Builds the index from the documents of a vector store, in index order.
+        """
+        index = cls()
+        for position in range(vector_store.index.ntotal):
+            index.add(vector_store.docstore.search(vector_store.index_to_docstore_id[position]).metadata)
+        return index
+
+    def add(self, metadata):
+        position = self.size
+        self.size += 1
+        for field in METADATA_FIELDS:
+            for value in _values(field, metadata.get(field)):
+                self.fields[field].setdefault(value, []).append(position)
+        self._arrays.clear()
+
+    def __len__(self):
+        return self.size
+
+    def values(self, field):
+        return list(self.fields[field])
+
+    def _array(self, field, value):
+        key = (field, value)
+        if key not in self._arrays:
+            self._arrays[key] = np.asarray(self.fields[field].get(value, []), dtype=np.int64)
+        return self._arrays[key]
+
+    def positions(self, filters):
+        """
+        Returns the sorted positions of the chunks matching filters, a dict of field ->
+        list of accepted values (any of them may match; every field must match), or
+        None if filters don't narrow anything down.
+        """
+        result = None
+        for field, accepted in filters.items():
+            arrays = [self._array(field, value) for value in _values(field, accepted)]
+            if not arrays:
+                continue
+            matching = np.unique(np.concatenate(arrays))
+            result = matching if result is None else np.intersect1d(result, matching, assume_unique=True)
+        if result is not None and len(result) == self.size:
+            return None
+        return result
+
+    def filters_for(self, query, speaker_names=SPEAKER_FILTER_NAMES):
+        """
+        Picks filters out of a free-text query: "season 3" or "s3", "episode 149", and
+        the names of speakers in the index. A speaker is only picked from a capitalized
+        word that is in speaker_names (if given), so ordinary words that are also
+        speaker cues ("all", "computer", "captain") don't restrict the search.
+        """
+        filters = {}
+        seasons = [next(group for group in match.groups() if group) for match in SEASON_PATTERN.finditer(query)]
+        seasons = [str(int(season)) for season in seasons if str(int(season)) in self.fields["season"]]
+        if seasons:
+            filters["season"] = seasons
+        stems = {os.path.splitext(name)[0].lower(): name for name in self.fields["episode"]}
+        episodes = [stems[match.group(1).lower()] for match in EPISODE_PATTERN.finditer(query)
+                    if match.group(1).lower() in stems]
+        if episodes:
+            filters["episode"] = episodes
+        names = {re.sub(r"'S$", "", word.upper()) for word in NAME_PATTERN.findall(query) if word[0].isupper()}
+        if speaker_names is not None:
+            names &= {name.upper() for name in speaker_names}
+        speakers = sorted(name for name in names if len(name) > 1 and name in self.fields["speakers"])
+        if speakers:
+            filters["speakers"] = speakers
+        return filters
+
+    def save(self, path):
+        with open(os.path.join(path, METADATA_INDEX_FILENAME), "w", encoding="utf-8") as f:
+            json.dump({"size": self.size, "fields": self.fields}, f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads the index saved next to a vector store, or returns None if there is none.
+        """
+        file_path = os.path.join(path, METADATA_INDEX_FILENAME)
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["size"], data["fields"])
@@ -0,0 +1,93 @@
+import json
+import mmap
+import os
+from array import array
+from collections.abc import Mapping
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_DATA_FILENAME = "docstore.bin"
+DOCSTORE_OFFSETS_FILENAME = "docstore.idx"
+
+def write_mmap_docstore(vector_store, path):
+    """
+    Writes the documents of a vector store in index order as one file of JSON records
+    plus a table of uint64 byte offsets, so they can be read back through mmap.
+    """
+    offsets = array('Q', [0])
+    with open(os.path.join(path, DOCSTORE_DATA_FILENAME), "wb") as f:
+        for position in range(vector_store.index.ntotal):
+            doc_id = vector_store.index_to_docstore_id[position]
+            doc = vector_store.docstore.search(doc_id)
+            record = json.dumps(
+                {"id": doc_id, "text": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False
+            ).encode('utf-8')
+            f.write(record)
+            offsets.append(offsets[-1] + len(record))
+    with open(os.path.join(path, DOCSTORE_OFFSETS_FILENAME), "wb") as f:
+        offsets.tofile(f)
+
+def has_mmap_docstore(path):
+    return all(
+        os.path.exists(os.path.join(path, filename))
+        for filename in (DOCSTORE_DATA_FILENAME, DOCSTORE_OFFSETS_FILENAME)
+    )
+
+def remove_mmap_docstore(path):
+    """
+    Deletes the documents written by write_mmap_docstore, if any, so they can't be read
+    back with an index they no longer match.
+    """
+    for filename in (DOCSTORE_DATA_FILENAME, DOCSTORE_OFFSETS_FILENAME):
+        try:
+            os.remove(os.path.join(path, filename))
+        except FileNotFoundError:
+            pass
+
+def _map_file(file_path):
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class MmapDocstore(Docstore):
+    """
+    Read-only docstore over the files written by write_mmap_docstore, looked up by index
+    position. Nothing is decoded until a document is requested, and the pages are shared
+    through the OS page cache between processes serving the same index.
+    """
+
+    def __init__(self, path):
+        self._data = _map_file(os.path.join(path, DOCSTORE_DATA_FILENAME))
+        self._offsets_file = _map_file(os.path.join(path, DOCSTORE_OFFSETS_FILENAME))
+        self._offsets = memoryview(self._offsets_file).cast('Q')
+
+    def __len__(self):
+        return max(0, len(self._offsets) - 1)
+
+    def search(self, search):
+        position = int(search)
+        if not 0 <= position < len(self):
+            return f"ID {search} not found."
+        record = json.loads(bytes(self._data[self._offsets[position]:self._offsets[position + 1]]))
+        return Document(id=record["id"], page_content=record["text"], metadata=record["metadata"])
+
+class PositionMapping(Mapping):
+    """
+    Stand-in for FAISS's index_to_docstore_id dict that maps each position to itself,
+    so no per-document dict has to be built at load time.
+    """
+
+    def __init__(self, size):
+        self._size = size
+
+    def __getitem__(self, position):
+        if not 0 <= position < self._size:
+            raise KeyError(position)
+        return position
+
+    def __iter__(self):
+        return iter(range(self._size))
+
+    def __len__(self):
+        return self._size
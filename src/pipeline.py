@@ -0,0 +1,234 @@
+import os
+import sys
+from bisect import bisect_right
+from collections import namedtuple
+from langchain_core.documents import Document
+from .config import (
+    CHARACTERS, INGEST_WORKERS, EMBEDDING_MODEL_NAME, CHUNKING, CHUNK_TOKENS, CHUNK_SIZE, CHUNK_OVERLAP,
+    SEMANTIC_POOLED
+)
+from .chunking import scene_spans, PooledEmbeddings
+from .manifest import Manifest, MANIFEST_FILENAME, hash_file, hash_text
+from .processor import list_script_files, iter_parsed_files
+from .bm25 import BM25Index
+from .metadata_index import MetadataIndex, METADATA_FIELDS, season_of
+from .index_factory import default_index_config, SEARCH_PARAMS
+from .vector_store import get_embeddings, split_text, load_index, save_index, add_items_batched, delete_documents
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+IngestResult = namedtuple(
+    "IngestResult",
+    ["changed_files", "deleted_files", "dialogue_lines", "speakers", "added_chunks", "removed_chunks",
+     "timings", "peak_rss_mb", "decodings"]
+)
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of this process in MB, or None if unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def ingest_settings(characters, index_config, chunking=CHUNKING):
+    """
+    Returns the settings that must match for an existing index to be updated in place.
+    """
+    settings = {
+        "characters": sorted(characters) if characters is not None else None,
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "chunking": chunking,
+        "chunk_tokens": CHUNK_TOKENS,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "chunk_metadata": list(METADATA_FIELDS),
+        "index": {key: value for key, value in index_config.items() if key not in SEARCH_PARAMS},
+    }
+    # Pooling changes the vectors of semantic chunks only
+    if chunking == "semantic":
+        settings["semantic_pooled"] = SEMANTIC_POOLED
+    return settings
+
+def chunk_id(episode, text):
+    """
+    Identifies a chunk by its script and text, so the same words in two episodes are
+    two chunks with their own metadata.
+    """
+    return hash_text(f"{episode}\n{text}")
+
+def chunk_records(episode, records, chunking=CHUNKING, embeddings=None):
+    """
+    Splits one script's dialogue into documents whose metadata names the episode, its
+    season and the speakers of the lines each chunk covers. chunking is "scene",
+    "recursive" or "semantic" (see CHUNKING in the config module); semantic chunking
+    needs embeddings, a PooledEmbeddings that the chunks are then indexed with.
+    """
+    speakers = [record.character for record in records]
+    texts = records.texts()
+    if chunking == "scene":
+        season = season_of(episode)
+        return [
+            Document(page_content="\n".join(texts[start:end]), metadata={
+                "episode": episode,
+                "season": season,
+                "speakers": sorted(set(speakers[start:end])),
+            })
+            for start, end in scene_spans(texts, records.scenes)
+        ]
+
+    text = "\n".join(texts)
+    if chunking == "recursive":
+        docs = split_text(text)
+    elif chunking == "semantic":
+        docs = [Document(page_content=chunk) for chunk in embeddings.semantic_chunks(text)]
+    else:
+        raise ValueError(f"Unknown chunking strategy '{chunking}'")
+
+    starts = []
+    offset = 0
+    for line in texts:
+        starts.append(offset)
+        offset += len(line) + 1
+    season = season_of(episode)
+    start = 0
+    for doc in docs:
+        # Chunks come in order and may overlap, so each one starts at or after the previous start
+        start = max(text.find(doc.page_content, start), start)
+        first = bisect_right(starts, start) - 1
+        last = bisect_right(starts, start + len(doc.page_content) - 1) - 1
+        doc.metadata.update({
+            "episode": episode,
+            "season": season,
+            "speakers": sorted(set(speakers[max(first, 0):last + 1])),
+        })
+    return docs
+
+def iter_new_chunks(parsed_files, manifest, file_hashes, known_chunks, stats, dump_file=None, chunking=CHUNKING,
+                    embeddings=None):
+    """
+    Turns parsed scripts into (document, chunk id) pairs for chunks not in known_chunks,
+    with episode, season and speaker metadata, one script at a time, recording each
+    script's chunks in the manifest as it goes.
+    Dialogue lines are also written to dump_file if one is given. stats is a dict that is
+    updated with line, speaker and timing counts. chunking and embeddings are passed on to
+    chunk_records.
+    """
+    seen = set()
+    for file_path, records, elapsed in parsed_files:
+        name = os.path.basename(file_path)
+        stats["timings"][file_path] = elapsed
+        stats["speakers"].update(records.character_names)
+        texts = records.texts()
+        stats["dialogue_lines"] += len(texts)
+        if dump_file is not None:
+            for line in texts:
+                dump_file.write(line + "\n")
+
+        chunk_ids = []
+        for doc in chunk_records(name, records, chunking, embeddings):
+            doc_id = chunk_id(name, doc.page_content)
+            chunk_ids.append(doc_id)
+            if doc_id not in known_chunks and doc_id not in seen:
+                seen.add(doc_id)
+                stats["added_chunks"] += 1
+                yield doc, doc_id
+            elif embeddings is not None:
+                # Not embedded, so its pooled vector would otherwise stay until the ingest ends
+                embeddings.discard(doc.page_content)
+        manifest.set_file(name, file_hashes[name], chunk_ids)
+
+def incremental_ingest(scripts_dir, index_path, characters=CHARACTERS, workers=INGEST_WORKERS, full=False,
+                       progress=None, dump_path=None, index_config=None, select=None, embeddings=None,
+                       chunking=CHUNKING):
+    """
+    Brings the index at index_path up to date with the scripts in scripts_dir.
+
+    Only new or modified scripts are parsed, only chunks that are not already in the index
+    are embedded, and vectors for chunks that no script produces any more are deleted.
+    A full rebuild happens when full is True, when there is no index yet, or when the
+    recorded settings (characters, embedding model, chunking, index type) differ from the
+    current ones. index_config defaults to the index settings in the config module.
+
+    The work is streamed: scripts are parsed, chunked, embedded and added to the index a
+    bounded batch at a time, so memory use does not grow with the size of the corpus.
+    progress is called with the number of chunks embedded so far. If dump_path is given
+    and everything is re-parsed, the dialogue lines are also written there. select is an
+    optional predicate on script filenames; the index then only covers the scripts it
+    accepts, e.g. those of one shard. embeddings defaults to get_embeddings(). With
+    semantic chunking (and SEMANTIC_POOLED) each sentence is embedded once, and the chunks
+    are indexed with the mean of their sentences' vectors rather than embedded again.
+
+    The result's decodings map the path of each parsed script that wasn't plain UTF-8 to
+    its ScriptDecoding, so scripts with replaced bytes can be reported.
+    """
+    manifest_path = os.path.join(index_path, MANIFEST_FILENAME)
+    if index_config is None:
+        index_config = default_index_config()
+    settings = ingest_settings(characters, index_config, chunking)
+    manifest = Manifest.load(manifest_path)
+    vector_store = None
+    rebuild = full or manifest.settings != settings or not os.path.exists(os.path.join(index_path, "index.faiss"))
+    if rebuild:
+        manifest = Manifest(settings)
+    else:
+        vector_store = load_index(index_path)
+
+    file_paths = {}
+    if os.path.exists(scripts_dir):
+        file_paths = {os.path.basename(path): path for path in list_script_files(scripts_dir)}
+        if select is not None:
+            file_paths = {name: path for name, path in file_paths.items() if select(name)}
+    else:
+        print(f"Warning: Directory {scripts_dir} does not exist.")
+    file_hashes = {name: hash_file(path) for name, path in file_paths.items()}
+    changed = manifest.changed_files(file_hashes)
+    deleted = manifest.deleted_files(file_hashes)
+    known_chunks = manifest.chunk_ids()
+    for name in deleted:
+        manifest.remove_file(name)
+
+    dump_file = None
+    if dump_path is not None and rebuild:
+        os.makedirs(os.path.dirname(dump_path), exist_ok=True)
+        dump_file = open(dump_path, "w", encoding="utf-8")
+
+    if chunking == "semantic":
+        pooled = PooledEmbeddings(embeddings if embeddings is not None else get_embeddings(), pool=SEMANTIC_POOLED)
+        # Without pooling, the chunks are embedded again like any others
+        embeddings = pooled if SEMANTIC_POOLED else pooled.embeddings
+    else:
+        pooled = None
+    stats = {"timings": {}, "speakers": set(), "dialogue_lines": 0, "added_chunks": 0}
+    decodings = {}
+    try:
+        parsed_files = iter_parsed_files([file_paths[name] for name in changed], characters, workers,
+                                         decodings=decodings)
+        items = iter_new_chunks(parsed_files, manifest, file_hashes, known_chunks, stats, dump_file, chunking,
+                                pooled)
+        vector_store = add_items_batched(vector_store, items, embeddings, progress=progress,
+                                         index_config=index_config)
+    finally:
+        if dump_file is not None:
+            dump_file.close()
+
+    # Stale chunks are only known once every changed script has been chunked
+    stale_chunks = sorted(known_chunks - manifest.chunk_ids())
+    if stale_chunks:
+        delete_documents(vector_store, stale_chunks, index_config)
+
+    if vector_store is not None:
+        save_index(vector_store, index_path, index_config, mmap_docstore=True)
+        BM25Index.from_vector_store(vector_store).save(index_path)
+        MetadataIndex.from_vector_store(vector_store).save(index_path)
+    manifest.save(manifest_path)
+
+    return IngestResult(
+        changed, deleted, stats["dialogue_lines"], len(stats["speakers"]), stats["added_chunks"],
+        len(stale_chunks), stats["timings"], peak_rss_mb(), decodings
+    )
@@ -0,0 +1,101 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.callbacks import BaseCallbackHandler
+from .answer_cache import normalize_question
+from .tracing import span
+
+class ToolPrefetcher(BaseCallbackHandler):
+    """
+    Runs tools on the raw question in the background as soon as an agent turn starts,
+    so their results are often ready by the time the model has decided to call them.
+
+    Register it as a callback on the AgentExecutor and wrap the tools' functions with
+    wrap(). The prefetched tools run in parallel with each other and with the model's
+    first generation; a tool called with the same (normalized) input waits for the
+    prefetched result instead of running again. Results are dropped when the turn ends.
+    """
+
+    # Starting the prefetch only submits work; no need for a thread of its own
+    run_inline = True
+
+    def __init__(self, max_workers=4):
+        self.tools = {}
+        self.hits = 0
+        self.misses = 0
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="prefetch")
+        # (tool name, normalized question) -> [future, number of turns using it]
+        self._pending = {}
+        self._turns = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, name, func):
+        """
+        Registers func as the tool called name and returns a drop-in replacement that
+        uses the prefetched result when there is one.
+        """
+        self.tools[name] = func
+
+        def call(query, **kwargs):
+            with self._lock:
+                pending = self._pending.get((name, normalize_question(query)))
+            if pending is not None:
+                try:
+                    result = pending[0].result()
+                    with self._lock:
+                        self.hits += 1
+                    return result
+                except Exception:
+                    pass  # Let the real call fail (or succeed) on its own
+            with self._lock:
+                self.misses += 1
+            return func(query, **kwargs)
+
+        return call
+
+    def start(self, question):
+        """
+        Starts every registered tool on the question.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            for name, func in self.tools.items():
+                pending = self._pending.get((name, key))
+                if pending is None:
+                    # The copied context carries the turn's trace into the pool
+                    future = self._pool.submit(contextvars.copy_context().run, self._prefetch, name, func, question)
+                    self._pending[(name, key)] = [future, 1]
+                else:
+                    pending[1] += 1
+
+    def _prefetch(self, name, func, question):
+        with span("prefetch", name):
+            return func(question)
+
+    def finish(self, question):
+        """
+        Drops the prefetched results for a question once no turn is using them.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            for name in self.tools:
+                pending = self._pending.get((name, key))
+                if pending is not None:
+                    pending[1] -= 1
+                    if pending[1] <= 0:
+                        pending[0].cancel()
+                        del self._pending[(name, key)]
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        question = inputs.get("input") if isinstance(inputs, dict) else None
+        if isinstance(question, str) and question.strip():
+            self._turns[run_id] = question
+            self.start(question)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        question = self._turns.pop(run_id, None)
+        if question is not None:
+            self.finish(question)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
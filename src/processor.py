@@ -1,68 +1,286 @@
 import os
 import re
+import time
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from .config import INGEST_CHUNK_SIZE, SCRIPT_ENCODINGS
+from .script_reader import read_script
+
+# A parenthetical such as "(smiling)" inside a dialogue
+PARENTHETICAL = re.compile(r'\(.*?\)')
+# Characters that rule a stripped line out as a speaker cue: inner whitespace (more than
+# one word) or a digit (a line number)
+NOT_A_CUE = re.compile(r'[\s\d]')
 
 def strip_parentheses(s):
-    return re.sub(r'\(.*?\)', '', s)
+    return PARENTHETICAL.sub('', s)
 
 def is_single_word_all_caps(s):
-    # First, we split the string into words
-    words = s.split()
+    """
+    True for a speaker cue: a single all-caps word without digits.
+    """
+    s = s.strip()
+    return s.isupper() and NOT_A_CUE.search(s) is None
+
+# A scene heading such as "INT. MAIN BRIDGE" or "12  EXT. PLANET SURFACE"
+SCENE_HEADING = re.compile(r'^\d*\s*(INT|EXT)\.')
+
+DialogueRecord = namedtuple("DialogueRecord", ["character", "episode", "scene", "line", "text"])
+
+class DialogueRecords:
+    """
+    Column-oriented store for parsed dialogue.
+
+    Character and episode names are interned into lookup tables and stored as integer
+    codes, scene ordinals and line offsets live in typed arrays, and the dialogue text is
+    kept as one UTF-8 buffer with an offset table. This keeps the parse of a whole corpus
+    compact and cheap to send back from worker processes.
+    """
+
+    def __init__(self):
+        self.character_names = []
+        self.episode_names = []
+        self._character_codes = {}
+        self._episode_codes = {}
+        self.characters = array('I')
+        self.episodes = array('I')
+        self.scenes = array('I')
+        self.lines = array('I')
+        self._text = bytearray()
+        self._text_offsets = array('Q', [0])
+
+    def _code(self, names, codes, name):
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def append(self, character, episode, scene, line, text):
+        self.characters.append(self._code(self.character_names, self._character_codes, character))
+        self.episodes.append(self._code(self.episode_names, self._episode_codes, episode))
+        self.scenes.append(scene)
+        self.lines.append(line)
+        self._text += text.encode('utf-8')
+        self._text_offsets.append(len(self._text))
+
+    def extend(self, other):
+        """
+        Appends all records of another container, remapping its name codes onto ours.
+        """
+        character_map = [self._code(self.character_names, self._character_codes, name) for name in other.character_names]
+        episode_map = [self._code(self.episode_names, self._episode_codes, name) for name in other.episode_names]
+        self.characters.extend(character_map[code] for code in other.characters)
+        self.episodes.extend(episode_map[code] for code in other.episodes)
+        self.scenes.extend(other.scenes)
+        self.lines.extend(other.lines)
+        base = len(self._text)
+        self._text += other._text
+        self._text_offsets.extend(base + offset for offset in other._text_offsets[1:])
 
-    # Check if the string contains only a single word
-    if len(words) != 1:
-        return False
+    def text(self, i):
+        return self._text[self._text_offsets[i]:self._text_offsets[i + 1]].decode('utf-8')
 
-    # Make sure it isn't a line number
-    if bool(re.search(r'\d', words[0])):
-        return False
+    def texts(self, character=None, episode=None):
+        """
+        Returns the dialogue texts in order, optionally only those of one character and/or episode.
+        """
+        character_code = episode_code = None
+        if character is not None:
+            character_code = self._character_codes.get(character)
+            if character_code is None:
+                return []
+        if episode is not None:
+            episode_code = self._episode_codes.get(episode)
+            if episode_code is None:
+                return []
+        return [
+            self.text(i) for i in range(len(self))
+            if (character_code is None or self.characters[i] == character_code)
+            and (episode_code is None or self.episodes[i] == episode_code)
+        ]
 
-    # Check if the single word is in all caps
-    return words[0].isupper()
+    def __len__(self):
+        return len(self.lines)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("record index out of range")
+        return DialogueRecord(
+            self.character_names[self.characters[i]],
+            self.episode_names[self.episodes[i]],
+            self.scenes[i],
+            self.lines[i],
+            self.text(i),
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+def scan_script(text):
+    """
+    Tokenizes a script in one pass and yields (character, scene, cue line, dialogue) for
+    each dialogue: the lines under a speaker cue up to the next blank line, joined with
+    spaces, without parentheticals and with double quotes made single. Scenes and cue
+    lines are counted from 0; a dialogue still open at the end of the text is dropped.
+    """
+    lines = text.split('\n')
+    if lines[-1] == '':
+        # A final newline ends the last line rather than starting an empty one
+        lines.pop()
+
+    in_dialogue = False
+    parts = []
+    character = ''
+    cue_line = 0
+    scene = 0
+    for line_number, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped:
+            if in_dialogue:
+                in_dialogue = False
+                dialogue = strip_parentheses(' '.join(parts)).strip().replace('"', "'")
+                if dialogue:
+                    yield character, scene, cue_line, dialogue
+                parts = []
+            continue
+        if SCENE_HEADING.match(stripped):
+            scene += 1
+        if stripped.isupper() and NOT_A_CUE.search(stripped) is None:
+            # Text under an earlier cue with no blank line since carries over to this speaker
+            in_dialogue = True
+            character = stripped
+            cue_line = line_number
+        elif in_dialogue:
+            parts.append(stripped)
+
+def extract_dialogues(file_path, characters=None, records=None, decodings=None):
+    """
+    Parses a script file in a single pass and appends a record for every dialogue to records.
+    If characters is given, only those speakers are kept. Returns the records container.
+    If a decodings dict is given and the script wasn't plain UTF-8 (another encoding was
+    used, or bytes had to be replaced), its ScriptDecoding is stored under file_path.
+    """
+    if records is None:
+        records = DialogueRecords()
+    if characters is not None:
+        characters = set(characters)
+    episode = os.path.basename(file_path)
+
+    text, decoding = read_script(file_path)
+    if decodings is not None and (decoding.encoding != SCRIPT_ENCODINGS[0] or decoding.substitutions):
+        decodings[file_path] = decoding
+
+    for character, scene, cue_line, dialogue in scan_script(text):
+        if characters is None or character in characters:
+            records.append(character, episode, scene, cue_line, dialogue)
+    return records
 
 def extract_character_lines(file_path, character_name, dialogues_list):
     """
     Extracts lines for a specific character from a script file and appends them to the provided list.
     """
-    lines = []
-    with open(file_path, 'r') as script_file:
-        try:
-          lines = script_file.readlines()
-        except UnicodeDecodeError:
-          pass
-
-    is_character_line = False
-    current_line = ''
-    current_character = ''
-    for line in lines:
-        strippedLine = line.strip()
-        if (is_single_word_all_caps(strippedLine)):
-            is_character_line = True
-            current_character = strippedLine
-        elif (line.strip() == '') and is_character_line:
-            is_character_line = False
-            dialog_line = strip_parentheses(current_line).strip()
-            dialog_line = dialog_line.replace('"', "'")
-            if (current_character == character_name and len(dialog_line)>0):
-                dialogues_list.append(dialog_line)
-            current_line = ''
-        elif is_character_line:
-            current_line += line.strip() + ' '
-
-def process_directory(directory_path, character_name):
+    dialogues_list.extend(extract_dialogues(file_path, [character_name]).texts())
+
+def list_script_files(directory_path):
     """
-    Processes all files in the directory and returns a list of dialogues for the character.
+    Returns the paths of the script files in the directory, sorted by filename.
     """
-    dialogues = []
-    if not os.path.exists(directory_path):
-        print(f"Warning: Directory {directory_path} does not exist.")
-        return dialogues
-        
-    for filename in os.listdir(directory_path):
+    file_paths = []
+    for filename in sorted(os.listdir(directory_path)):
         file_path = os.path.join(directory_path, filename)
         if os.path.isfile(file_path):  # Ignore directories
-            extract_character_lines(file_path, character_name, dialogues)
-            
-    return dialogues
+            file_paths.append(file_path)
+    return file_paths
+
+def _extract_files(file_paths, characters):
+    """
+    Parses a batch of scripts and returns (records, elapsed seconds, decodings) for each
+    one, decodings being the extract_dialogues report. Module-level so it can be sent to
+    worker processes.
+    """
+    results = []
+    for file_path in file_paths:
+        start = time.perf_counter()
+        decodings = {}
+        records = extract_dialogues(file_path, characters, decodings=decodings)
+        results.append((records, time.perf_counter() - start, decodings))
+    return results
+
+def iter_parsed_files(file_paths, characters=None, workers=1, chunk_size=INGEST_CHUNK_SIZE, decodings=None):
+    """
+    Yields (file_path, records, elapsed seconds) for each script, in the order of file_paths.
+
+    With workers > 1 the scripts are parsed in a process pool, handed out in batches of
+    chunk_size files. At most two batches per worker are outstanding at a time, so parsed
+    results never pile up faster than the consumer takes them. If a decodings dict is
+    given, scripts that weren't plain UTF-8 are reported in it (see extract_dialogues).
+    """
+    def parsed(batch, results):
+        for file_path, (records, elapsed, file_decodings) in zip(batch, results):
+            if decodings is not None:
+                decodings.update(file_decodings)
+            yield file_path, records, elapsed
+
+    batches = [file_paths[i:i + chunk_size] for i in range(0, len(file_paths), chunk_size)]
+    if workers <= 1 or len(file_paths) <= 1:
+        for batch in batches:
+            yield from parsed(batch, _extract_files(batch, characters))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, pool.submit(_extract_files, batch, characters)))
+            if len(pending) < workers * 2:
+                continue
+            done_batch, future = pending.popleft()
+            yield from parsed(done_batch, future.result())
+        while pending:
+            done_batch, future = pending.popleft()
+            yield from parsed(done_batch, future.result())
+
+def parse_files(file_paths, characters=None, workers=1, chunk_size=INGEST_CHUNK_SIZE, timings=None,
+                decodings=None):
+    """
+    Parses the given scripts once and returns the dialogue records for the given characters
+    (or for every speaker when characters is None).
+
+    Results are merged in the order of file_paths, so the output does not depend on the
+    worker count (see iter_parsed_files). If a timings dict is given it is filled with the
+    parse time in seconds for each file path; a decodings dict gets the scripts that
+    weren't plain UTF-8.
+    """
+    records = DialogueRecords()
+    parsed_files = iter_parsed_files(file_paths, characters, workers, chunk_size, decodings)
+    for file_path, file_records, elapsed in parsed_files:
+        records.extend(file_records)
+        if timings is not None:
+            timings[file_path] = elapsed
+    return records
+
+def collect_dialogues(directory_path, characters=None, workers=1, chunk_size=INGEST_CHUNK_SIZE, timings=None,
+                      decodings=None):
+    """
+    Parses every script in the directory, in filename order. See parse_files for the options.
+    """
+    if not os.path.exists(directory_path):
+        print(f"Warning: Directory {directory_path} does not exist.")
+        return DialogueRecords()
+
+    return parse_files(list_script_files(directory_path), characters, workers, chunk_size, timings, decodings)
+
+def process_directory(directory_path, character_name, workers=1, chunk_size=INGEST_CHUNK_SIZE, timings=None):
+    """
+    Processes all files in the directory and returns a list of dialogues for the character.
+    See collect_dialogues for the worker, chunk_size and timings options.
+    """
+    records = collect_dialogues(directory_path, [character_name], workers, chunk_size, timings)
+    return records.texts()
 
 def save_dialogues(dialogues, output_path):
     """
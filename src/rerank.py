@@ -0,0 +1,122 @@
+import math
+import numpy as np
+from .bm25 import BM25Index
+from .config import CHUNK_OVERLAP, RERANK_CROSS_ENCODER_MODEL
+
+# Shortest shared run of characters treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+
+def estimate_tokens(text):
+    """
+    Rough token count for budgeting prompts: about four characters per token.
+    """
+    return math.ceil(len(text) / 4)
+
+class LexicalScorer:
+    """
+    Scores candidates by BM25 against the query, with statistics from the candidates
+    themselves. Free, but only sees shared words.
+    """
+
+    def __call__(self, query, texts):
+        scores = [0.0] * len(texts)
+        for position, score in BM25Index.from_texts(texts).search(query, len(texts)):
+            scores[position] = score
+        return scores
+
+class EmbeddingScorer:
+    """
+    Scores candidates by cosine similarity to the query. With the embedding cache in
+    front of the model, the chunks' vectors are usually cached since ingest.
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def __call__(self, query, texts):
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        return (vectors @ query_vector / np.where(norms == 0, 1.0, norms)).tolist()
+
+class CrossEncoderScorer:
+    """
+    Scores (query, candidate) pairs with a local cross-encoder from sentence-transformers,
+    the most accurate and most expensive option.
+    """
+
+    def __init__(self, model_name=RERANK_CROSS_ENCODER_MODEL):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError(
+                "The cross-encoder scorer needs sentence-transformers: pip install sentence-transformers"
+            ) from e
+        self.model = CrossEncoder(model_name)
+
+    def __call__(self, query, texts):
+        return [float(score) for score in self.model.predict([(query, text) for text in texts])]
+
+def make_scorer(name, embeddings=None):
+    """
+    Returns the scorer called name: "lexical", "embedding" or "cross-encoder".
+    """
+    if name == "lexical":
+        return LexicalScorer()
+    if name == "embedding":
+        if embeddings is None:
+            from .vector_store import get_embeddings
+            embeddings = get_embeddings()
+        return EmbeddingScorer(embeddings)
+    if name == "cross-encoder":
+        return CrossEncoderScorer()
+    raise ValueError(f"Unknown rerank scorer '{name}'")
+
+def overlap_length(first, second, max_chars=2 * CHUNK_OVERLAP):
+    """
+    Returns how many characters at the end of first repeat at the start of second.
+    """
+    for length in range(min(len(first), len(second), max_chars), MIN_OVERLAP_CHARS - 1, -1):
+        if first[-length:] == second[:length]:
+            return length
+    return 0
+
+def trim_overlap(text, kept):
+    """
+    Returns text without the parts it shares with the already kept texts: None if one
+    of them contains it, otherwise text with a shared head or tail cut off.
+    """
+    for other in kept:
+        if text in other:
+            return None
+        head = overlap_length(other, text)
+        if head:
+            text = text[head:].lstrip()
+        tail = overlap_length(text, other)
+        if tail:
+            text = text[:-tail].rstrip()
+        if not text:
+            return None
+    return text
+
+def select_documents(docs, scores, top_n, token_budget):
+    """
+    Keeps the best scoring documents, at most top_n of them and within token_budget
+    estimated tokens, with the text they share with better ones removed. Returns copies
+    in score order; ties keep the order the retriever found them in.
+    """
+    order = sorted(range(len(docs)), key=lambda i: -scores[i])
+    selected = []
+    used = 0
+    for i in order:
+        if len(selected) == top_n:
+            break
+        text = trim_overlap(docs[i].page_content, [doc.page_content for doc in selected])
+        if text is None:
+            continue
+        tokens = estimate_tokens(text)
+        if selected and used + tokens > token_budget:
+            continue
+        used += tokens
+        selected.append(docs[i].model_copy(update={"page_content": text}))
+    return selected
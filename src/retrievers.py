@@ -0,0 +1,166 @@
+import re
+from typing import Any, Optional
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+from .bm25 import BM25Index, tokenize
+from .metadata_index import MetadataIndex
+from .rerank import make_scorer, select_documents
+from .vector_store import similarity_search_subset
+from .tracing import span
+from .config import (
+    HYBRID_FETCH_K, RRF_K, LEXICAL_CONFIDENCE_RATIO, RERANK_FETCH_K, RERANK_TOP_N, RERANK_TOKEN_BUDGET,
+    RERANK_SCORER
+)
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have he her his how i in is it its "
+    "me my of on or said say says she so that the their them they this to was we were what when "
+    "where which who why with you your".split()
+)
+
+def quoted_phrases(query):
+    return [phrase.strip() for phrase in re.findall(r'"([^"]+)"', query) if phrase.strip()]
+
+def _normalize(text):
+    return " ".join(tokenize(text))
+
+def filter_positions(metadata_index, query):
+    """
+    Returns the index positions of the chunks matching the episode, season and speaker
+    filters named in the query, or None to search everything (no filters, or no match).
+    """
+    if metadata_index is None:
+        return None
+    positions = metadata_index.positions(metadata_index.filters_for(query))
+    if positions is None or len(positions) == 0:
+        return None
+    return positions
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that fuses BM25 and dense vector results with reciprocal rank fusion.
+
+    When the lexical results alone are convincing (every quoted phrase of the query, or
+    every content word of it, appears in the top BM25 hit and that hit clearly outscores
+    the next one) they are returned directly, skipping the query embedding entirely.
+
+    With a MetadataIndex, a query naming a season, episode or speaker only searches the
+    matching chunks, in both BM25 and the vector index.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_store: Any
+    bm25: BM25Index
+    k: int = 10
+    fetch_k: int = HYBRID_FETCH_K
+    rrf_k: int = RRF_K
+    confidence_ratio: float = LEXICAL_CONFIDENCE_RATIO
+    lexical_shortcut: bool = True
+    metadata_index: Optional[MetadataIndex] = None
+
+    def _document(self, position):
+        return self.vector_store.docstore.search(self.vector_store.index_to_docstore_id[position])
+
+    def is_confident(self, query, lexical_docs, lexical_scores):
+        """
+        Returns True if the top lexical hit is good enough to answer without vector search.
+        """
+        if not lexical_docs:
+            return False
+        top_text = _normalize(lexical_docs[0].page_content)
+        phrases = quoted_phrases(query)
+        if phrases:
+            return all(_normalize(phrase) in top_text for phrase in phrases)
+        terms = {term for term in tokenize(query) if term not in STOPWORDS}
+        if not terms or not terms <= set(top_text.split()):
+            return False
+        return len(lexical_scores) == 1 or lexical_scores[0] >= self.confidence_ratio * lexical_scores[1]
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        positions = filter_positions(self.metadata_index, query)
+        with span("search", "bm25"):
+            lexical = self.bm25.search(query, self.fetch_k, positions)
+            lexical_docs = [self._document(position) for position, _ in lexical]
+        if self.lexical_shortcut and self.is_confident(query, lexical_docs, [score for _, score in lexical]):
+            return lexical_docs[:self.k]
+
+        with span("search", "faiss"):
+            if positions is None:
+                dense_docs = self.vector_store.similarity_search(query, k=self.fetch_k)
+            else:
+                dense_docs = similarity_search_subset(self.vector_store, query, self.fetch_k, positions)
+        scores = {}
+        docs = {}
+        for ranking in (lexical_docs, dense_docs):
+            for rank, doc in enumerate(ranking):
+                key = doc.id or doc.page_content
+                docs.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        best = sorted(scores, key=scores.get, reverse=True)[:self.k]
+        return [docs[key] for key in best]
+
+class FilteredVectorRetriever(BaseRetriever):
+    """
+    Vector search that, for a query naming a season, episode or speaker, only searches
+    the chunks whose metadata matches.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_store: Any
+    metadata_index: MetadataIndex
+    k: int = 10
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        positions = filter_positions(self.metadata_index, query)
+        with span("search", "faiss"):
+            if positions is None:
+                return self.vector_store.similarity_search(query, k=self.k)
+            return similarity_search_subset(self.vector_store, query, self.k, positions)
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Retriever that reranks another retriever's candidates with a scorer (a callable
+    taking the query and the candidate texts and returning one score per text) and
+    passes on only the best top_n, within token_budget estimated tokens and without
+    the text neighbouring chunks share through the splitter's overlap.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    base: BaseRetriever
+    scorer: Any
+    top_n: int = RERANK_TOP_N
+    token_budget: int = RERANK_TOKEN_BUDGET
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        docs = self.base.invoke(query, config={"callbacks": run_manager.get_child()})
+        if not docs:
+            return []
+        with span("rerank", type(self.scorer).__name__, candidates=len(docs)):
+            scores = self.scorer(query, [doc.page_content for doc in docs])
+        return select_documents(docs, scores, self.top_n, self.token_budget)
+
+def build_retriever(vector_store, index_path, k, hybrid=True, rerank=False, scorer=RERANK_SCORER):
+    """
+    Returns the retriever for the chatbot: hybrid BM25 + vector search if a BM25 index
+    was saved with the vector store and hybrid is enabled, plain vector search otherwise.
+    Either one is pre-filtered by chunk metadata if a metadata index was saved too.
+    With rerank, it fetches RERANK_FETCH_K candidates (or k, if more) and reranks them
+    with the named scorer.
+    """
+    fetch_k = max(k, RERANK_FETCH_K) if rerank else k
+    bm25 = BM25Index.load(index_path) if hybrid else None
+    metadata_index = MetadataIndex.load(index_path)
+    if metadata_index is not None and len(metadata_index) != vector_store.index.ntotal:
+        metadata_index = None
+    if bm25 is not None and len(bm25) == vector_store.index.ntotal:
+        retriever = HybridRetriever(vector_store=vector_store, bm25=bm25, k=fetch_k, metadata_index=metadata_index)
+    elif metadata_index is not None:
+        retriever = FilteredVectorRetriever(vector_store=vector_store, metadata_index=metadata_index, k=fetch_k)
+    else:
+        retriever = vector_store.as_retriever(search_kwargs={"k": fetch_k})
+    if rerank:
+        return RerankingRetriever(base=retriever, scorer=make_scorer(scorer, vector_store.embeddings))
+    return retriever
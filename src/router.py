@@ -0,0 +1,89 @@
+import logging
+import re
+import threading
+from .retrievers import quoted_phrases
+from .config import SPEAKER_FILTER_NAMES
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_ROUTE = "retrieval"
+AGENT_ROUTE = "agent"
+
+# Questions about the show's dialogue, answerable from the scripts alone
+SCRIPT_CUES = re.compile(
+    r"\b(say|says|said|saying|line|lines|quote|quotes|quoted|dialogue)\b",
+    re.IGNORECASE,
+)
+# Parts of the scripts, only a cue together with a character's name: "Which episode has
+# Data's cat?" is about the scripts, "Who wrote the episode ...?" about the real show
+SCRIPT_PART_CUES = re.compile(r"\b(episode|episodes|scene|scenes|script|scripts)\b", re.IGNORECASE)
+# Characters, named capitalized ("Data", "DATA") so everyday words like "data" don't count
+SPEAKER_CUES = re.compile(
+    r"\b(" + "|".join(re.escape(form) for name in SPEAKER_FILTER_NAMES for form in (name, name.title())) + r")\b"
+)
+# Questions about the real world, or that explicitly want a web search
+WEB_CUES = re.compile(
+    r"\b(today|current|currently|latest|news|recent|recently|actor|actress|played|plays|cast|real[- ]life|"
+    r"born|died|filmed|producer|produced|director|directed|writer|aired|ratings|wikipedia|website|internet|"
+    r"web|online|search|google)\b|https?://",
+    re.IGNORECASE,
+)
+
+def classify_question(question):
+    """
+    Returns (route, reason). Questions that clearly ask about the scripts go to the
+    single-shot retrieval chain; everything else, including questions that also need
+    outside knowledge, goes to the agent.
+    """
+    web = WEB_CUES.search(question)
+    if web:
+        return AGENT_ROUTE, f"web cue '{web.group(0)}'"
+    if quoted_phrases(question):
+        return RETRIEVAL_ROUTE, "quoted phrase"
+    script = SCRIPT_CUES.search(question)
+    if script:
+        return RETRIEVAL_ROUTE, f"script cue '{script.group(0)}'"
+    part, speaker = SCRIPT_PART_CUES.search(question), SPEAKER_CUES.search(question)
+    if part and speaker:
+        return RETRIEVAL_ROUTE, f"script cue '{part.group(0)}' with speaker '{speaker.group(0)}'"
+    return AGENT_ROUTE, "no script cue"
+
+class QueryRouter:
+    """
+    Picks the chain that answers each question and keeps per-route counts and timings.
+    query_chain and astream_chain accept a QueryRouter wherever they accept a chain.
+    """
+
+    def __init__(self, agent, retrieval_chain, classify=classify_question):
+        self.chains = {AGENT_ROUTE: agent, RETRIEVAL_ROUTE: retrieval_chain}
+        self.classify = classify
+        self._stats = {route: {"count": 0, "seconds": 0.0} for route in self.chains}
+        self._lock = threading.Lock()
+
+    @property
+    def agent(self):
+        return self.chains[AGENT_ROUTE]
+
+    def route(self, question):
+        """
+        Returns (route, reason, chain) for a question.
+        """
+        route, reason = self.classify(question)
+        logger.info("route=%s reason=%s question=%r", route, reason, question)
+        return route, reason, self.chains[route]
+
+    def record(self, route, seconds):
+        """
+        Records how long a question on the given route took to answer.
+        """
+        with self._lock:
+            self._stats[route]["count"] += 1
+            self._stats[route]["seconds"] += seconds
+        logger.info("route=%s latency=%.3fs", route, seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                route: {**s, "mean_seconds": s["seconds"] / s["count"] if s["count"] else None}
+                for route, s in self._stats.items()
+            }
@@ -0,0 +1,72 @@
+import codecs
+import mmap
+import os
+from collections import namedtuple
+from .config import SCRIPT_ENCODINGS
+
+# How a script was decoded: the encoding used and the number of undecodable byte
+# sequences replaced with U+FFFD
+ScriptDecoding = namedtuple("ScriptDecoding", ["encoding", "substitutions"])
+
+REPLACEMENT_CHARACTER = "\ufffd"
+
+def _newlines(text):
+    """
+    Translates \\r\\n and \\r to \\n, as reading the file in text mode does.
+    """
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+def decode_script(data, encodings=SCRIPT_ENCODINGS):
+    """
+    Decodes the bytes of a script (any buffer, such as an mmap) and returns (text,
+    ScriptDecoding).
+
+    A UTF-16 byte order mark picks UTF-16; otherwise each encoding is tried in turn on the
+    same buffer. If none fits, the first one is used with undecodable bytes replaced, so a
+    bad byte costs a character rather than the whole script.
+
+    A UTF-8 script with a few stray bytes isn't handed to the next encoding: if its valid
+    non-ASCII characters outnumber its undecodable sequences, it is decoded as UTF-8 with
+    those replaced, rather than turning every one of its multi-byte characters into
+    mojibake.
+    """
+    if data[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+        encodings = ("utf-16", *encodings)
+    for encoding in encodings:
+        try:
+            text = str(data, encoding)
+        except UnicodeDecodeError:
+            if codecs.lookup(encoding).name == "utf-8":
+                text, substitutions, non_ascii = _decode_replacing(data, encoding)
+                if non_ascii > substitutions:
+                    return _newlines(text), ScriptDecoding(encoding, substitutions)
+            continue
+        return _newlines(text), ScriptDecoding(encoding, 0)
+
+    text, substitutions, _ = _decode_replacing(data, encodings[0])
+    return _newlines(text), ScriptDecoding(encodings[0], substitutions)
+
+def _decode_replacing(data, encoding):
+    """
+    Decodes data with undecodable byte sequences replaced by U+FFFD and returns (text,
+    number of replaced sequences, number of non-ASCII characters decoded correctly).
+    """
+    text = str(data, encoding, errors="replace")
+    valid = str(data, encoding, errors="ignore")
+    # U+FFFD characters that were in the script itself aren't substitutions
+    substitutions = text.count(REPLACEMENT_CHARACTER) - valid.count(REPLACEMENT_CHARACTER)
+    non_ascii = len(valid) - len(valid.encode("ascii", errors="ignore"))
+    return text, substitutions, non_ascii
+
+def read_script(file_path, encodings=SCRIPT_ENCODINGS):
+    """
+    Memory-maps a script file and returns (text, ScriptDecoding); see decode_script.
+    The file is read once, however many encodings are tried.
+    """
+    with open(file_path, "rb") as script_file:
+        if os.fstat(script_file.fileno()).st_size == 0:
+            return "", ScriptDecoding(encodings[0], 0)
+        with mmap.mmap(script_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return decode_script(data, encodings)
@@ -0,0 +1,223 @@
+import asyncio
+import json
+from contextlib import aclosing
+from aiohttp import web, WSMsgType
+from .chatbot import astream_chain
+from .router import QueryRouter
+from .tracing import get_tracer
+from .config import (
+    SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_QUEUE_SIZE, SERVER_REQUEST_TIMEOUT
+)
+
+class ServerBusy(Exception):
+    """
+    Raised when a question arrives while the request queue is full.
+    """
+
+class ChatJob:
+    """
+    One question waiting for, or being answered by, a worker. The worker puts the
+    events from astream_chain on events and None when it is finished.
+    """
+
+    def __init__(self, question):
+        self.question = question
+        self.events = asyncio.Queue()
+        self.cancelled = False
+
+class ChatServer:
+    """
+    Serves one loaded agent to many concurrent chat sessions over HTTP and WebSocket.
+
+    Questions wait in a queue for one of `workers` agent runs. Once queue_size questions
+    are waiting, new ones are turned away (HTTP 503) instead of joining a backlog they
+    would time out in. Each run is cut off after timeout seconds.
+    """
+
+    def __init__(self, chain, cache=None, workers=SERVER_WORKERS, queue_size=SERVER_QUEUE_SIZE,
+                 timeout=SERVER_REQUEST_TIMEOUT):
+        self.chain = chain
+        self.cache = cache
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._queue = None
+        self._tasks = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(self.queue_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def submit(self, question):
+        """
+        Queues a question and returns its ChatJob, or raises ServerBusy if the queue is full.
+        """
+        job = ChatJob(question)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ServerBusy(f"{self.queue_size} questions are already waiting")
+        return job
+
+    async def ask(self, question):
+        """
+        Queues a question and yields its (kind, payload) events as the agent produces
+        them; ("error", message) if the run fails. Leaving early cancels the run.
+        """
+        job = self.submit(question)
+        try:
+            while (event := await job.events.get()) is not None:
+                yield event
+        finally:
+            job.cancelled = True
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                # Skip questions whose client went away while they were waiting
+                if not job.cancelled:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _stream(self, job):
+        async with aclosing(astream_chain(self.chain, job.question, self.cache)) as events:
+            async for event in events:
+                if job.cancelled:
+                    break
+                job.events.put_nowait(event)
+
+    async def _run(self, job):
+        self.running += 1
+        try:
+            # wait_for rather than asyncio.timeout, which needs Python 3.11
+            await asyncio.wait_for(self._stream(job), self.timeout)
+            self.completed += 1
+        except asyncio.TimeoutError:
+            self.failed += 1
+            job.events.put_nowait(("error", f"No answer within {self.timeout} seconds"))
+        except Exception as e:
+            self.failed += 1
+            job.events.put_nowait(("error", str(e)))
+        finally:
+            self.running -= 1
+            job.events.put_nowait(None)
+
+    async def handle_chat(self, request):
+        """
+        POST /chat with {"question": ...}; answers with the whole answer, the agent's
+        steps and timings once the run is finished.
+        """
+        try:
+            question = str((await request.json()).get("question", "")).strip()
+        except (json.JSONDecodeError, AttributeError):
+            question = ""
+        if not question:
+            return web.json_response({"error": "Expected a JSON body with a question"}, status=400)
+
+        steps = []
+        try:
+            async for kind, payload in self.ask(question):
+                if kind == "step":
+                    steps.append(payload)
+                elif kind == "error":
+                    return web.json_response({"error": payload}, status=500)
+                elif kind == "done":
+                    return web.json_response({"answer": payload["output"], "steps": steps, **{
+                        key: payload[key] for key in ("route", "ttft", "elapsed", "cached", "trace_id")
+                    }})
+        except ServerBusy as e:
+            return web.json_response({"error": str(e)}, status=503, headers={"Retry-After": "1"})
+        return web.json_response({"error": "The agent finished without an answer"}, status=500)
+
+    async def handle_websocket(self, request):
+        """
+        GET /ws; a chat session. Each text message is a question, either plain text or
+        {"question": ...}, answered with a stream of {"type": "step" | "token" | "done"
+        | "error", "data": ...} messages.
+        """
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            try:
+                question = str(json.loads(message.data).get("question", ""))
+            except (json.JSONDecodeError, AttributeError):
+                question = message.data
+            question = question.strip()
+            if not question:
+                await ws.send_json({"type": "error", "data": "Empty question"})
+                continue
+            try:
+                async for kind, payload in self.ask(question):
+                    await ws.send_json({"type": kind, "data": payload})
+            except ServerBusy as e:
+                await ws.send_json({"type": "error", "data": f"Server busy: {e}"})
+            except ConnectionResetError:
+                break
+        return ws
+
+    async def handle_health(self, request):
+        health = {"status": "ok", **self.stats()}
+        if isinstance(self.chain, QueryRouter):
+            health["routes"] = self.chain.stats()
+        return web.json_response(health)
+
+    async def handle_metrics(self, request):
+        """
+        GET /metrics; the tracer's per-stage latency and token metrics and the server's
+        own counters, in the Prometheus text format.
+        """
+        gauges = {
+            f"chatbot_server_{key}": (f"Server {key.replace('_', ' ')} requests.", value)
+            for key, value in self.stats().items() if key != "workers"
+        }
+        gauges["chatbot_server_workers"] = ("Agent runs allowed at once.", self.workers)
+        return web.Response(text=get_tracer().prometheus(gauges), content_type="text/plain")
+
+    def make_app(self):
+        async def on_startup(app):
+            await self.start()
+
+        async def on_cleanup(app):
+            await self.stop()
+
+        app = web.Application()
+        app.router.add_post("/chat", self.handle_chat)
+        app.router.add_get("/ws", self.handle_websocket)
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.on_startup.append(on_startup)
+        app.on_cleanup.append(on_cleanup)
+        return app
+
+def run_server(chain, cache=None, host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS,
+               queue_size=SERVER_QUEUE_SIZE, timeout=SERVER_REQUEST_TIMEOUT):
+    """
+    Serves the agent until interrupted.
+    """
+    server = ChatServer(chain, cache, workers, queue_size, timeout)
+    web.run_app(server.make_app(), host=host, port=port)
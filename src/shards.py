@@ -0,0 +1,352 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+from .config import (
+    SHARD_BY, SERIES_DIRS, SERIES_ALIASES, SHARD_SEARCH_THREADS, SHARD_REFRESH_INTERVAL, SHARD_KEEP_VERSIONS,
+    RERANK_FETCH_K, RERANK_SCORER
+)
+from .metadata_index import MetadataIndex, SEASON_PATTERN, season_of
+from .pipeline import incremental_ingest
+from .processor import list_script_files
+from .rerank import make_scorer
+from .retrievers import build_retriever, RerankingRetriever
+from .tracing import span
+from .vector_store import load_index, get_embeddings
+
+logger = logging.getLogger(__name__)
+
+# Each shard directory holds one directory per version and a file naming the current one
+CURRENT_FILENAME = "CURRENT"
+SHARD_INFO_FILENAME = "shard.json"
+
+def shard_name(series, episode, shard_by):
+    """
+    Returns the shard a script belongs to: its series ("tng"), or its series and season
+    ("tng-season3", or "tng-other" if the filename gives no season).
+    """
+    if shard_by == "series":
+        return series
+    if shard_by != "season":
+        raise ValueError(f"Unknown shard key '{shard_by}'")
+    season = season_of(episode)
+    return f"{series}-season{season}" if season is not None else f"{series}-other"
+
+def plan_shards(series_dirs, shard_by):
+    """
+    Groups the scripts of every series into shards. Returns {shard name: (series,
+    scripts dir, set of script filenames)}.
+    """
+    plan = {}
+    for series, scripts_dir in series_dirs.items():
+        if not os.path.exists(scripts_dir):
+            print(f"Warning: Directory {scripts_dir} does not exist.")
+            continue
+        for file_path in list_script_files(scripts_dir):
+            name = os.path.basename(file_path)
+            plan.setdefault(shard_name(series, name, shard_by), (series, scripts_dir, set()))[2].add(name)
+    return plan
+
+def current_version(shard_path):
+    """
+    Returns the name of the published version of a shard, or None if there is none.
+    """
+    try:
+        with open(os.path.join(shard_path, CURRENT_FILENAME), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def list_shards(shards_path):
+    """
+    Returns {shard name: (directory of its current version, info)} for the shards
+    published under shards_path. info holds the shard's series and seasons.
+    """
+    shards = {}
+    if not os.path.isdir(shards_path):
+        return shards
+    for name in sorted(os.listdir(shards_path)):
+        version = current_version(os.path.join(shards_path, name))
+        if version is None:
+            continue
+        version_path = os.path.join(shards_path, name, version)
+        try:
+            with open(os.path.join(version_path, SHARD_INFO_FILENAME), encoding="utf-8") as f:
+                shards[name] = (version_path, json.load(f))
+        except FileNotFoundError:
+            continue  # Pruned since CURRENT was read; the next listing has the new version
+    return shards
+
+def _publish(shard_path, version):
+    # Searches read CURRENT at any time, so it's replaced atomically instead of rewritten
+    temp_path = os.path.join(shard_path, CURRENT_FILENAME + ".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(temp_path, os.path.join(shard_path, CURRENT_FILENAME))
+
+def _prune(shard_path, keep):
+    current = current_version(shard_path)
+    versions = sorted(entry for entry in os.listdir(shard_path)
+                      if entry.startswith("v") and os.path.isdir(os.path.join(shard_path, entry)))
+    for version in versions[:-keep] if keep > 0 else versions:
+        if version != current:
+            shutil.rmtree(os.path.join(shard_path, version), ignore_errors=True)
+
+def build_shard(shards_path, name, series, scripts_dir, files, full=False, keep_versions=SHARD_KEEP_VERSIONS,
+                **ingest_kwargs):
+    """
+    Brings one shard up to date with the given scripts of scripts_dir and publishes it,
+    without touching the other shards or the version that searches are using.
+
+    The new version is built in a directory of its own, starting from a copy of the
+    current one so that only changed scripts are parsed and embedded, and then made
+    current by atomically replacing the shard's CURRENT file; a running ShardSet picks it
+    up on its next refresh. If nothing changed the current version stays; if no scripts
+    are left the shard is removed. ingest_kwargs are passed on to incremental_ingest.
+    """
+    shard_path = os.path.join(shards_path, name)
+    os.makedirs(shard_path, exist_ok=True)
+    current = current_version(shard_path)
+    version = f"v{time.time_ns()}"
+    version_path = os.path.join(shard_path, version)
+    if current is not None and not full:
+        shutil.copytree(os.path.join(shard_path, current), version_path)
+    result = incremental_ingest(scripts_dir, version_path, full=full, select=lambda filename: filename in files,
+                                **ingest_kwargs)
+
+    if current is not None and not full and not result.changed_files and not result.deleted_files:
+        shutil.rmtree(version_path)
+        return result
+    if not os.path.exists(os.path.join(version_path, "index.faiss")):
+        shutil.rmtree(shard_path, ignore_errors=True)
+        return result
+    seasons = sorted(int(season) for season in MetadataIndex.load(version_path).values("season"))
+    with open(os.path.join(version_path, SHARD_INFO_FILENAME), "w", encoding="utf-8") as f:
+        json.dump({"name": name, "series": series, "seasons": seasons}, f)
+    _publish(shard_path, version)
+    _prune(shard_path, keep_versions)
+    return result
+
+def ingest_shards(shards_path, series_dirs=SERIES_DIRS, shard_by=SHARD_BY, only=None, full=False, **ingest_kwargs):
+    """
+    Brings every shard, or only the ones named in only, up to date with the scripts of
+    series_dirs ({series: scripts dir}), split by series or by season. Shards whose
+    scripts are all gone are removed. Returns {shard name: IngestResult, or None for a
+    removed shard}.
+    """
+    plan = plan_shards(series_dirs, shard_by)
+    results = {}
+    for name in sorted(set(plan) | set(list_shards(shards_path))):
+        if only and name not in only:
+            continue
+        if name in plan:
+            series, scripts_dir, files = plan[name]
+            results[name] = build_shard(shards_path, name, series, scripts_dir, files, full, **ingest_kwargs)
+        else:
+            shutil.rmtree(os.path.join(shards_path, name), ignore_errors=True)
+            results[name] = None
+    return results
+
+class ShardSet:
+    """
+    The shards published under a directory. Each one is loaded the first time a query
+    needs it, and swapped for its new version when it is rebuilt while the chatbot runs.
+
+    load is called with the directory of a shard version and returns a retriever for it.
+    refresh() picks up new, rebuilt and removed shards. Searches start it in a background
+    thread at most every refresh_interval seconds (see refresh_in_background). A rebuilt
+    shard that was in use is loaded before it replaces the old version, so searches never
+    wait for it; searches keep using the old one until the new one is swapped in.
+    """
+
+    def __init__(self, path, load, aliases=SERIES_ALIASES, refresh_interval=SHARD_REFRESH_INTERVAL,
+                 max_workers=SHARD_SEARCH_THREADS):
+        self.path = path
+        self.load = load
+        self.aliases = aliases
+        self.refresh_interval = refresh_interval
+        self.loads = 0
+        self.swaps = 0
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="shard")
+        # name -> (version directory, info), and version directory -> loaded retriever
+        self._shards = {}
+        self._retrievers = {}
+        self._loading = {}
+        self._checked = None
+        self._refresher = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.refresh()
+
+    def __len__(self):
+        return len(self._shards)
+
+    def names(self):
+        return list(self._shards)
+
+    def loaded(self):
+        """
+        Returns the names of the shards whose current version is loaded.
+        """
+        with self._lock:
+            return [name for name, (version_path, _) in self._shards.items() if version_path in self._retrievers]
+
+    def refresh(self, force=True):
+        """
+        Re-reads which shard versions are published. Without force, does nothing if the
+        last check was less than refresh_interval seconds ago or another thread is at it.
+        """
+        now = time.monotonic()
+        if not force and self._checked is not None and now - self._checked < self.refresh_interval:
+            return
+        if not self._refresh_lock.acquire(blocking=force):
+            return
+        try:
+            self._checked = now
+            published = list_shards(self.path)
+            in_use = {name for name in self.loaded() if name in published}
+            fresh = {}
+            for name in in_use:
+                version_path = published[name][0]
+                if version_path != self._shards[name][0]:
+                    fresh[version_path] = self.load(version_path)
+                    logger.info("Swapping in shard %s version %s", name, os.path.basename(version_path))
+            with self._lock:
+                current = {version_path for version_path, _ in published.values()}
+                retrievers = {**self._retrievers, **fresh}
+                self._retrievers = {path: r for path, r in retrievers.items() if path in current}
+                self._shards = published
+                self.loads += len(fresh)
+                self.swaps += len(fresh)
+        finally:
+            self._refresh_lock.release()
+
+    def refresh_in_background(self):
+        """
+        Starts refresh() in a thread of its own if refresh_interval seconds have passed
+        since the last check and no refresh is running, and returns that thread (else
+        None). Rebuilt shards are loaded there, not in the search that noticed them.
+        """
+        if self._checked is not None and time.monotonic() - self._checked < self.refresh_interval:
+            return None
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return None
+            self._refresher = threading.Thread(target=self._refresh_quietly, name="shard-refresh", daemon=True)
+            self._refresher.start()
+            return self._refresher
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh(force=False)
+        except Exception:
+            logger.exception("Could not refresh the shards in %s", self.path)
+
+    def select(self, query):
+        """
+        Returns {shard name: version directory} for the shards a query needs: those of
+        the series and seasons it names, or all of them if it names none that exist.
+        """
+        with self._lock:
+            shards = dict(self._shards)
+        lowered = query.lower()
+        series = set()
+        for _, info in shards.values():
+            words = [info["series"], *self.aliases.get(info["series"], [])]
+            if any(re.search(rf"\b{re.escape(word.lower())}\b", lowered) for word in words):
+                series.add(info["series"])
+        seasons = {int(next(group for group in match.groups() if group)) for match in SEASON_PATTERN.finditer(query)}
+        selected = {
+            name: version_path for name, (version_path, info) in shards.items()
+            if (not series or info["series"] in series) and (not seasons or seasons & set(info["seasons"]))
+        }
+        return selected or {name: version_path for name, (version_path, _) in shards.items()}
+
+    def retriever(self, version_path):
+        """
+        Returns the retriever for a shard version, loading it if no search has yet.
+        """
+        with self._lock:
+            retriever = self._retrievers.get(version_path)
+            if retriever is not None:
+                return retriever
+            lock = self._loading.setdefault(version_path, threading.Lock())
+        with lock:
+            with self._lock:
+                retriever = self._retrievers.get(version_path)
+            if retriever is None:
+                retriever = self.load(version_path)
+                with self._lock:
+                    self.loads += 1
+                    # A version replaced while it loaded serves this search only
+                    if any(path == version_path for path, _ in self._shards.values()):
+                        self._retrievers[version_path] = retriever
+                    self._loading.pop(version_path, None)
+        return retriever
+
+    def _search(self, version_path, query):
+        with span("shard", os.path.basename(os.path.dirname(version_path))):
+            return self.retriever(version_path).invoke(query)
+
+    def scatter(self, query):
+        """
+        Searches the shards the query needs in parallel threads. Returns [(shard name,
+        documents)] in shard name order.
+        """
+        self.refresh_in_background()
+        selected = self.select(query)
+        futures = [
+            (name, self._pool.submit(contextvars.copy_context().run, self._search, version_path, query))
+            for name, version_path in sorted(selected.items())
+        ]
+        return [(name, future.result()) for name, future in futures]
+
+class ShardedRetriever(BaseRetriever):
+    """
+    Scatter-gather retriever over a ShardSet: the shards a query needs are searched in
+    parallel and their results merged into the top k.
+
+    Each shard ranks with its own BM25 statistics, so scores aren't comparable across
+    shards; results are merged by rank instead (every shard's best hit first, then every
+    shard's second, ...). With reranking on top, the merged candidates are rescored
+    against each other anyway.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    shards: Any
+    k: int = 10
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        results = self.shards.scatter(query)
+        merged = sorted(
+            ((rank, order, doc) for order, (_, docs) in enumerate(results) for rank, doc in enumerate(docs)),
+            key=lambda item: item[:2],
+        )
+        return [doc for _, _, doc in merged[:self.k]]
+
+def build_sharded_retriever(shards_path, k, hybrid=True, rerank=False, scorer=RERANK_SCORER, mmap=False,
+                            nprobe=None, ef_search=None, refresh_interval=SHARD_REFRESH_INTERVAL):
+    """
+    Returns a ShardedRetriever over the shards published under shards_path, each one
+    searched like the monolithic index by build_retriever, with reranking of the merged
+    candidates on top if rerank is set.
+    """
+    fetch_k = max(k, RERANK_FETCH_K) if rerank else k
+
+    def load(version_path):
+        vector_store = load_index(version_path, nprobe=nprobe, ef_search=ef_search, mmap=mmap)
+        return build_retriever(vector_store, version_path, fetch_k, hybrid=hybrid)
+
+    retriever = ShardedRetriever(shards=ShardSet(shards_path, load, refresh_interval=refresh_interval), k=fetch_k)
+    if rerank:
+        return RerankingRetriever(base=retriever, scorer=make_scorer(scorer, get_embeddings()))
+    return retriever
@@ -0,0 +1,412 @@
+import contextvars
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+from .config import TRACING, TRACE_PATH, TRACE_SAMPLE_RATE, TRACE_MAX_MB, TRACE_QUESTIONS
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+METRICS = {
+    "chatbot_turns_total": ("counter", "Chat turns answered, by route, cache use and outcome."),
+    "chatbot_turn_duration_seconds": ("histogram", "Time to answer a chat turn, by route."),
+    "chatbot_stage_duration_seconds": ("histogram", "Time spent in each stage of a turn."),
+    "chatbot_stage_errors_total": ("counter", "Stages of a turn that raised."),
+    "chatbot_llm_tokens_total": ("counter", "Tokens the LLM read (input) and wrote (output)."),
+    "chatbot_llm_first_token_seconds": ("histogram", "Time from an LLM call to its first streamed token."),
+    "chatbot_traces_dropped_total": ("counter", "Sampled traces not written because the writer fell behind."),
+}
+
+# Traces waiting for the writer thread before new ones are dropped
+TRACE_QUEUE_SIZE = 1000
+
+# The trace of the turn being answered and the innermost open span; copied into worker
+# threads with contextvars.copy_context
+_trace = contextvars.ContextVar("trace", default=None)
+_span = contextvars.ContextVar("span", default=None)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+class Metrics:
+    """
+    Counters and histograms kept in process and rendered in the Prometheus text format.
+    Labels are given as keyword arguments after the metric's name.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        # name -> labels -> [count per bucket (last one is +Inf), sum]
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, metric, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(metric, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, metric, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(metric, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][bisect_left(self.buckets, value)] += 1
+            histogram[1] += value
+
+    def value(self, metric, **labels):
+        """
+        Returns a counter's value, or a histogram's number of observations.
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            if metric in self._histograms:
+                histogram = self._histograms[metric].get(key)
+                return sum(histogram[0]) if histogram else 0
+            return self._counters.get(metric, {}).get(key, 0)
+
+    def render(self, gauges=None):
+        """
+        Returns every metric in the Prometheus text exposition format, followed by the
+        given gauges ({name: (help, value)}).
+        """
+        lines = []
+        with self._lock:
+            for name in sorted(set(self._counters) | set(self._histograms)):
+                kind, help_text = METRICS.get(name, ("counter" if name in self._counters else "histogram", ""))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(self._counters.get(name, {}).items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                for labels, (counts, total) in sorted(self._histograms.get(name, {}).items()):
+                    cumulative = 0
+                    for bound, count in zip((*self.buckets, "+Inf"), counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        for name, (help_text, value) in (gauges or {}).items():
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"])
+        return "\n".join(lines) + "\n"
+
+class Trace:
+    """
+    The spans of one chat turn. Each span is a dict with an id, its parent's id, the
+    stage ("llm", "tool", "retriever", "embedding", ...) and name, its start in seconds
+    from the start of the turn, its duration and any attributes (token counts, errors).
+    """
+
+    def __init__(self, question):
+        self.trace_id = uuid.uuid4().hex
+        self.question = question
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.attributes = {}
+        self.spans = []
+        self._ids = itertools.count(1)
+
+    def add(self, stage, name, start, end, parent=None, span_id=None, **attributes):
+        span = {
+            "id": span_id if span_id is not None else next(self._ids), "parent": parent, "stage": stage, "name": name,
+            "start": round(start - self.start, 6), "duration": round(end - start, 6), **attributes,
+        }
+        self.spans.append(span)
+        return span
+
+    def to_dict(self, include_question=True):
+        data = {"trace_id": self.trace_id, "timestamp": self.started_at, **self.attributes, "spans": self.spans}
+        if include_question:
+            data["question"] = self.question
+        return data
+
+@contextmanager
+def span(stage, name=None, **attributes):
+    """
+    Records the enclosed code as a span of the current turn's trace. Outside a traced
+    turn it costs one context variable lookup. Yields the span's attributes, which
+    may be added to.
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield attributes
+        return
+    parent = _span.get()
+    span_id = next(trace._ids)
+    token = _span.set(span_id)
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _span.reset(token)
+        end = time.perf_counter()
+        trace.spans.append({
+            "id": span_id, "parent": parent, "stage": stage, "name": name,
+            "start": round(start - trace.start, 6), "duration": round(end - start, 6), **attributes,
+        })
+
+def _token_usage(response):
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+    if not input_tokens and not output_tokens:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        input_tokens = usage.get("prompt_tokens", 0)
+        output_tokens = usage.get("completion_tokens", 0)
+    return input_tokens, output_tokens
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Records the LLM calls, tool calls and retriever runs of one turn as spans of its
+    trace, with the LLM's token counts and time to first token.
+    """
+
+    # Recording a span is a dict update; no need for a thread of its own
+    run_inline = True
+
+    def __init__(self, trace):
+        self.trace = trace
+        # run id -> (span id, parent span id, stage, name, start, attributes, context token)
+        self._runs = {}
+        self._parents = {}
+        self._span_ids = {}
+
+    def _start(self, run_id, parent_run_id, stage, name):
+        self._parents[run_id] = parent_run_id
+        # The nearest enclosing run that is a span of its own, else the open span() if any
+        parent = None
+        while parent_run_id is not None and parent is None:
+            parent = self._span_ids.get(parent_run_id)
+            parent_run_id = self._parents.get(parent_run_id)
+        if parent is None:
+            parent = _span.get()
+        span_id = self._span_ids[run_id] = next(self.trace._ids)
+        # Spans opened with span() inside the run (an embedding, a FAISS search) nest under it
+        token = _span.set(span_id)
+        self._runs[run_id] = (span_id, parent, stage, name, time.perf_counter(), {}, token)
+
+    def _end(self, run_id, **attributes):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        span_id, parent, stage, name, start, started_attributes, token = run
+        try:
+            _span.reset(token)
+        except ValueError:
+            pass  # Ended in another context than it started in; that one is discarded anyway
+        self.trace.add(stage, name, start, time.perf_counter(), parent, span_id=span_id,
+                       **started_attributes, **attributes)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        # Chains aren't spans, but tools and LLM calls are found through them
+        self._parents[run_id] = parent_run_id
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "llm"
+        self._start(run_id, parent_run_id, "llm", name)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "llm"
+        self._start(run_id, parent_run_id, "llm", name)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and "first_token" not in run[5]:
+            run[5]["first_token"] = round(time.perf_counter() - run[4], 6)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        input_tokens, output_tokens = _token_usage(response)
+        self._end(run_id, input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self._start(run_id, parent_run_id, "tool", name)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "retriever"
+        self._start(run_id, parent_run_id, "retriever", name)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+class Tracer:
+    """
+    Traces chat turns: the spans of each turn are aggregated into Prometheus metrics
+    and written as one JSON line to path (if given) for sample_rate of the turns.
+
+    Wrap a turn in turn() and pass callbacks(trace) to the chain it runs; code that
+    isn't a LangChain run (embedding, FAISS and BM25 searches, web searches) records
+    spans with span(). When disabled, turn() yields a trace that records nothing.
+
+    Traces are written by a background thread, so a turn never waits on the disk; if it
+    falls behind, traces are dropped. Once the file grows past max_bytes it is renamed
+    to path + ".1" (replacing the previous one) and a new file is started. The question
+    text is only written with include_question.
+    """
+
+    def __init__(self, path=None, sample_rate=1.0, enabled=True, max_bytes=None, include_question=False):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.include_question = include_question
+        self.metrics = Metrics()
+        self._queue = queue.Queue(TRACE_QUEUE_SIZE)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    @contextmanager
+    def turn(self, question):
+        """
+        Traces one chat turn. Set "route" and "cached" in the trace's attributes to have
+        them recorded with it.
+        """
+        trace = Trace(question)
+        if not self.enabled:
+            yield trace
+            return
+        token = _trace.set(trace)
+        try:
+            yield trace
+        except BaseException as e:
+            trace.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            try:
+                _trace.reset(token)
+            except ValueError:
+                pass  # A streamed turn abandoned by its consumer is closed in another context
+            trace.attributes["duration"] = round(time.perf_counter() - trace.start, 6)
+            self.finish(trace)
+
+    def callbacks(self, trace):
+        """
+        Returns the callback handlers that record a chain's runs in trace.
+        """
+        return [TracingCallbackHandler(trace)] if self.enabled else []
+
+    def finish(self, trace):
+        """
+        Adds a finished turn to the metrics and, if sampled, writes it out.
+        """
+        route = trace.attributes.get("route") or "none"
+        self.metrics.inc(
+            "chatbot_turns_total", route=route, cached=str(bool(trace.attributes.get("cached"))).lower(),
+            status="error" if "error" in trace.attributes else "ok",
+        )
+        self.metrics.observe("chatbot_turn_duration_seconds", trace.attributes["duration"], route=route)
+        for item in trace.spans:
+            self.metrics.observe("chatbot_stage_duration_seconds", item["duration"], stage=item["stage"],
+                                 name=item["name"] or "")
+            if "error" in item:
+                self.metrics.inc("chatbot_stage_errors_total", stage=item["stage"], name=item["name"] or "")
+            if item["stage"] == "llm":
+                self.metrics.inc("chatbot_llm_tokens_total", item.get("input_tokens", 0), type="input")
+                self.metrics.inc("chatbot_llm_tokens_total", item.get("output_tokens", 0), type="output")
+                if "first_token" in item:
+                    self.metrics.observe("chatbot_llm_first_token_seconds", item["first_token"])
+        if self.path is not None and random.random() < self.sample_rate:
+            self.write(trace)
+
+    def write(self, trace):
+        """
+        Queues a trace for the writer thread, starting it on first use.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+                self._writer.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.metrics.inc("chatbot_traces_dropped_total")
+
+    def flush(self):
+        """
+        Waits until every queued trace has been written.
+        """
+        self._queue.join()
+
+    def _write_loop(self):
+        while True:
+            trace = self._queue.get()
+            try:
+                self._append(json.dumps(trace.to_dict(self.include_question), default=str))
+            except OSError:
+                self.metrics.inc("chatbot_traces_dropped_total")
+            finally:
+                self._queue.task_done()
+
+    def _append(self, line):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.max_bytes is not None:
+            try:
+                if os.path.getsize(self.path) >= self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+            except FileNotFoundError:
+                pass
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def prometheus(self, gauges=None):
+        return self.metrics.render(gauges)
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """
+    Returns the shared tracer, built from the config on first use.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            max_bytes = TRACE_MAX_MB * 1024 * 1024 if TRACE_MAX_MB else None
+            _tracer = Tracer(TRACE_PATH, TRACE_SAMPLE_RATE, enabled=TRACING, max_bytes=max_bytes,
+                             include_question=TRACE_QUESTIONS)
+        return _tracer
+
+def set_tracer(tracer):
+    """
+    Replaces the shared tracer. Passing None makes the next get_tracer call rebuild it
+    from the config.
+    """
+    global _tracer
+    with _tracer_lock:
+        _tracer = tracer
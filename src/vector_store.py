@@ -1,44 +1,286 @@
-from langchain_ollama import OllamaEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from .config import EMBEDDING_MODEL_NAME
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import numpy as np
+from langchain_core.documents import Document
+from .config import (
+    EMBEDDING_MODEL_NAME, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_MB,
+    EMBED_BATCH_SIZE, EMBED_MAX_IN_FLIGHT, EMBED_RETRIES, EMBED_RETRY_DELAY, INDEX_TRAIN_SIZE, SEMANTIC_POOLED
+)
+from .chunking import PooledEmbeddings
+from .embedding_cache import CachedEmbeddings, get_embedding_cache
+from .lazy import LazyImports
+from .mmap_docstore import (
+    MmapDocstore, PositionMapping, write_mmap_docstore, has_mmap_docstore, remove_mmap_docstore
+)
+from .index_factory import (
+    default_index_config, needs_training, train_index, set_search_params, rebuild_without,
+    save_index_config, load_index_config, search_subset
+)
 
-def get_embeddings():
-    return OllamaEmbeddings(model=EMBEDDING_MODEL_NAME)
+# Ollama's client, the FAISS wrapper and the splitters take seconds to import together;
+# the chatbot only needs some of them, and only once it's answering
+lazy = LazyImports(globals(), {
+    "faiss": "faiss",
+    "OllamaEmbeddings": "langchain_ollama:OllamaEmbeddings",
+    "InMemoryDocstore": "langchain_community.docstore.in_memory:InMemoryDocstore",
+    "FAISS": "langchain_community.vectorstores:FAISS",
+    "SemanticChunker": "langchain_experimental.text_splitter:SemanticChunker",
+    "RecursiveCharacterTextSplitter": "langchain_text_splitters:RecursiveCharacterTextSplitter",
+})
+__getattr__ = lazy.__getattr__
 
-def create_index_semantic(text):
+def get_embeddings(cached=True):
     """
-    Creates a FAISS index using semantic chunking.
+    Returns the embeddings client. Unless cached is False it is wrapped in the persistent
+    embedding cache, so texts that were embedded before are not sent to Ollama again,
+    and the client itself is only created on the first cache miss.
+    """
+    if not cached:
+        return lazy.OllamaEmbeddings(model=EMBEDDING_MODEL_NAME)
+    return CachedEmbeddings(None, _embedding_cache(), EMBEDDING_MODEL_NAME,
+                            factory=lambda: lazy.OllamaEmbeddings(model=EMBEDDING_MODEL_NAME))
+
+def _embedding_cache():
+    return get_embedding_cache(EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+
+def embedding_cache_stats():
+    """
+    Returns the hit/miss counters and size of the embedding cache.
+    """
+    return _embedding_cache().stats()
+
+def batched(iterable, size):
+    """
+    Yields lists of up to size items from iterable, consuming it lazily.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def _embed_with_retry(embeddings, texts, retries, retry_delay):
+    for attempt in range(retries + 1):
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(retry_delay * 2 ** attempt)
+
+def embed_batches(embeddings, batches, max_in_flight=EMBED_MAX_IN_FLIGHT, retries=EMBED_RETRIES, retry_delay=EMBED_RETRY_DELAY):
+    """
+    Embeds batches of (document, id) pairs with at most max_in_flight requests outstanding
+    and yields (batch, vectors) in input order. A new batch is only pulled from the input
+    when a slot frees up, so a slow embedding server holds back the producer instead of
+    letting work pile up in memory. Failed requests are retried with exponential backoff.
+    """
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        pending = deque()
+        for batch in batches:
+            if len(pending) >= max_in_flight:
+                done_batch, future = pending.popleft()
+                yield done_batch, future.result()
+            texts = [doc.page_content for doc, _ in batch]
+            pending.append((batch, pool.submit(_embed_with_retry, embeddings, texts, retries, retry_delay)))
+        while pending:
+            done_batch, future = pending.popleft()
+            yield done_batch, future.result()
+
+def _create_store(embeddings, index_config, batches):
+    """
+    Creates a vector store of the configured index type from the first (text_embeddings,
+    metadatas, ids) batches, training the index on all of their vectors if needed.
+    """
+    text_embeddings, metadatas, ids = batches[0]
+    if index_config["index_type"] == "flat":
+        vector_store = lazy.FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+        batches = batches[1:]
+    else:
+        vectors = [vector for batch in batches for _, vector in batch[0]]
+        index = train_index(len(vectors[0]), index_config, vectors)
+        vector_store = lazy.FAISS(embeddings, index, lazy.InMemoryDocstore(), {})
+    for text_embeddings, metadatas, ids in batches:
+        vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+    return vector_store
+
+def add_items_batched(vector_store, items, embeddings=None, batch_size=EMBED_BATCH_SIZE,
+                      max_in_flight=EMBED_MAX_IN_FLIGHT, progress=None, index_config=None):
+    """
+    Embeds (document, id) pairs in concurrent batches and adds each batch to the index as
+    soon as it is ready. items may be any iterable, including a generator; only a bounded
+    number of batches is held at a time. An id of None lets FAISS assign one. progress, if
+    given, is called with the number of documents added so far. Returns the vector store
+    (None if there were no documents).
+
+    If vector_store is None a new index of the type in index_config (default: the config
+    module) is created. Index types that need training hold back the first
+    INDEX_TRAIN_SIZE vectors and train on them before anything is added.
+    """
+    if embeddings is None:
+        embeddings = get_embeddings()
+    if index_config is None:
+        index_config = default_index_config()
+    pending = []
+    pending_count = 0
+    added = 0
+    for batch, vectors in embed_batches(embeddings, batched(items, batch_size), max_in_flight):
+        text_embeddings = [(doc.page_content, vector) for (doc, _), vector in zip(batch, vectors)]
+        metadatas = [doc.metadata for doc, _ in batch]
+        batch_ids = [doc_id for _, doc_id in batch]
+        if all(doc_id is None for doc_id in batch_ids):
+            batch_ids = None
+        if vector_store is None:
+            pending.append((text_embeddings, metadatas, batch_ids))
+            pending_count += len(batch)
+            if needs_training(index_config) and pending_count < INDEX_TRAIN_SIZE:
+                continue
+            vector_store = _create_store(embeddings, index_config, pending)
+            added += pending_count
+            pending = []
+            pending_count = 0
+        else:
+            vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=batch_ids)
+            added += len(batch)
+        if progress is not None:
+            progress(added)
+    if pending:
+        # Fewer vectors than INDEX_TRAIN_SIZE; train on what there is
+        vector_store = _create_store(embeddings, index_config, pending)
+        added += pending_count
+        if progress is not None:
+            progress(added)
+    return vector_store
+
+def add_documents_batched(vector_store, docs, ids=None, embeddings=None, batch_size=EMBED_BATCH_SIZE,
+                          max_in_flight=EMBED_MAX_IN_FLIGHT, progress=None, index_config=None):
+    """
+    Embeds docs, optionally under the given ids, with add_items_batched.
+    """
+    items = zip(docs, ids) if ids is not None else ((doc, None) for doc in docs)
+    return add_items_batched(vector_store, items, embeddings, batch_size, max_in_flight, progress, index_config)
+
+def create_index_semantic(text, pooled=SEMANTIC_POOLED):
+    """
+    Creates a FAISS index using semantic chunking. When pooled, each sentence is embedded
+    once and the chunks get the mean of their sentences' vectors (see PooledEmbeddings);
+    otherwise LangChain's SemanticChunker is used and the chunks are embedded again.
     """
     embeddings = get_embeddings()
-    text_splitter = SemanticChunker(
+    if pooled:
+        embeddings = PooledEmbeddings(embeddings)
+        docs = [Document(page_content=chunk) for chunk in embeddings.semantic_chunks(text)]
+        return add_documents_batched(None, docs, embeddings=embeddings)
+    text_splitter = lazy.SemanticChunker(
         embeddings,
         breakpoint_threshold_type="percentile"
     )
     docs = text_splitter.create_documents([text])
-    vector_store = FAISS.from_documents(docs, embeddings)
+    vector_store = add_documents_batched(None, docs, embeddings=embeddings)
     return vector_store
 
+def split_text(text):
+    """
+    Splits text into documents using recursive character text splitting.
+    """
+    text_splitter = lazy.RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=["\n\n", "\n", ".", " ", ""]
+    )
+    return text_splitter.create_documents([text])
+
 def create_index_recursive(text):
     """
     Creates a FAISS index using recursive character text splitting.
     """
     embeddings = get_embeddings()
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=100,
-        separators=["\n\n", "\n", ".", " ", ""]
-    )
-    docs = text_splitter.create_documents([text])
-    vector_store = FAISS.from_documents(docs, embeddings)
+    docs = split_text(text)
+    vector_store = add_documents_batched(None, docs, embeddings=embeddings)
     return vector_store
 
-def save_index(vector_store, path):
+def similarity_search_subset(vector_store, query, k, positions):
+    """
+    Returns the k documents nearest to query among those at the given index positions,
+    without looking at the rest of the index.
+    """
+    vector = np.asarray([vector_store._embed_query(query)], dtype=np.float32)
+    if vector_store._normalize_L2:
+        lazy.faiss.normalize_L2(vector)
+    _, found = search_subset(vector_store.index, vector, k, positions)
+    return [
+        vector_store.docstore.search(vector_store.index_to_docstore_id[int(position)])
+        for position in found[0] if position >= 0
+    ]
+
+def delete_documents(vector_store, ids, index_config):
+    """
+    Removes documents and their vectors by id. Only flat indexes renumber the remaining
+    vectors when removing some in place; HNSW and IVF indexes are rebuilt from the
+    remaining vectors instead.
+    """
+    if index_config["index_type"] == "flat":
+        vector_store.delete(list(ids))
+        return
+    ids = set(ids)
+    positions = [i for i, doc_id in vector_store.index_to_docstore_id.items() if doc_id in ids]
+    vector_store.index = rebuild_without(vector_store.index, positions, index_config)
+    vector_store.docstore.delete(list(ids))
+    remaining = [doc_id for _, doc_id in sorted(vector_store.index_to_docstore_id.items()) if doc_id not in ids]
+    vector_store.index_to_docstore_id = dict(enumerate(remaining))
+
+def save_index(vector_store, path, index_config=None, mmap_docstore=False):
+    """
+    Saves the index. With an index_config the config is saved alongside it, and with
+    mmap_docstore the documents are also written in the layout load_index(mmap=True) reads;
+    without it, any such documents from an earlier save are deleted, since they would no
+    longer match the index.
+    """
+    # Removed first, so an interrupted save never leaves them next to a newer index
+    remove_mmap_docstore(path)
     vector_store.save_local(path)
+    if index_config is not None:
+        save_index_config(index_config, path)
+    if mmap_docstore:
+        write_mmap_docstore(vector_store, path)
 
-def load_index(path):
+def _load_mmap(path, embeddings):
+    # IO_FLAG_MMAP_IFC maps flat vector storage without copying it (newer FAISS builds)
+    faiss = lazy.faiss
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    index = faiss.read_index(os.path.join(path, "index.faiss"), flags)
+    docstore = MmapDocstore(path)
+    if len(docstore) != index.ntotal:
+        return None
+    return lazy.FAISS(embeddings, index, docstore, PositionMapping(index.ntotal))
+
+def load_index(path, nprobe=None, ef_search=None, mmap=False):
+    """
+    Loads a saved index. nprobe (IVF) and ef_search (HNSW) override the search
+    parameters the index was saved with, trading recall for latency.
+
+    With mmap the FAISS index file and the documents are memory-mapped instead of read
+    and unpickled, so startup is fast and processes on one host share the page cache.
+    The result is read-only. Falls back to a normal load if the index was saved without
+    the mmap docstore or it is out of date.
+    """
     embeddings = get_embeddings()
-    # FAISS.load_local requires allow_dangerous_deserialization=True if loading untrusted files
-    # Since we create it ourselves, it's generally fine, but good to be aware.
-    return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    vector_store = None
+    if mmap and has_mmap_docstore(path):
+        vector_store = _load_mmap(path, embeddings)
+    if vector_store is None:
+        # FAISS.load_local requires allow_dangerous_deserialization=True if loading untrusted files
+        # Since we create it ourselves, it's generally fine, but good to be aware.
+        vector_store = lazy.FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    index_config = load_index_config(path)
+    if index_config is not None:
+        set_search_params(
+            vector_store.index,
+            nprobe if nprobe is not None else index_config.get("nprobe"),
+            ef_search if ef_search is not None else index_config.get("ef_search"),
+        )
+    return vector_store
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from .config import (
+    WEB_SEARCH_BACKEND, WEB_SEARCH_FIXTURE_PATH, WEB_SEARCH_CACHE_PATH, WEB_SEARCH_CACHE_TTL,
+    WEB_SEARCH_TIMEOUT, WEB_SEARCH_MAX_CONCURRENT, WEB_SEARCH_MIN_INTERVAL
+)
+from .answer_cache import normalize_question
+from .tracing import span
+from .lazy import LazyImports
+
+lazy = LazyImports(globals(), {"DDGS": "ddgs:DDGS"})
+__getattr__ = lazy.__getattr__
+
+class DDGSBackend:
+    """
+    DuckDuckGo search through a single reused DDGS client.
+    """
+
+    def __init__(self, timeout=WEB_SEARCH_TIMEOUT):
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    def text(self, query, max_results):
+        with self._lock:
+            if self._client is None:
+                self._client = lazy.DDGS(timeout=self.timeout)
+        return self._client.text(query, max_results=max_results)
+
+class FixtureBackend:
+    """
+    Offline stand-in that answers from canned results, for tests and benchmarks.
+
+    fixtures maps normalized queries to result lists (dicts with title, href and body);
+    the "*" entry, if present, answers every other query. latency simulates a slow
+    network in seconds.
+    """
+
+    def __init__(self, fixtures, latency=0.0):
+        self.fixtures = {normalize_question(query): results for query, results in fixtures.items()}
+        self.latency = latency
+        self.calls = 0
+
+    @classmethod
+    def from_file(cls, path, latency=0.0):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), latency)
+
+    def text(self, query, max_results):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        results = self.fixtures.get(normalize_question(query), self.fixtures.get("*", []))
+        return results[:max_results]
+
+class SearchService:
+    """
+    Puts a result cache, a hard timeout, a concurrency limit and a minimum interval
+    between requests in front of a search backend.
+
+    Results are cached per normalized query for cache_ttl seconds, in memory and, with a
+    cache_path, on disk. Failed searches are not cached. At most max_concurrent backend
+    calls run at once; a call that doesn't finish within timeout seconds raises
+    TimeoutError (the request itself is abandoned, not interrupted).
+    """
+
+    def __init__(self, backend, cache_path=None, cache_ttl=WEB_SEARCH_CACHE_TTL, timeout=WEB_SEARCH_TIMEOUT,
+                 max_concurrent=WEB_SEARCH_MAX_CONCURRENT, min_interval=0.0):
+        self.backend = backend
+        self.cache_path = cache_path
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.hits = 0
+        self.misses = 0
+        self._cache = {}  # (normalized query, max results) key -> [timestamp, results]
+        self._lock = threading.Lock()
+        self._rate_lock = threading.Lock()
+        self._last_call = 0.0
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="web-search")
+        if cache_path is not None and os.path.exists(cache_path):
+            try:
+                with open(cache_path, encoding="utf-8") as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError):
+                self._cache = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        with self._lock:
+            data = json.dumps(self._cache)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.cache_path)
+
+    def _call_backend(self, query, max_results):
+        if self.min_interval:
+            with self._rate_lock:
+                wait = self._last_call + self.min_interval - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                self._last_call = time.monotonic()
+        return self.backend.text(query, max_results)
+
+    def search(self, query, max_results=5):
+        """
+        Returns the search results for the query, from the cache when possible.
+        """
+        key = f"{max_results}:{normalize_question(query)}"
+        now = time.time()
+        with span("web_search", type(self.backend).__name__) as attributes:
+            with self._lock:
+                entry = self._cache.get(key)
+                if entry is not None and now - entry[0] <= self.cache_ttl:
+                    self.hits += 1
+                    attributes["cached"] = True
+                    return entry[1]
+                self.misses += 1
+
+            future = self._pool.submit(self._call_backend, query, max_results)
+            try:
+                results = list(future.result(timeout=self.timeout) or [])
+            except FutureTimeoutError:
+                future.cancel()
+                raise TimeoutError(f"web search timed out after {self.timeout}s")
+
+        with self._lock:
+            self._cache[key] = [now, results]
+            for stale in [k for k, (created, _) in self._cache.items() if now - created > self.cache_ttl]:
+                del self._cache[stale]
+        if self.cache_path is not None:
+            self._save()
+        return results
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_search_service():
+    """
+    Returns the shared search service, built from the config on first use.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            if WEB_SEARCH_BACKEND == "fixture":
+                backend = FixtureBackend.from_file(WEB_SEARCH_FIXTURE_PATH)
+            else:
+                backend = DDGSBackend()
+            _service = SearchService(backend, WEB_SEARCH_CACHE_PATH, min_interval=WEB_SEARCH_MIN_INTERVAL)
+        return _service
+
+def set_search_service(service):
+    """
+    Replaces the shared search service, e.g. with one over a FixtureBackend.
+    Passing None makes the next get_search_service call rebuild it from the config.
+    """
+    global _service
+    with _service_lock:
+        _service = service
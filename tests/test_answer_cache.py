@@ -0,0 +1,114 @@
+"""
+Unit tests for the answer_cache module.
+Tests exact and paraphrase lookups, expiry, eviction and persistence.
+"""
+from unittest.mock import patch
+from src.answer_cache import AnswerCache, normalize_question, index_fingerprint
+
+
+class KeywordEmbeddings:
+    """Embeds a question by which of a few keywords it contains."""
+    
+    KEYWORDS = ["android", "sleep", "captain", "tea"]
+    
+    def embed_query(self, text):
+        return [1.0 if word in text else 0.0 for word in self.KEYWORDS]
+
+
+class TestNormalizeQuestion:
+    """Tests for normalize_question."""
+    
+    def test_normalizes_case_space_and_punctuation(self):
+        assert normalize_question("  What is   your NAME? ") == "what is your name"
+
+
+class TestAnswerCache:
+    """Tests for the AnswerCache class."""
+    
+    def test_exact_hit_after_normalization(self):
+        cache = AnswerCache()
+        cache.put("Who are you?", "I am Data.")
+        
+        assert cache.get("who are you") == "I am Data."
+        assert cache.get("Where are you?") is None
+        assert (cache.hits, cache.misses) == (1, 1)
+    
+    def test_paraphrase_hit_by_similarity(self):
+        """Should match a differently worded question with the same meaning."""
+        cache = AnswerCache(embeddings=KeywordEmbeddings(), similarity_threshold=0.99)
+        cache.put("Does an android need sleep?", "No.")
+        
+        assert cache.get("do androids ever sleep") == "No."
+        assert cache.get("Captain, tea?") is None
+    
+    def test_entries_expire(self):
+        cache = AnswerCache(ttl=10)
+        with patch('src.answer_cache.time.time', return_value=1000.0):
+            cache.put("Who are you?", "I am Data.")
+        with patch('src.answer_cache.time.time', return_value=1011.0):
+            assert cache.get("Who are you?") is None
+    
+    def test_evicts_least_recently_used(self):
+        cache = AnswerCache(max_entries=2)
+        cache.put("one", "1")
+        cache.put("two", "2")
+        cache.get("one")
+        cache.put("three", "3")
+        
+        assert cache.get("two") is None
+        assert cache.get("one") == "1"
+        assert cache.get("three") == "3"
+    
+    def test_persists_and_invalidates_on_fingerprint(self, tmp_path):
+        """Should reload saved answers only for the same fingerprint."""
+        path = str(tmp_path / "answers.json")
+        cache = AnswerCache(path, fingerprint="index-v1")
+        cache.put("Who are you?", "I am Data.")
+        cache.save()
+        
+        assert AnswerCache(path, fingerprint="index-v1").get("Who are you?") == "I am Data."
+        assert AnswerCache(path, fingerprint="index-v2").get("Who are you?") is None
+
+    def test_throttles_saves_and_flushes_the_rest(self, tmp_path):
+        """Should write at most once per save_interval and write the rest on flush."""
+        path = str(tmp_path / "answers.json")
+        cache = AnswerCache(path, save_interval=60)
+        cache.put("Who are you?", "I am Data.")
+        cache.save()
+        cache.put("What is your rank?", "Lieutenant Commander.")
+        cache.save()
+        
+        assert AnswerCache(path).get("What is your rank?") is None
+        cache.flush()
+        assert AnswerCache(path).get("What is your rank?") == "Lieutenant Commander."
+
+    def test_clears_when_fingerprint_changes_while_running(self):
+        """Should drop cached answers once the index changes under a running cache."""
+        version = ["index-v1"]
+        cache = AnswerCache(fingerprint="index-v1", fingerprint_source=lambda: version[0], check_interval=0)
+        cache.put("Who are you?", "I am Data.")
+        assert cache.get("Who are you?") == "I am Data."
+
+        version[0] = "index-v2"
+
+        assert cache.get("Who are you?") is None
+        assert cache.fingerprint == "index-v2"
+
+
+class TestIndexFingerprint:
+    """Tests for index_fingerprint."""
+    
+    def test_changes_with_index_contents(self, tmp_path):
+        (tmp_path / "index.faiss").write_bytes(b"v1")
+        before = index_fingerprint(str(tmp_path))
+        (tmp_path / "index.faiss").write_bytes(b"version 2")
+        
+        assert index_fingerprint(str(tmp_path)) != before
+    
+    def test_changes_when_a_shard_is_republished(self, tmp_path):
+        (tmp_path / "tng-season3").mkdir()
+        (tmp_path / "tng-season3" / "CURRENT").write_text("v1")
+        before = index_fingerprint(str(tmp_path))
+        (tmp_path / "tng-season3" / "CURRENT").write_text("v2")
+        
+        assert index_fingerprint(str(tmp_path)) != before
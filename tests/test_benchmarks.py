@@ -0,0 +1,117 @@
+"""
+Smoke tests for the benchmark harnesses.
+Runs each benchmark on a tiny synthetic corpus so they keep working as the code changes.
+"""
+import json
+import pytest
+
+
+class TestHashingEmbeddings:
+    """Tests for the offline benchmark embeddings."""
+    
+    def test_deterministic_and_lexical(self):
+        """Should embed identically across calls and place shared words closer."""
+        import numpy as np
+        from benchmarks.common import HashingEmbeddings
+        
+        embeddings = HashingEmbeddings(64)
+        a, b, c = np.array(embeddings.embed_documents(["warp core breach", "warp core", "tea earl grey"]))
+        
+        assert embeddings.embed_query("warp core breach") == list(a)
+        assert a @ b > a @ c
+
+
+class TestRetrievalBenchmark:
+    """Tests for benchmarks.bench_retrieval."""
+    
+    def test_writes_results_for_each_combination(self, tmp_path):
+        """Should report every index type and chunking strategy with exact recall for flat."""
+        from benchmarks.bench_retrieval import main
+        
+        output = tmp_path / "retrieval.json"
+        main([
+            "--output", str(output), "--episodes", "3", "--lines-per-episode", "40",
+            "--queries", "10", "--threads", "1", "2", "--index-types", "flat", "hnsw", "ivf",
+            "--chunking", "recursive", "lines", "--k", "5",
+        ])
+        
+        results = json.loads(output.read_text())
+        combinations = {(r["chunking"], r["index_type"]) for r in results["results"]}
+        assert len(combinations) == 6
+        flat = next(r for r in results["results"] if r["index_type"] == "flat")
+        assert flat["recall_at_5"] == 1.0
+        assert set(flat["latency_ms"]) == {"p50", "p95", "p99"}
+        assert set(flat["qps"]) == {"1", "2"}
+        assert flat["index_bytes"] > 0
+
+
+class TestServerBenchmark:
+    """Tests for benchmarks.bench_server."""
+    
+    def test_reports_each_concurrency_level(self, tmp_path):
+        """Should drive the in-process server and account for every request."""
+        from benchmarks.bench_server import main
+        
+        output = tmp_path / "server.json"
+        main([
+            "--output", str(output), "--episodes", "2", "--lines-per-episode", "40", "--queries", "5",
+            "--concurrency", "1", "4", "--requests-per-client", "2", "--llm-latency", "0", "--token-delay", "0",
+            "--search-latency", "0",
+        ])
+        
+        results = json.loads(output.read_text())["results"]
+        assert [r["concurrency"] for r in results] == [1, 4]
+        for result in results:
+            assert result["ok"] + result["rejected"] + result["errors"] == result["requests"]
+            assert result["errors"] == 0
+            assert result["latency_ms"]["p50"] > 0
+
+
+class TestStartupBenchmark:
+    """Tests for benchmarks.bench_startup."""
+    
+    def test_times_each_startup_stage(self, tmp_path):
+        """Should start the chatbot until it is ready and loaded, and profile its imports."""
+        from benchmarks.bench_startup import main
+        
+        output = tmp_path / "startup.json"
+        main(["--output", str(output), "--runs", "1", "--episodes", "2", "--lines-per-episode", "20", "--dim", "32"])
+        
+        results = json.loads(output.read_text())
+        assert results["ready"]["min_ms"] < results["loaded"]["min_ms"]
+        assert set(results["loaded_stub_llm"]) == {"min_ms", "p50", "p95"}
+        assert results["import_ms"] > 0
+
+
+class TestParserBenchmark:
+    """Tests for benchmarks.bench_parser."""
+    
+    def test_reports_lines_per_second(self, tmp_path):
+        """Should time both parsers and find no difference in their output."""
+        from benchmarks.bench_parser import main
+        
+        output = tmp_path / "parser.json"
+        main(["--output", str(output), "--runs", "1", "--episodes", "3", "--lines-per-episode", "40",
+              "--tricky-scripts", "5"])
+        
+        results = json.loads(output.read_text())
+        assert results["mismatched_scripts"] == 0
+        assert results["lines"] > 0
+        assert set(results["parsers"]) == {"reference", "scan_script"}
+
+
+class TestSemanticBenchmark:
+    """Tests for benchmarks.bench_semantic."""
+    
+    def test_pooled_embeds_less(self, tmp_path):
+        """Should index with both modes and embed fewer tokens when pooling."""
+        from benchmarks.bench_semantic import main
+        
+        output = tmp_path / "semantic.json"
+        main(["--output", str(output), "--episodes", "2", "--lines-per-episode", "30", "--dim", "32",
+              "--token-latency", "0", "--queries", "10"])
+        
+        modes = json.loads(output.read_text())["modes"]
+        assert set(modes) == {"semantic_chunker", "pooled"}
+        assert modes["pooled"]["embedded_tokens"] < modes["semantic_chunker"]["embedded_tokens"]
+        assert modes["pooled"]["chunks"] > 0
@@ -0,0 +1,49 @@
+"""
+Unit tests for the bm25 module.
+Tests tokenization, scoring and persistence of the lexical index.
+"""
+import pytest
+from src.bm25 import BM25Index, tokenize
+
+
+class TestTokenize:
+    """Tests for the tokenize function."""
+    
+    def test_lowercases_and_splits(self):
+        assert tokenize("The Prime Directive, Captain's orders!") == ["the", "prime", "directive", "captain's", "orders"]
+
+
+class TestBM25Index:
+    """Tests for the BM25Index class."""
+    
+    @pytest.fixture
+    def index(self):
+        return BM25Index.from_texts([
+            "The Prime Directive forbids interference.",
+            "Tea, Earl Grey, hot.",
+            "Make it so, Number One.",
+            "Interference with the Prime Directive is never justified. The Prime Directive matters.",
+        ])
+    
+    def test_ranks_matching_documents(self, index):
+        """Should rank documents with more occurrences of rarer terms higher."""
+        results = index.search("prime directive", k=10)
+        assert [position for position, _ in results] == [3, 0]
+    
+    def test_no_match(self, index):
+        """Should return nothing for unknown terms."""
+        assert index.search("borg cube", k=5) == []
+    
+    def test_searches_only_given_positions(self, index):
+        """Should leave documents outside the given positions unscored."""
+        assert [position for position, _ in index.search("prime directive", 10, positions=[0, 1])] == [0]
+    
+    def test_limits_results(self, index):
+        assert len(index.search("the", k=1)) == 1
+    
+    def test_round_trip(self, index, tmp_path):
+        """Should save and load identical scores."""
+        index.save(str(tmp_path))
+        loaded = BM25Index.load(str(tmp_path))
+        assert loaded.search("earl grey", k=3) == index.search("earl grey", k=3)
+        assert BM25Index.load(str(tmp_path / "missing")) is None
@@ -9,7 +9,15 @@ from unittest.mock import patch, MagicMock
 class TestDuckDuckGoSearchFunc:
     """Tests for the duckduckgo_search_func function."""
     
-    @patch('src.chatbot.DDGS')
+    @pytest.fixture(autouse=True)
+    def fresh_search_service(self):
+        """Use a search service without disk cache so every test talks to its own DDGS mock."""
+        from src.web_search import SearchService, DDGSBackend, set_search_service
+        set_search_service(SearchService(DDGSBackend()))
+        yield
+        set_search_service(None)
+    
+    @patch('src.web_search.DDGS')
     def test_returns_formatted_results(self, mock_ddgs):
         """Should return formatted search results."""
         from src.chatbot import duckduckgo_search_func
@@ -40,7 +48,7 @@ class TestDuckDuckGoSearchFunc:
         assert "Data Android" in result
         mock_ddgs_instance.text.assert_called_once_with("Star Trek Data", max_results=5)
     
-    @patch('src.chatbot.DDGS')
+    @patch('src.web_search.DDGS')
     def test_returns_no_results_message(self, mock_ddgs):
         """Should return 'No results found.' when search returns empty."""
         from src.chatbot import duckduckgo_search_func
@@ -53,7 +61,7 @@ class TestDuckDuckGoSearchFunc:
         
         assert result == "No results found."
     
-    @patch('src.chatbot.DDGS')
+    @patch('src.web_search.DDGS')
     def test_handles_search_error(self, mock_ddgs):
         """Should handle search errors gracefully."""
         from src.chatbot import duckduckgo_search_func
@@ -66,6 +74,21 @@ class TestDuckDuckGoSearchFunc:
         
         assert "Search error" in result
         assert "Network error" in result
+    
+    @patch('src.web_search.DDGS')
+    def test_reuses_client_and_caches_results(self, mock_ddgs):
+        """Should create one client and serve a repeated query from the cache."""
+        from src.chatbot import duckduckgo_search_func
+        
+        mock_ddgs.return_value.text.return_value = [{'title': 'T', 'href': 'h', 'body': 'b'}]
+        
+        first = duckduckgo_search_func("Star Trek Data")
+        second = duckduckgo_search_func("star trek data")
+        duckduckgo_search_func("Worf")
+        
+        assert first == second
+        mock_ddgs.assert_called_once()
+        assert mock_ddgs.return_value.text.call_count == 2
 
 
 class TestBuildRagChain:
@@ -151,6 +174,76 @@ class TestBuildRagChain:
         call_kwargs = mock_agent_executor.call_args[1]
         assert call_kwargs.get('verbose') is True
         assert call_kwargs.get('handle_parsing_errors') is True
+    
+    @patch('src.chatbot.AgentExecutor')
+    @patch('src.chatbot.create_react_agent')
+    @patch('src.chatbot.PromptTemplate')
+    @patch('src.chatbot.ChatOllama')
+    @patch('src.chatbot.create_retriever_tool')
+    @patch('src.chatbot.Tool')
+    def test_agent_executor_is_capped_and_prefetches(
+        self, mock_tool, mock_create_retriever_tool,
+        mock_chat_ollama, mock_prompt_template,
+        mock_create_react_agent, mock_agent_executor
+    ):
+        """Should cap iterations and time per turn and register the tool prefetcher."""
+        from src.chatbot import build_rag_chain
+        from src.prefetch import ToolPrefetcher
+        from src.config import AGENT_MAX_ITERATIONS, AGENT_MAX_EXECUTION_TIME
+        
+        build_rag_chain(MagicMock())
+        
+        call_kwargs = mock_agent_executor.call_args[1]
+        assert call_kwargs.get('max_iterations') == AGENT_MAX_ITERATIONS
+        assert call_kwargs.get('max_execution_time') == AGENT_MAX_EXECUTION_TIME
+        prefetcher = call_kwargs['callbacks'][0]
+        assert isinstance(prefetcher, ToolPrefetcher)
+        assert set(prefetcher.tools) == {"tng_knowledge_base"}
+    
+    def test_web_prefetch_is_opt_in(self):
+        """Should prefetch web searches only when asked to, through the search service."""
+        from langchain_core.documents import Document
+        from langchain_core.retrievers import BaseRetriever
+        from src.chatbot import build_rag_chain, StubChatModel
+        from src.web_search import SearchService, FixtureBackend, set_search_service
+        
+        class StaticRetriever(BaseRetriever):
+            def _get_relevant_documents(self, query, *, run_manager=None):
+                return [Document(page_content="I am an android.")]
+        
+        backend = FixtureBackend({"*": []})
+        set_search_service(SearchService(backend))
+        try:
+            for prefetch_tools in (["tng_knowledge_base"], ["tng_knowledge_base", "duckduckgo_search"]):
+                chain = build_rag_chain(StaticRetriever(), StubChatModel(latency=0.05), prefetch_tools=prefetch_tools)
+                chain.verbose = False
+                chain.invoke({"input": "What are you?"})
+        finally:
+            set_search_service(None)
+        
+        assert backend.calls == 1
+    
+    def test_prefetch_overlaps_tools_with_the_model(self):
+        """Should have the knowledge base result ready when the agent asks for it."""
+        import time
+        from langchain_core.documents import Document
+        from langchain_core.retrievers import BaseRetriever
+        from src.chatbot import build_rag_chain, StubChatModel
+        
+        class SlowRetriever(BaseRetriever):
+            def _get_relevant_documents(self, query, *, run_manager=None):
+                time.sleep(0.2)
+                return [Document(page_content="I am an android.")]
+        
+        with patch('src.chatbot.duckduckgo_search_func', return_value="web"):
+            chain = build_rag_chain(SlowRetriever(), StubChatModel(latency=0.2), prefetch_tools=["tng_knowledge_base"])
+        chain.verbose = False
+        
+        start = time.perf_counter()
+        assert chain.invoke({"input": "What are you?"})["output"] == "I am an android."
+        
+        assert time.perf_counter() - start < 0.55
+        assert chain.callbacks[0].hits == 1
 
 
 class TestQueryChain:
@@ -165,7 +258,8 @@ class TestQueryChain:
         
         result = query_chain(mock_chain, "Who are you?")
         
-        mock_chain.invoke.assert_called_once_with({"input": "Who are you?"})
+        mock_chain.invoke.assert_called_once()
+        assert mock_chain.invoke.call_args.args == ({"input": "Who are you?"},)
         assert result == "I am Data, an android."
     
     def test_extracts_output_from_result(self):
@@ -182,3 +276,200 @@ class TestQueryChain:
         result = query_chain(mock_chain, "Test question")
         
         assert result == "Test answer"
+    
+    def test_answers_repeat_question_from_cache(self):
+        """Should only invoke the chain once for a repeated question."""
+        from src.chatbot import query_chain
+        from src.answer_cache import AnswerCache
+        
+        mock_chain = MagicMock()
+        mock_chain.invoke.return_value = {"output": "I am Data, an android."}
+        cache = AnswerCache()
+        
+        first = query_chain(mock_chain, "Who are you?", cache)
+        second = query_chain(mock_chain, "who are you", cache)
+        
+        mock_chain.invoke.assert_called_once()
+        assert first == second == "I am Data, an android."
+
+    
+    def test_does_not_cache_early_stop(self):
+        """Should not cache the message the agent gives when it runs out of iterations."""
+        from src.chatbot import query_chain, AGENT_STOPPED_OUTPUT
+        from src.answer_cache import AnswerCache
+        
+        mock_chain = MagicMock()
+        mock_chain.invoke.return_value = {"output": AGENT_STOPPED_OUTPUT}
+        cache = AnswerCache()
+        
+        query_chain(mock_chain, "Who are you?", cache)
+        
+        assert cache.get("Who are you?") is None
+
+class TestFinalAnswerFilter:
+    """Tests for the FinalAnswerFilter class."""
+    
+    def test_passes_only_text_after_marker(self):
+        """Should hold back reasoning and emit the answer, even with a split marker."""
+        from src.chatbot import FinalAnswerFilter
+        
+        answer_filter = FinalAnswerFilter()
+        pieces = [answer_filter.feed(t) for t in ["Thought: done\nFinal ", "Ans", "wer: I am", " Data."]]
+        
+        assert pieces == ["", "", "I am", " Data."]
+    
+    def test_reset_starts_new_generation(self):
+        from src.chatbot import FinalAnswerFilter
+        
+        answer_filter = FinalAnswerFilter()
+        answer_filter.feed("Final Answer: x")
+        answer_filter.reset()
+        
+        assert answer_filter.feed("Thought: more") == ""
+
+
+class TestStreamChain:
+    """Tests for the streaming query API."""
+    
+    @pytest.fixture
+    def agent(self):
+        """A real ReAct agent driven by a fake streaming chat model."""
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        from langchain_classic.agents import create_react_agent, AgentExecutor
+        from langchain_core.prompts import PromptTemplate
+        from langchain_core.tools import Tool
+        
+        llm = FakeListChatModel(responses=[
+            "Thought: look it up\nAction: tng_knowledge_base\nAction Input: android",
+            "Thought: I now know the final answer\nFinal Answer: I am an android.",
+        ])
+        tools = [Tool(name="tng_knowledge_base", func=lambda q: "DATA: I am an android.", description="scripts")]
+        prompt = PromptTemplate.from_template("{tools} {tool_names}\nQuestion: {input}\nThought:{agent_scratchpad}")
+        return AgentExecutor(agent=create_react_agent(llm, tools, prompt), tools=tools)
+    
+    def test_streams_steps_then_answer_tokens(self, agent):
+        """Should yield tool steps, then only final answer tokens, then stats."""
+        from src.chatbot import stream_chain
+        
+        events = list(stream_chain(agent, "What are you?"))
+        kinds = [kind for kind, _ in events]
+        tokens = "".join(payload for kind, payload in events if kind == "token")
+        done = events[-1][1]
+        
+        assert kinds.index("step") < kinds.index("token")
+        assert tokens == "I am an android."
+        assert done["output"] == "I am an android."
+        assert 0 <= done["ttft"] <= done["elapsed"]
+    
+    def test_cached_answer_is_streamed_at_once(self):
+        """Should answer from the cache without running the agent."""
+        from src.chatbot import stream_chain
+        from src.answer_cache import AnswerCache
+        
+        cache = AnswerCache()
+        cache.put("What are you?", "An android.")
+        chain = MagicMock()
+        
+        events = list(stream_chain(chain, "What are you?", cache))
+        
+        assert events[0] == ("token", "An android.")
+        assert events[-1][1]["cached"] is True
+        chain.astream_events.assert_not_called()
+    
+    def test_reuses_event_loop_across_questions(self):
+        """Should keep a model's loop-bound async client working for the next question."""
+        import asyncio
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        from src.chatbot import stream_chain, build_retrieval_chain
+        
+        class LoopBoundChatModel(FakeListChatModel):
+            """Binds to the first event loop it runs on, like ChatOllama's async client."""
+            
+            loop: object = None
+            
+            async def _astream(self, *args, **kwargs):
+                if self.loop is None:
+                    self.loop = asyncio.get_running_loop()
+                elif self.loop is not asyncio.get_running_loop():
+                    raise RuntimeError("Event loop is closed")
+                async for chunk in super()._astream(*args, **kwargs):
+                    yield chunk
+        
+        retriever = MagicMock()
+        retriever.invoke.return_value = []
+        chain = build_retrieval_chain(retriever, LoopBoundChatModel(responses=["An android.", "A starship."]))
+        
+        first = list(stream_chain(chain, "What are you?"))[-1][1]
+        second = list(stream_chain(chain, "What is the Enterprise?"))[-1][1]
+        
+        assert (first["output"], second["output"]) == ("An android.", "A starship.")
+    
+    def test_does_not_cache_early_stop(self, agent):
+        """Should not cache the answer of an agent stopped by its iteration limit."""
+        from src.chatbot import stream_chain, AGENT_STOPPED_OUTPUT
+        from src.answer_cache import AnswerCache
+        
+        agent.max_iterations = 1
+        cache = AnswerCache()
+        
+        done = list(stream_chain(agent, "What are you?", cache))[-1][1]
+        
+        assert done["output"] == AGENT_STOPPED_OUTPUT
+        assert cache.get("What are you?") is None
+    
+    def test_errors_are_raised(self):
+        """Should re-raise errors from the agent in the caller's thread."""
+        from src.chatbot import stream_chain
+        
+        chain = MagicMock()
+        chain.astream_events.side_effect = RuntimeError("model unavailable")
+        
+        with pytest.raises(RuntimeError, match="model unavailable"):
+            list(stream_chain(chain, "What are you?"))
+
+
+class TestRoutedChain:
+    """Tests for the single-shot retrieval chain behind the query router."""
+    
+    @pytest.fixture
+    def retriever(self):
+        from langchain_core.documents import Document
+        from langchain_core.retrievers import BaseRetriever
+        
+        class StaticRetriever(BaseRetriever):
+            def _get_relevant_documents(self, query, *, run_manager=None):
+                return [Document(page_content="I am an android."), Document(page_content="I do not sleep.")]
+        
+        return StaticRetriever()
+    
+    def test_retrieval_chain_answers_in_one_generation(self, retriever):
+        """Should put the excerpts in the prompt and return the answer like the agent does."""
+        from src.chatbot import build_retrieval_chain, StubChatModel
+        
+        llm = StubChatModel()
+        with patch.object(StubChatModel, "_reply", autospec=True, side_effect=StubChatModel._reply) as reply:
+            result = build_retrieval_chain(retriever, llm).invoke({"input": "What did you say?"})
+        
+        assert result == {"output": "I am an android."}
+        assert reply.call_count == 1
+        prompt = reply.call_args[0][1][-1].content
+        assert "I do not sleep." in prompt and "What did you say?" in prompt
+    
+    def test_stream_follows_the_route(self, retriever):
+        """Should stream script questions from the retrieval chain and others from the agent."""
+        from src.chatbot import build_rag_chain, build_routed_chain, stream_chain, query_chain, StubChatModel
+        
+        agent = build_rag_chain(retriever, StubChatModel())
+        agent.verbose = False
+        chain = build_routed_chain(agent, retriever, StubChatModel())
+        
+        script = list(stream_chain(chain, "What did Data say?"))
+        other = list(stream_chain(chain, "Who played Data?"))
+        
+        assert script[-1][1]["route"] == "retrieval" and other[-1][1]["route"] == "agent"
+        assert not any(p.startswith("Action:") for k, p in script if k == "step")
+        assert any(p.startswith("Action:") for k, p in other if k == "step")
+        for events in (script, other):
+            assert "".join(p for k, p in events if k == "token") == "I am an android."
+        assert query_chain(chain, "Which episode has Data's cat?") == "I am an android."
+        assert chain.stats()["retrieval"]["count"] == 2
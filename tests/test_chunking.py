@@ -0,0 +1,94 @@
+"""
+Unit tests for the chunking module.
+"""
+from src.chunking import scene_spans
+
+
+class TestSceneSpans:
+    """Tests for the scene_spans function."""
+    
+    def test_packs_whole_scenes(self):
+        """Should put consecutive scenes in one chunk while they fit the budget."""
+        texts = ["x" * 40] * 6  # 10 estimated tokens each
+        
+        assert scene_spans(texts, [1, 1, 2, 3, 3, 3], max_tokens=30) == [(0, 3), (3, 6)]
+    
+    def test_splits_long_scene_between_turns(self):
+        """Should split a scene longer than the budget at turn boundaries only."""
+        texts = ["x" * 40] * 5
+        
+        assert scene_spans(texts, [1, 2, 2, 2, 2], max_tokens=25) == [(0, 1), (1, 3), (3, 5)]
+    
+    def test_covers_every_line_once(self):
+        """Should return contiguous, non-overlapping spans over all lines."""
+        texts = ["x" * (i * 7 % 90 + 1) for i in range(50)]
+        scenes = [i // 6 for i in range(50)]
+        
+        spans = scene_spans(texts, scenes, max_tokens=40)
+        
+        assert spans[0][0] == 0 and spans[-1][1] == 50
+        assert all(a[1] == b[0] for a, b in zip(spans, spans[1:]))
+    
+    def test_empty_script(self):
+        """Should return no spans for a script without dialogue."""
+        assert scene_spans([], []) == []
+
+
+class TestSemanticChunking:
+    """Tests for sentence splitting, semantic breakpoints and PooledEmbeddings."""
+    
+    def test_sentence_spans(self):
+        """Should split after sentence punctuation followed by whitespace."""
+        from src.chunking import sentence_spans
+        
+        text = "Engage. Is that wise?\nMake it so!"
+        
+        assert [text[start:end] for start, end in sentence_spans(text)] == ["Engage.", "Is that wise?", "Make it so!"]
+        assert sentence_spans("") == []
+    
+    def test_breaks_where_meaning_shifts(self):
+        """Should start a chunk at the sentence whose neighbourhood differs most."""
+        import numpy as np
+        from src.chunking import semantic_breaks
+        
+        vectors = np.array([[1, 0], [1, 0.1], [1, 0], [0, 1], [0.1, 1], [0, 1]], dtype=np.float32)
+        
+        assert semantic_breaks(vectors, percentile=75, buffer_size=0) == [3]
+        assert semantic_breaks(vectors[:1]) == []
+    
+    def test_pooled_vectors_replace_chunk_embeddings(self):
+        """Should serve chunk vectors from the sentences and embed other texts as usual."""
+        import numpy as np
+        from unittest.mock import MagicMock
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from src.chunking import PooledEmbeddings
+        
+        inner = MagicMock(wraps=DeterministicFakeEmbedding(size=8))
+        embeddings = PooledEmbeddings(inner)
+        
+        chunks = embeddings.semantic_chunks("Shields up. Red alert. Tea, Earl Grey, hot.")
+        vectors = embeddings.embed_documents(chunks + ["Engage."])
+        
+        assert " ".join(chunks) == "Shields up. Red alert. Tea, Earl Grey, hot."
+        assert inner.embed_documents.call_args_list[-1].args == (["Engage."],)
+        assert inner.embed_documents.call_count == 2
+        assert np.isclose(np.linalg.norm(vectors[0]), 1.0)
+        assert embeddings._pooled == {}
+    
+    def test_discarded_chunks_release_their_vectors(self):
+        """Should drop a skipped chunk's vector without losing another chunk's with the same text."""
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from src.chunking import PooledEmbeddings
+        
+        embeddings = PooledEmbeddings(DeterministicFakeEmbedding(size=8))
+        first = embeddings.semantic_chunks("Shields up.")
+        second = embeddings.semantic_chunks("Shields up.")
+        
+        embeddings.discard(second[0])
+        assert "Shields up." in embeddings._pooled
+        embeddings.embed_documents(first)
+        assert embeddings._pooled == {}
+        
+        embeddings.discard(embeddings.semantic_chunks("Red alert.")[0])
+        assert embeddings._pooled == {}
+        assert PooledEmbeddings(DeterministicFakeEmbedding(size=8), pool=False).semantic_chunks("Engage.") == ["Engage."]
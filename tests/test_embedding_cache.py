@@ -0,0 +1,120 @@
+"""
+Unit tests for the embedding_cache module.
+Tests persistence, eviction and the caching embeddings wrapper.
+"""
+import pytest
+from unittest.mock import MagicMock
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.embedding_cache import EmbeddingCache, CachedEmbeddings
+
+
+class TestEmbeddingCache:
+    """Tests for the EmbeddingCache class."""
+    
+    def test_put_and_get(self, tmp_path):
+        """Should return stored vectors and count hits and misses."""
+        cache = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+        cache.put(["a"], [[1.0, 2.0, 3.0]])
+        
+        hit, miss = cache.get(["a", "b"])
+        
+        assert list(hit) == [1.0, 2.0, 3.0]
+        assert miss is None
+        assert (cache.hits, cache.misses) == (1, 1)
+    
+    def test_persists_across_instances(self, tmp_path):
+        """Should reload flushed vectors from disk."""
+        cache = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+        cache.put(["a", "b"], [[1.0, 0.0], [0.0, 1.0]])
+        cache.flush()
+        
+        reopened = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+        
+        assert list(reopened.get(["b"])[0]) == [0.0, 1.0]
+        assert reopened.stats()["entries"] == 2
+    
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Should evict the oldest entries once the size limit is reached."""
+        cache = EmbeddingCache(str(tmp_path), max_bytes=4 * 2 * 4)  # four 2-d vectors
+        cache.put(["a", "b", "c", "d"], [[1, 1], [2, 2], [3, 3], [4, 4]])
+        cache.flush()
+        cache.get(["a"])
+        cache.put(["e"], [[5, 5]])
+        cache.flush()
+        
+        assert cache.get(["b"])[0] is None
+        assert list(cache.get(["a"])[0]) == [1.0, 1.0]
+        assert list(cache.get(["e"])[0]) == [5.0, 5.0]
+        assert cache.stats()["bytes"] <= 4 * 2 * 4
+    
+    def test_dimension_change_clears_cache(self, tmp_path):
+        """Should drop old vectors when a model with another dimension is cached."""
+        cache = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+        cache.put(["a"], [[1.0, 2.0]])
+        cache.put(["b"], [[1.0, 2.0, 3.0]])
+        
+        assert cache.get(["a"])[0] is None
+        assert list(cache.get(["b"])[0]) == [1.0, 2.0, 3.0]
+    
+    def test_writers_sharing_a_directory_keep_each_others_entries(self, tmp_path):
+        """Should merge what another writer flushed instead of overwriting its rows or index."""
+        first = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+        second = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+        first.get(["a"])
+        second.get(["b"])
+        
+        first.put(["a"], [[1.0, 1.0]])
+        second.put(["b"], [[2.0, 2.0]])
+        first.flush()
+        second.flush()
+        
+        reopened = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+        assert [list(vector) for vector in reopened.get(["a", "b"])] == [[1.0, 1.0], [2.0, 2.0]]
+        assert list(first.get(["b"])[0]) == [2.0, 2.0]
+    
+    def test_key_depends_on_model(self):
+        """Should key entries by model name as well as text."""
+        assert EmbeddingCache.key("model-a", "text") != EmbeddingCache.key("model-b", "text")
+
+
+class TestCachedEmbeddings:
+    """Tests for the CachedEmbeddings wrapper."""
+    
+    def test_only_embeds_misses(self, tmp_path):
+        """Should embed each distinct uncached text once."""
+        inner = MagicMock(wraps=DeterministicFakeEmbedding(size=8))
+        cache = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+        embeddings = CachedEmbeddings(inner, cache, "fake")
+        
+        first = embeddings.embed_documents(["one", "two", "one"])
+        second = embeddings.embed_documents(["two", "three"])
+        
+        assert inner.embed_documents.call_args_list[0].args == (["one", "two"],)
+        assert inner.embed_documents.call_args_list[1].args == (["three"],)
+        assert first[0] == first[2]
+        assert second[0] == first[1]
+    
+    def test_query_uses_cache(self, tmp_path):
+        """Should serve a repeated query from the cache."""
+        inner = MagicMock(wraps=DeterministicFakeEmbedding(size=8))
+        cache = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+        embeddings = CachedEmbeddings(inner, cache, "fake")
+        
+        first = embeddings.embed_query("What is your name?")
+        second = embeddings.embed_query("What is your name?")
+        
+        inner.embed_query.assert_called_once_with("What is your name?")
+        assert first == second
+        assert cache.hits == 1
+    
+    def test_creates_client_on_first_use(self, tmp_path):
+        """Should call the factory once, when a text first misses the cache."""
+        factory = MagicMock(return_value=DeterministicFakeEmbedding(size=8))
+        cache = EmbeddingCache(str(tmp_path), max_bytes=1 << 20)
+        embeddings = CachedEmbeddings(None, cache, "fake", factory=factory)
+        
+        factory.assert_not_called()
+        embeddings.embed_documents(["one"])
+        embeddings.embed_query("two")
+        
+        factory.assert_called_once_with()
@@ -0,0 +1,125 @@
+"""
+Unit tests for the index_factory module.
+Tests creation, training and tuning of the approximate FAISS index types.
+"""
+import pytest
+import faiss
+import numpy as np
+from src.index_factory import (
+    default_index_config, make_faiss_index, train_index, set_search_params, rebuild_without,
+    save_index_config, load_index_config, search_subset
+)
+
+
+@pytest.fixture
+def vectors():
+    """Random vectors for training and searching."""
+    return np.random.default_rng(0).random((300, 16), dtype=np.float32)
+
+
+class TestMakeFaissIndex:
+    """Tests for make_faiss_index and train_index."""
+    
+    @pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf", "ivfpq"])
+    def test_index_types_find_exact_match(self, index_type, vectors):
+        """Should build, train and search every index type."""
+        config = default_index_config(index_type)
+        config["pq_m"] = 4
+        index = train_index(16, config, vectors)
+        index.add(vectors)
+        set_search_params(index, nprobe=config["nlist"], ef_search=128)
+        
+        _, ids = index.search(vectors[:5], 1)
+        
+        assert index.ntotal == 300
+        if index_type != "ivfpq":  # PQ codes are lossy
+            assert list(ids[:, 0]) == [0, 1, 2, 3, 4]
+    
+    def test_unknown_index_type(self):
+        """Should reject unknown index types."""
+        with pytest.raises(ValueError):
+            default_index_config("lsh")
+    
+    def test_nlist_clamped_to_training_size(self):
+        """Should reduce nlist when there are fewer training vectors."""
+        index = make_faiss_index(16, default_index_config("ivf"), n_train=390)
+        assert index.nlist == 10
+        assert make_faiss_index(16, default_index_config("ivf"), n_train=10).nlist == 1
+    
+    def test_pq_m_must_divide_dimension(self):
+        """Should reject PQ sizes that don't divide the dimension."""
+        config = default_index_config("ivfpq")
+        config["pq_m"] = 5
+        with pytest.raises(ValueError):
+            make_faiss_index(16, config)
+
+
+class TestSearchParams:
+    """Tests for set_search_params."""
+    
+    def test_sets_nprobe_on_ivf(self):
+        index = make_faiss_index(16, default_index_config("ivf"))
+        set_search_params(index, nprobe=3, ef_search=99)
+        assert index.nprobe == 3
+    
+    def test_sets_ef_search_on_hnsw(self):
+        index = make_faiss_index(16, default_index_config("hnsw"))
+        set_search_params(index, nprobe=3, ef_search=99)
+        assert index.hnsw.efSearch == 99
+    
+    def test_ignores_flat(self):
+        index = make_faiss_index(16, default_index_config("flat"))
+        set_search_params(index, nprobe=3, ef_search=99)
+
+
+class TestRebuildAndConfig:
+    """Tests for rebuild_without and the persisted index config."""
+    
+    def test_rebuild_without_drops_positions(self, vectors):
+        """Should rebuild an HNSW index without the given positions."""
+        config = default_index_config("hnsw")
+        index = make_faiss_index(16, config)
+        index.add(vectors[:10])
+        
+        rebuilt = rebuild_without(index, [0, 5], config)
+        
+        assert rebuilt.ntotal == 8
+        np.testing.assert_array_equal(rebuilt.reconstruct(0), vectors[1])
+    
+    def test_config_round_trip(self, tmp_path):
+        """Should save and load the index config."""
+        config = default_index_config("ivfpq")
+        save_index_config(config, str(tmp_path))
+        assert load_index_config(str(tmp_path)) == config
+        assert load_index_config(str(tmp_path / "missing")) is None
+
+
+class TestSearchSubset:
+    """Tests for the search_subset function."""
+    
+    @pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf", "ivfpq"])
+    @pytest.mark.parametrize("exact_max", [0, 1000])
+    def test_only_returns_subset(self, index_type, exact_max, vectors):
+        """Should search only the given positions, through the index or by exact scan."""
+        config = default_index_config(index_type)
+        config["pq_m"] = 4
+        index = train_index(16, config, vectors)
+        index.add(vectors)
+        set_search_params(index, nprobe=config["nlist"], ef_search=128)
+        subset = np.arange(0, 300, 3)
+        
+        _, ids = search_subset(index, vectors[[30, 31]], 5, subset, exact_max=exact_max)
+        
+        assert set(ids.ravel()) <= set(subset)
+        if index_type != "ivfpq":
+            assert ids[0, 0] == 30
+    
+    def test_pads_small_subsets(self, vectors):
+        """Should pad with -1 like FAISS when the subset has fewer than k vectors."""
+        index = train_index(16, default_index_config("flat"), vectors)
+        index.add(vectors)
+        
+        distances, ids = search_subset(index, vectors[:1], 4, [7, 0])
+        
+        assert list(ids[0]) == [0, 7, -1, -1]
+        assert distances[0, 0] == pytest.approx(0.0, abs=1e-5)
@@ -84,7 +84,7 @@ class TestVectorStoreIntegration:
         mock_splitter_class.return_value = mock_splitter
         
         mock_vector_store = MagicMock()
-        mock_faiss.from_documents.return_value = mock_vector_store
+        mock_faiss.from_embeddings.return_value = mock_vector_store
         
         # Create index
         test_text = "I am Data, an android aboard the USS Enterprise."
@@ -128,7 +128,8 @@ class TestChatbotChainIntegration:
         result = query_chain(chain, "What are you?")
         
         assert result == "I am an android."
-        mock_executor.invoke.assert_called_once_with({"input": "What are you?"})
+        mock_executor.invoke.assert_called_once()
+        assert mock_executor.invoke.call_args.args == ({"input": "What are you?"},)
 
 
 class TestEndToEndMocked:
@@ -0,0 +1,61 @@
+"""
+Unit tests for the lazy module.
+Checks that heavy dependencies stay unloaded until they are used.
+"""
+import os
+import subprocess
+import sys
+import types
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestLazyImports:
+    """Tests for LazyImports."""
+    
+    def make_module(self, names):
+        from src.lazy import LazyImports
+        
+        module = types.ModuleType("fake_module")
+        module.lazy = LazyImports(vars(module), names)
+        module.__getattr__ = module.lazy.__getattr__
+        return module
+    
+    def test_imports_on_first_use(self):
+        """Should import a module or one of its attributes and keep it in the module's globals."""
+        import json
+        module = self.make_module({"json": "json", "dumps": "json:dumps"})
+        
+        assert "dumps" not in vars(module)
+        assert module.lazy.dumps is json.dumps
+        assert module.json is json
+        assert vars(module)["dumps"] is json.dumps
+    
+    def test_patched_value_takes_precedence(self):
+        """Should return a value set on the module, as patch() does."""
+        module = self.make_module({"json": "json"})
+        module.json = "patched"
+        
+        assert module.lazy.json == "patched"
+    
+    def test_unknown_name(self):
+        """Should raise AttributeError for names it doesn't know."""
+        module = self.make_module({"json": "json"})
+        
+        with pytest.raises(AttributeError):
+            module.lazy.yaml
+
+
+class TestStartupImports:
+    """Tests that importing the chatbot doesn't load what a question hasn't needed yet."""
+    
+    @pytest.mark.parametrize("module", ["main", "ingest", "src.chatbot", "src.vector_store", "src.web_search"])
+    def test_heavy_dependencies_stay_unloaded(self, module):
+        """Should import without Ollama, FAISS, the semantic chunker or the search client."""
+        heavy = ["faiss", "langchain_ollama", "langchain_experimental", "ddgs", "langchain_classic.agents"]
+        script = f"import sys, {module}; print([name for name in {heavy!r} if name in sys.modules])"
+        
+        output = subprocess.run([sys.executable, "-c", script], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                                check=True).stdout
+        
+        assert output.strip() == "[]"
@@ -0,0 +1,59 @@
+"""
+Unit tests for the manifest module.
+Tests content hashing and change detection for incremental ingest.
+"""
+import pytest
+from src.manifest import Manifest, hash_file, hash_text
+
+
+class TestHashing:
+    """Tests for the hash helpers."""
+    
+    def test_hash_file_matches_hash_text(self, tmp_path):
+        """Should hash file bytes the same way as the equivalent text."""
+        path = tmp_path / "episode.txt"
+        path.write_text("DATA\nHello.\n", encoding="utf-8")
+        assert hash_file(str(path)) == hash_text("DATA\nHello.\n")
+    
+    def test_hash_text_differs_for_different_text(self):
+        """Should give different digests for different content."""
+        assert hash_text("Engage.") != hash_text("Make it so.")
+
+
+class TestManifest:
+    """Tests for the Manifest class."""
+    
+    def test_detects_new_changed_and_deleted_files(self):
+        """Should report new and modified files as changed and missing ones as deleted."""
+        manifest = Manifest(files={
+            "ep1.txt": {"hash": "a", "chunks": ["c1"]},
+            "ep2.txt": {"hash": "b", "chunks": ["c2"]},
+        })
+        current = {"ep1.txt": "a", "ep2.txt": "changed", "ep3.txt": "new"}
+        assert manifest.changed_files(current) == ["ep2.txt", "ep3.txt"]
+        assert manifest.deleted_files({"ep2.txt": "b"}) == ["ep1.txt"]
+    
+    def test_chunk_ids_are_shared(self):
+        """Should keep a chunk referenced while any file still produces it."""
+        manifest = Manifest()
+        manifest.set_file("ep1.txt", "a", ["shared", "c1"])
+        manifest.set_file("ep2.txt", "b", ["shared"])
+        manifest.remove_file("ep1.txt")
+        assert manifest.chunk_ids() == {"shared"}
+    
+    def test_round_trip(self, tmp_path):
+        """Should save and load settings and files."""
+        path = str(tmp_path / "index" / "manifest.json")
+        manifest = Manifest({"chunk_size": 800})
+        manifest.set_file("ep1.txt", "a", ["c1"])
+        manifest.save(path)
+        
+        loaded = Manifest.load(path)
+        assert loaded.settings == {"chunk_size": 800}
+        assert loaded.files == {"ep1.txt": {"hash": "a", "chunks": ["c1"]}}
+    
+    def test_load_missing_file(self, tmp_path):
+        """Should return an empty manifest when none exists."""
+        manifest = Manifest.load(str(tmp_path / "missing.json"))
+        assert manifest.files == {}
+        assert manifest.settings == {}
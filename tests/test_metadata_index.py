@@ -0,0 +1,79 @@
+"""
+Unit tests for the metadata_index module.
+Tests season inference, the secondary index on chunk metadata and query filters.
+"""
+import numpy as np
+import pytest
+from src.metadata_index import MetadataIndex, season_of
+
+
+class TestSeasonOf:
+    """Tests for the season_of function."""
+    
+    @pytest.mark.parametrize("episode, season", [
+        ("101.txt", 1), ("126.txt", 1), ("127.txt", 2), ("174.txt", 3), ("277.txt", 7),
+        ("tng_s05e12.txt", 5), ("episode1.txt", None), ("42.txt", None),
+    ])
+    def test_infers_season(self, episode, season):
+        assert season_of(episode) == season
+
+
+@pytest.fixture
+def index():
+    """An index over five chunks from two episodes."""
+    index = MetadataIndex()
+    for episode, speakers in [
+        ("150.txt", ["PICARD", "DATA"]), ("150.txt", ["RIKER"]), ("150.txt", ["DATA"]),
+        ("203.txt", ["PICARD"]), ("203.txt", ["DATA", "WORF"]),
+    ]:
+        index.add({"episode": episode, "season": season_of(episode), "speakers": speakers})
+    return index
+
+
+class TestMetadataIndex:
+    """Tests for the MetadataIndex class."""
+    
+    def test_positions_match_all_fields(self, index):
+        """Should accept any listed value of a field and require every field."""
+        np.testing.assert_array_equal(index.positions({"season": ["3"], "speakers": ["picard"]}), [0])
+        np.testing.assert_array_equal(index.positions({"speakers": ["RIKER", "WORF"]}), [1, 4])
+        assert len(index.positions({"season": ["3"], "speakers": ["WORF"]})) == 0
+    
+    def test_positions_none_without_narrowing(self, index):
+        """Should return None when there are no filters or they match everything."""
+        assert index.positions({}) is None
+        assert index.positions({"season": ["3", "5"]}) is None
+    
+    def test_filters_for_query(self, index):
+        """Should pick seasons, episodes and known speakers out of the question."""
+        assert index.filters_for("What does Picard say in season 3?") == {
+            "season": ["3"], "speakers": ["PICARD"]
+        }
+        assert index.filters_for("Worf's lines in episode 203") == {"episode": ["203.txt"], "speakers": ["WORF"]}
+        assert index.filters_for("Season 9, Q and the Borg") == {}
+    
+    def test_filters_only_capitalized_character_names(self, index):
+        """Should not turn ordinary words that are also speaker cues into speaker filters."""
+        index.add({"episode": "203.txt", "season": 3, "speakers": ["COMPUTER", "ALL"]})
+        
+        assert index.filters_for("What does the computer say to all of them?") == {}
+        assert index.filters_for("What does Computer say?") == {}
+        assert index.filters_for("What does Computer say?", speaker_names=None) == {"speakers": ["COMPUTER"]}
+        assert index.filters_for("what does data say?") == {}
+    
+    def test_from_vector_store_and_round_trip(self, index, tmp_path):
+        """Should index a vector store's documents in order and survive save and load."""
+        from langchain_core.documents import Document
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from src.vector_store import add_documents_batched
+        
+        docs = [Document(page_content=f"line {i}", metadata={"episode": "150.txt", "season": 3, "speakers": ["DATA"]})
+                for i in range(3)]
+        store = add_documents_batched(None, docs, embeddings=DeterministicFakeEmbedding(size=8))
+        MetadataIndex.from_vector_store(store).save(str(tmp_path))
+        
+        loaded = MetadataIndex.load(str(tmp_path))
+        
+        assert len(loaded) == 3
+        assert loaded.fields["speakers"] == {"DATA": [0, 1, 2]}
+        assert MetadataIndex.load(str(tmp_path / "missing")) is None
@@ -0,0 +1,100 @@
+"""
+Unit tests for the mmap_docstore module.
+Tests the memory-mapped document table and fast index loading.
+"""
+import pytest
+from langchain_core.documents import Document
+from src.mmap_docstore import MmapDocstore, PositionMapping, write_mmap_docstore, has_mmap_docstore
+
+
+@pytest.fixture
+def saved_index(fake_embeddings, tmp_path):
+    """Build and save a small index with the mmap docstore."""
+    from src.vector_store import add_documents_batched, save_index
+    
+    docs = [
+        Document(page_content="Make it so.", metadata={"speaker": "PICARD"}),
+        Document(page_content="Fascinating, Captain é.", metadata={"speaker": "DATA"}),
+        Document(page_content="Today is a good day to die.", metadata={"speaker": "WORF"}),
+    ]
+    store = add_documents_batched(None, docs, ids=["a", "b", "c"], embeddings=fake_embeddings)
+    save_index(store, str(tmp_path), mmap_docstore=True)
+    return str(tmp_path)
+
+
+class TestMmapDocstore:
+    """Tests for MmapDocstore."""
+    
+    def test_reads_documents_by_position(self, saved_index):
+        """Should return documents, ids and metadata in index order."""
+        docstore = MmapDocstore(saved_index)
+        
+        assert len(docstore) == 3
+        doc = docstore.search(1)
+        assert doc.page_content == "Fascinating, Captain é."
+        assert doc.metadata == {"speaker": "DATA"}
+        assert doc.id == "b"
+    
+    def test_missing_position(self, saved_index):
+        """Should return a not-found message like the in-memory docstore."""
+        assert "not found" in MmapDocstore(saved_index).search(7)
+    
+    def test_empty_store(self, tmp_path):
+        """Should handle an index without documents."""
+        from unittest.mock import MagicMock
+        store = MagicMock()
+        store.index.ntotal = 0
+        write_mmap_docstore(store, str(tmp_path))
+        
+        assert has_mmap_docstore(str(tmp_path))
+        assert len(MmapDocstore(str(tmp_path))) == 0
+
+
+class TestPositionMapping:
+    """Tests for PositionMapping."""
+    
+    def test_identity_mapping(self):
+        mapping = PositionMapping(3)
+        assert mapping[2] == 2
+        assert list(mapping.values()) == [0, 1, 2]
+        with pytest.raises(KeyError):
+            mapping[3]
+
+
+class TestMmapLoad:
+    """Tests for load_index(mmap=True)."""
+    
+    def test_same_results_as_regular_load(self, saved_index):
+        """Should answer searches exactly like the unpickled index."""
+        from src.vector_store import load_index
+        
+        mapped = load_index(saved_index, mmap=True)
+        regular = load_index(saved_index)
+        
+        assert isinstance(mapped.docstore, MmapDocstore)
+        for query in ["Make it so.", "good day"]:
+            assert mapped.similarity_search(query, k=2) == regular.similarity_search(query, k=2)
+    
+    def test_falls_back_without_docstore(self, fake_embeddings, tmp_path):
+        """Should load normally when the index was saved without the mmap docstore."""
+        from src.vector_store import add_documents_batched, save_index, load_index
+        
+        store = add_documents_batched(None, [Document(page_content="Engage.")], embeddings=fake_embeddings)
+        save_index(store, str(tmp_path))
+        
+        loaded = load_index(str(tmp_path), mmap=True)
+        
+        assert not isinstance(loaded.docstore, MmapDocstore)
+        assert loaded.similarity_search("Engage.", k=1)[0].page_content == "Engage."
+    
+    def test_resave_without_docstore_drops_stale_one(self, fake_embeddings, saved_index):
+        """Should not serve documents from an earlier save of an index with as many chunks."""
+        from src.vector_store import add_documents_batched, save_index, load_index
+        
+        docs = [Document(page_content=text) for text in ["Engage.", "Red alert.", "Tea, Earl Grey, hot."]]
+        save_index(add_documents_batched(None, docs, embeddings=fake_embeddings), saved_index)
+        
+        loaded = load_index(saved_index, mmap=True)
+        
+        assert not has_mmap_docstore(saved_index)
+        assert loaded.similarity_search("Engage.", k=1)[0].page_content == "Engage."
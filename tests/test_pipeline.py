@@ -0,0 +1,256 @@
+"""
+Unit tests for the pipeline module.
+Tests incremental ingest against a real FAISS index with fake embeddings.
+"""
+import pytest
+from unittest.mock import patch
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+
+@pytest.fixture
+def scripts_dir(tmp_path):
+    """Create a directory with two scripts."""
+    directory = tmp_path / "scripts"
+    directory.mkdir()
+    (directory / "episode1.txt").write_text("\nDATA\nGreetings from episode one.\n\n")
+    (directory / "episode2.txt").write_text("\nDATA\nHello from episode two.\n\n")
+    return directory
+
+
+class TestIncrementalIngest:
+    """Tests for the incremental_ingest function."""
+    
+    def test_initial_ingest_builds_index(self, fake_embeddings, scripts_dir, tmp_path):
+        """Should parse every script and embed every chunk on the first run."""
+        from src.pipeline import incremental_ingest
+        
+        index_path = str(tmp_path / "index")
+        result = incremental_ingest(str(scripts_dir), index_path, ["DATA"], workers=1)
+        
+        assert result.changed_files == ["episode1.txt", "episode2.txt"]
+        assert result.added_chunks == 2
+        assert (tmp_path / "index" / "manifest.json").exists()
+        assert (tmp_path / "index" / "index.faiss").exists()
+        assert (tmp_path / "index" / "bm25.json").exists()
+    
+    def test_reports_scripts_that_are_not_utf8(self, fake_embeddings, scripts_dir, tmp_path):
+        """Should index a Windows-1252 script and report how it was decoded."""
+        from src.pipeline import incremental_ingest
+        from src.script_reader import ScriptDecoding
+        
+        (scripts_dir / "episode3.txt").write_bytes("\nDATA\nA café on deck ten.\n\n".encode("cp1252"))
+        result = incremental_ingest(str(scripts_dir), str(tmp_path / "index"), ["DATA"], workers=1)
+        
+        assert result.added_chunks == 3
+        assert result.decodings == {str(scripts_dir / "episode3.txt"): ScriptDecoding("cp1252", 0)}
+    
+    def test_rerun_without_changes_does_nothing(self, fake_embeddings, scripts_dir, tmp_path):
+        """Should not parse or embed anything when no script changed."""
+        from src.pipeline import incremental_ingest
+        
+        index_path = str(tmp_path / "index")
+        incremental_ingest(str(scripts_dir), index_path, ["DATA"], workers=1)
+        with patch('src.pipeline.chunk_records') as mock_chunk:
+            result = incremental_ingest(str(scripts_dir), index_path, ["DATA"], workers=1)
+        
+        mock_chunk.assert_not_called()
+        assert result.changed_files == []
+        assert result.added_chunks == 0
+        assert result.removed_chunks == 0
+    
+    def test_only_changed_and_deleted_scripts_are_applied(self, fake_embeddings, scripts_dir, tmp_path):
+        """Should embed new chunks and remove vectors for deleted scripts."""
+        from src.pipeline import incremental_ingest
+        from src.vector_store import load_index
+        
+        index_path = str(tmp_path / "index")
+        incremental_ingest(str(scripts_dir), index_path, ["DATA"], workers=1)
+        (scripts_dir / "episode2.txt").unlink()
+        (scripts_dir / "episode3.txt").write_text("\nDATA\nA new episode.\n\n")
+        
+        result = incremental_ingest(str(scripts_dir), index_path, ["DATA"], workers=1)
+        
+        assert result.changed_files == ["episode3.txt"]
+        assert result.deleted_files == ["episode2.txt"]
+        assert result.added_chunks == 1
+        assert result.removed_chunks == 1
+        texts = sorted(doc.page_content for doc in load_index(index_path).docstore._dict.values())
+        assert texts == ["A new episode.", "Greetings from episode one."]
+    
+    @pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf", "ivfpq"])
+    def test_search_after_deleting_a_script(self, fake_embeddings, scripts_dir, tmp_path, index_type):
+        """Should only find the remaining chunks after a script's vectors are deleted."""
+        from src.index_factory import default_index_config
+        from src.pipeline import incremental_ingest
+        from src.vector_store import load_index
+        
+        (scripts_dir / "episode3.txt").write_text("\nDATA\nA third episode.\n\n")
+        index_path = str(tmp_path / "index")
+        config = default_index_config(index_type)
+        incremental_ingest(str(scripts_dir), index_path, ["DATA"], workers=1, index_config=config)
+        (scripts_dir / "episode2.txt").unlink()
+        
+        incremental_ingest(str(scripts_dir), index_path, ["DATA"], workers=1, index_config=config)
+        
+        store = load_index(index_path)
+        found = sorted(doc.page_content for doc in store.similarity_search("episode", k=5))
+        assert store.index.ntotal == 2
+        assert found == ["A third episode.", "Greetings from episode one."]
+    
+    def test_settings_change_forces_full_rebuild(self, fake_embeddings, scripts_dir, tmp_path):
+        """Should re-parse everything when the indexed characters change."""
+        from src.pipeline import incremental_ingest
+        
+        index_path = str(tmp_path / "index")
+        incremental_ingest(str(scripts_dir), index_path, ["DATA"], workers=1)
+        result = incremental_ingest(str(scripts_dir), index_path, ["DATA", "PICARD"], workers=1)
+        
+        assert result.changed_files == ["episode1.txt", "episode2.txt"]
+    
+    def test_pooling_setting_only_applies_to_semantic_chunking(self):
+        """Should not rebuild scene or recursive indexes when SEMANTIC_POOLED changes."""
+        from src.index_factory import default_index_config
+        from src.pipeline import ingest_settings
+        
+        settings = {chunking: ingest_settings(["DATA"], default_index_config("flat"), chunking)
+                    for chunking in ("scene", "recursive", "semantic")}
+        
+        assert "semantic_pooled" not in settings["scene"]
+        assert "semantic_pooled" not in settings["recursive"]
+        assert "semantic_pooled" in settings["semantic"]
+    
+    def test_semantic_chunking_embeds_sentences_once(self, scripts_dir, tmp_path):
+        """Should index semantic chunks with pooled sentence vectors and no second embedding pass."""
+        from unittest.mock import MagicMock
+        from src.pipeline import incremental_ingest
+        from src.vector_store import load_index
+        
+        (scripts_dir / "episode3.txt").write_text("\nDATA\nI am an android. I have no emotions. Spot is my cat.\n\n")
+        embeddings = MagicMock(wraps=DeterministicFakeEmbedding(size=16))
+        index_path = str(tmp_path / "index")
+        
+        result = incremental_ingest(str(scripts_dir), index_path, ["DATA"], workers=1, embeddings=embeddings,
+                                    chunking="semantic")
+        
+        embedded = [text for call in embeddings.embed_documents.call_args_list for text in call.args[0]]
+        assert "Spot is my cat." in embedded
+        assert "I am an android. I have no emotions. Spot is my cat." not in embedded
+        with patch('src.vector_store.get_embeddings', return_value=embeddings):
+            assert load_index(index_path).index.ntotal == result.added_chunks
+    
+    def test_full_rebuild_streams_dump_and_reports_rss(self, fake_embeddings, scripts_dir, tmp_path):
+        """Should write the dialogue dump while streaming and report peak RSS."""
+        from src.pipeline import incremental_ingest
+        
+        dump_path = tmp_path / "processed" / "data_lines.txt"
+        progress = []
+        result = incremental_ingest(str(scripts_dir), str(tmp_path / "index"), ["DATA"], workers=1,
+                                    full=True, progress=progress.append, dump_path=str(dump_path))
+        
+        assert dump_path.read_text() == "Greetings from episode one.\nHello from episode two.\n"
+        assert result.dialogue_lines == 2
+        assert result.speakers == 1
+        assert progress == [2]
+        assert result.peak_rss_mb is None or result.peak_rss_mb > 0
+
+
+class TestIterNewChunks:
+    """Tests for the iter_new_chunks generator."""
+    
+    def test_is_lazy_and_skips_known_chunks(self, tmp_path):
+        """Should chunk one script at a time and skip chunks already indexed."""
+        from src.manifest import Manifest
+        from src.pipeline import iter_new_chunks, chunk_id
+        from src.processor import DialogueRecords
+        
+        def parsed():
+            for name, text in [("ep1.txt", "Known line."), ("ep2.txt", "New line.")]:
+                records = DialogueRecords()
+                records.append("DATA", name, 0, 0, text)
+                yield name, records, 0.0
+        
+        manifest = Manifest()
+        stats = {"timings": {}, "speakers": set(), "dialogue_lines": 0, "added_chunks": 0}
+        chunks = iter_new_chunks(parsed(), manifest, {"ep1.txt": "h1", "ep2.txt": "h2"},
+                                 {chunk_id("ep1.txt", "Known line.")}, stats)
+        
+        assert manifest.files == {}
+        doc, doc_id = next(chunks)
+        assert doc.page_content == "New line."
+        assert doc_id == chunk_id("ep2.txt", "New line.")
+        assert list(manifest.files) == ["ep1.txt"]
+        assert list(chunks) == []
+        assert stats["added_chunks"] == 1
+
+
+class TestChunkRecords:
+    """Tests for the chunk_records function."""
+    
+    def test_chunks_carry_provenance(self):
+        """Should tag each recursive chunk with its episode, season and the speakers of its lines."""
+        from src.pipeline import chunk_records
+        from src.processor import DialogueRecords
+        
+        records = DialogueRecords()
+        for i in range(40):
+            records.append(["PICARD", "DATA", "RIKER"][i // 14], "150.txt", 0, i, f"Line {i:02d} of the captain's log, supplemental, stardate 41153.7.")
+        
+        docs = chunk_records("150.txt", records, chunking="recursive")
+        
+        assert len(docs) > 1
+        assert all(doc.metadata["episode"] == "150.txt" and doc.metadata["season"] == 3 for doc in docs)
+        assert docs[0].metadata["speakers"] == ["PICARD"]
+        assert docs[-1].metadata["speakers"] == ["RIKER"]
+        assert any(len(doc.metadata["speakers"]) == 2 for doc in docs)
+
+
+    def test_scene_chunks_follow_scenes(self):
+        """Should keep scenes together, split one too long for a chunk between turns and tag the speakers."""
+        from src.pipeline import chunk_records
+        from src.processor import DialogueRecords
+        
+        records = DialogueRecords()
+        lines = [("PICARD", 1, "Report."), ("DATA", 1, "Shields are holding."), ("RIKER", 2, "Red alert!"),
+                 ("WORF", 2, "Torpedoes ready." * 200), ("DATA", 3, "Intriguing.")]
+        for i, (speaker, scene, text) in enumerate(lines):
+            records.append(speaker, "150.txt", scene, i, text)
+        
+        docs = chunk_records("150.txt", records)
+        
+        assert [doc.page_content for doc in docs] == [
+            "Report.\nShields are holding.", "Red alert!", "Torpedoes ready." * 200, "Intriguing."
+        ]
+        assert [doc.metadata["speakers"] for doc in docs] == [["DATA", "PICARD"], ["RIKER"], ["WORF"], ["DATA"]]
+        assert all(doc.metadata["season"] == 3 for doc in docs)
+    
+    def test_rejects_unknown_strategy(self):
+        """Should raise for a chunking strategy it doesn't know."""
+        from src.pipeline import chunk_records
+        from src.processor import DialogueRecords
+        
+        with pytest.raises(ValueError):
+            chunk_records("150.txt", DialogueRecords(), chunking="paragraph")
+
+
+class TestFilteredRetrieval:
+    """End-to-end tests for metadata pre-filtering over an ingested index."""
+    
+    def test_speaker_and_season_filters(self, fake_embeddings, tmp_path):
+        """Should ingest a metadata index and search only the chunks a question names."""
+        from src.pipeline import incremental_ingest
+        from src.retrievers import build_retriever
+        from src.vector_store import load_index
+        
+        directory = tmp_path / "scripts"
+        directory.mkdir()
+        (directory / "150.txt").write_text("\nPICARD\nMake it so.\n\nRIKER\nAye, sir.\n\n")
+        (directory / "203.txt").write_text("\nPICARD\nEngage.\n\nWORF\nShields up.\n\n")
+        index_path = str(tmp_path / "index")
+        incremental_ingest(str(directory), index_path, None, workers=1)
+        
+        retriever = build_retriever(load_index(index_path), index_path, 10)
+        
+        season_3 = retriever.invoke("What did Picard say in season 3?")
+        assert {doc.metadata["episode"] for doc in season_3} == {"150.txt"}
+        worf = retriever.invoke("Worf")
+        assert [doc.page_content for doc in worf] == ["Engage.\nShields up."]
@@ -0,0 +1,66 @@
+"""
+Unit tests for the prefetch module.
+Tests that prefetched tool results are reused, shared between turns and dropped afterwards.
+"""
+import time
+import uuid
+from src.prefetch import ToolPrefetcher
+
+
+class TestToolPrefetcher:
+    """Tests for the ToolPrefetcher class."""
+    
+    def test_reuses_prefetched_result(self):
+        """Should run the tool once when the agent asks for the prefetched question."""
+        calls = []
+        prefetcher = ToolPrefetcher()
+        tool = prefetcher.wrap("kb", lambda q: calls.append(q) or f"result for {q}")
+        
+        prefetcher.start("What are you?")
+        
+        assert tool("what are you") == "result for What are you?"
+        assert tool("Something else") == "result for Something else"
+        assert calls == ["What are you?", "Something else"]
+        assert (prefetcher.hits, prefetcher.misses) == (1, 1)
+    
+    def test_runs_tools_in_parallel(self):
+        """Should run all registered tools at the same time."""
+        prefetcher = ToolPrefetcher()
+        tools = [prefetcher.wrap(name, lambda q: time.sleep(0.2) or q) for name in ("kb", "web")]
+        
+        start = time.perf_counter()
+        prefetcher.start("question")
+        results = [tool("question") for tool in tools]
+        
+        assert results == ["question", "question"]
+        assert time.perf_counter() - start < 0.35
+    
+    def test_keeps_results_until_last_turn_ends(self):
+        """Should share a prefetch between concurrent turns and drop it after both end."""
+        prefetcher = ToolPrefetcher()
+        prefetcher.wrap("kb", str.upper)
+        first, second = uuid.uuid4(), uuid.uuid4()
+        
+        prefetcher.on_chain_start({}, {"input": "hi"}, run_id=first)
+        prefetcher.on_chain_start({}, {"input": "Hi"}, run_id=second)
+        prefetcher.on_chain_end({}, run_id=first)
+        assert len(prefetcher._pending) == 1
+        prefetcher.on_chain_error(RuntimeError(), run_id=second)
+        
+        assert prefetcher._pending == {}
+    
+    def test_failed_prefetch_falls_back_to_real_call(self):
+        attempts = []
+        
+        def flaky(query):
+            attempts.append(query)
+            if len(attempts) == 1:
+                raise ConnectionError("first call fails")
+            return "ok"
+        
+        prefetcher = ToolPrefetcher()
+        tool = prefetcher.wrap("web", flaky)
+        prefetcher.start("q")
+        
+        assert tool("q") == "ok"
+        assert len(attempts) == 2
@@ -9,8 +9,13 @@ from src.processor import (
     strip_parentheses,
     is_single_word_all_caps,
     extract_character_lines,
+    extract_dialogues,
+    scan_script,
+    collect_dialogues,
     process_directory,
-    save_dialogues
+    save_dialogues,
+    DialogueRecords,
+    DialogueRecord
 )
 
 
@@ -155,6 +160,114 @@ DATA
         assert "Captain, I believe we have a problem." in dialogues[0]
 
 
+class TestExtractDialogues:
+    """Tests for the single-pass extract_dialogues function."""
+    
+    @pytest.fixture
+    def scene_script(self, tmp_path):
+        """Create a script with scene headings and several speakers."""
+        script_content = """1  INT. MAIN BRIDGE
+
+PICARD
+Make it so.
+
+DATA
+Aye, sir.
+
+2  EXT. PLANET SURFACE
+
+RIKER
+(grinning) Away team ready.
+
+"""
+        script_file = tmp_path / "episode101.txt"
+        script_file.write_text(script_content)
+        return str(script_file)
+    
+    def test_extracts_every_speaker(self, scene_script):
+        """Should return one record per dialogue for all speakers."""
+        records = extract_dialogues(scene_script)
+        assert list(records) == [
+            DialogueRecord("PICARD", "episode101.txt", 1, 2, "Make it so."),
+            DialogueRecord("DATA", "episode101.txt", 1, 5, "Aye, sir."),
+            DialogueRecord("RIKER", "episode101.txt", 2, 10, "Away team ready."),
+        ]
+    
+    def test_filters_characters(self, scene_script):
+        """Should keep only the requested speakers."""
+        records = extract_dialogues(scene_script, ["DATA", "RIKER"])
+        assert [r.character for r in records] == ["DATA", "RIKER"]
+    
+    def test_keeps_scripts_that_are_not_utf8(self, tmp_path):
+        """Should parse a Windows-1252 script instead of dropping it, and report how it was decoded."""
+        from src.script_reader import ScriptDecoding
+        
+        script_file = tmp_path / "episode102.txt"
+        script_file.write_bytes("DATA\nI am not a café.\n\nPICARD\nMake it so.\n\n".encode("cp1252"))
+        decodings = {}
+        
+        records = extract_dialogues(str(script_file), decodings=decodings)
+        
+        assert records.texts() == ["I am not a café.", "Make it so."]
+        assert decodings == {str(script_file): ScriptDecoding("cp1252", 0)}
+    
+    def test_texts_by_character(self, scene_script):
+        """Should select texts for a single character from the container."""
+        records = extract_dialogues(scene_script)
+        assert records.texts("PICARD") == ["Make it so."]
+        assert records.texts("WORF") == []
+
+
+class TestScanScript:
+    """Tests for the scan_script tokenizer."""
+    
+    def test_joins_multiline_dialogue(self):
+        """Should join the lines under a cue and drop parentheticals that span them."""
+        text = "DATA\nI am (pausing\nbriefly) \"fully\"\n  functional.\n\n"
+        assert list(scan_script(text)) == [("DATA", 0, 0, "I am  'fully' functional.")]
+    
+    def test_drops_unterminated_dialogue(self):
+        """Should not yield a dialogue that no blank line closes."""
+        assert list(scan_script("DATA\nFascinating.\n")) == []
+        assert list(scan_script("DATA\nFascinating.\n\n")) == [("DATA", 0, 0, "Fascinating.")]
+    
+    def test_matches_reference_parser(self):
+        """Should tokenize edge-case scripts exactly as the previous line-by-line parser did."""
+        import random
+        from benchmarks.bench_parser import reference_scan, tricky_script
+        
+        rng = random.Random(0)
+        for _ in range(300):
+            text = tricky_script(rng, lines=60)
+            assert list(scan_script(text)) == reference_scan(text)
+
+
+class TestDialogueRecords:
+    """Tests for the DialogueRecords container."""
+    
+    def test_append_and_index(self):
+        """Should store and return records by index."""
+        records = DialogueRecords()
+        records.append("DATA", "ep1.txt", 0, 3, "Fascinating.")
+        assert len(records) == 1
+        assert records[0] == DialogueRecord("DATA", "ep1.txt", 0, 3, "Fascinating.")
+        assert records[-1].text == "Fascinating."
+        with pytest.raises(IndexError):
+            records[1]
+    
+    def test_extend_remaps_names(self):
+        """Should merge another container, interning names consistently."""
+        first = DialogueRecords()
+        first.append("DATA", "ep1.txt", 0, 1, "One.")
+        second = DialogueRecords()
+        second.append("WORF", "ep2.txt", 1, 2, "Two.")
+        second.append("DATA", "ep2.txt", 1, 5, "Three \u00e9.")
+        first.extend(second)
+        assert first.character_names == ["DATA", "WORF"]
+        assert [r.text for r in first] == ["One.", "Two.", "Three \u00e9."]
+        assert first.texts("DATA") == ["One.", "Three \u00e9."]
+
+
 class TestProcessDirectory:
     """Tests for the process_directory function."""
     
@@ -191,6 +304,42 @@ Hello from episode two.
         """Should handle empty directory."""
         dialogues = process_directory(str(tmp_path), "DATA")
         assert dialogues == []
+    
+    def test_results_in_filename_order(self, script_directory):
+        """Should merge results in sorted filename order."""
+        dialogues = process_directory(script_directory, "DATA")
+        assert dialogues == ["Greetings from episode one.", "Hello from episode two."]
+    
+    def test_process_pool_matches_serial(self, script_directory):
+        """Should produce identical output with a process pool."""
+        serial = process_directory(script_directory, "DATA")
+        parallel = process_directory(script_directory, "DATA", workers=2, chunk_size=1)
+        assert parallel == serial
+    
+    def test_reports_decodings_from_workers(self, script_directory):
+        """Should collect how scripts were decoded from the worker processes."""
+        path = os.path.join(script_directory, "episode3.txt")
+        with open(path, "wb") as f:
+            f.write(b"DATA\nA stray \x81 byte.\n\n")
+        decodings = {}
+        
+        records = collect_dialogues(script_directory, ["DATA"], workers=2, chunk_size=1, decodings=decodings)
+        
+        assert "A stray \ufffd byte." in records.texts()
+        assert list(decodings) == [path]
+        assert decodings[path].substitutions == 1
+    
+    def test_collect_dialogues_single_parse(self, script_directory):
+        """Should return records for all speakers across the directory."""
+        records = collect_dialogues(script_directory, workers=2)
+        assert [r.episode for r in records] == ["episode1.txt", "episode2.txt"]
+    
+    def test_records_per_file_timings(self, script_directory):
+        """Should fill the timings dict with one entry per script."""
+        timings = {}
+        process_directory(script_directory, "DATA", timings=timings)
+        assert sorted(os.path.basename(p) for p in timings) == ["episode1.txt", "episode2.txt"]
+        assert all(elapsed >= 0 for elapsed in timings.values())
 
 
 class TestSaveDialogues:
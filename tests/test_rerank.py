@@ -0,0 +1,92 @@
+"""
+Unit tests for the rerank module.
+Tests the candidate scorers, chunk overlap removal and token-budgeted selection.
+"""
+import pytest
+from langchain_core.documents import Document
+from src.rerank import (
+    estimate_tokens, overlap_length, trim_overlap, select_documents, LexicalScorer, EmbeddingScorer,
+    make_scorer
+)
+
+FIRST = "DATA: I am an android. I do not require sleep. PICARD: Make it so, Number One."
+SECOND = "PICARD: Make it so, Number One. RIKER: Aye, sir. Shields up."
+
+
+class TestOverlap:
+    """Tests for the overlap helpers."""
+    
+    def test_finds_splitter_overlap(self):
+        """Should find the text a chunk repeats from the end of the previous one."""
+        assert overlap_length(FIRST, SECOND) == len("PICARD: Make it so, Number One.")
+        assert overlap_length(SECOND, FIRST) == 0
+    
+    def test_ignores_short_coincidences(self):
+        assert overlap_length("Make it so", "so it goes") == 0
+    
+    def test_trims_shared_head_and_tail(self):
+        """Should cut what the kept chunks already say, from either end."""
+        assert trim_overlap(SECOND, [FIRST]) == "RIKER: Aye, sir. Shields up."
+        assert trim_overlap(FIRST, [SECOND]) == "DATA: I am an android. I do not require sleep."
+    
+    def test_drops_contained_text(self):
+        assert trim_overlap("Make it so", [FIRST]) is None
+
+
+class TestSelectDocuments:
+    """Tests for the select_documents function."""
+    
+    def test_keeps_best_within_budget(self):
+        """Should keep the best scoring chunks, skipping ones that would overrun the budget."""
+        docs = [Document(page_content=text) for text in ("a" * 400, "b" * 40, "c" * 40, "d" * 40)]
+        
+        selected = select_documents(docs, [0.1, 0.9, 0.5, 0.8], top_n=3, token_budget=30)
+        
+        assert [doc.page_content[0] for doc in selected] == ["b", "d", "c"]
+    
+    def test_always_keeps_the_best_chunk(self):
+        docs = [Document(page_content="a" * 400)]
+        
+        assert len(select_documents(docs, [1.0], top_n=3, token_budget=10)) == 1
+    
+    def test_removes_overlap_without_touching_originals(self):
+        """Should return trimmed copies, keeping metadata and leaving the input documents alone."""
+        docs = [Document(page_content=FIRST, metadata={"n": 1}), Document(page_content=SECOND, metadata={"n": 2})]
+        
+        selected = select_documents(docs, [1.0, 0.5], top_n=2, token_budget=1000)
+        
+        assert selected[1].page_content == "RIKER: Aye, sir. Shields up."
+        assert selected[1].metadata == {"n": 2}
+        assert docs[1].page_content == SECOND
+    
+    def test_prompt_gets_shorter(self):
+        """Should pass on far less text than the untrimmed candidates."""
+        docs = [Document(page_content=f"{FIRST} {i} {SECOND}") for i in range(10)]
+        
+        selected = select_documents(docs, LexicalScorer()("android", [d.page_content for d in docs]), 4, 80)
+        
+        assert sum(estimate_tokens(d.page_content) for d in selected) <= 80
+        assert sum(len(d.page_content) for d in selected) < sum(len(d.page_content) for d in docs) / 4
+
+
+class TestScorers:
+    """Tests for the candidate scorers."""
+    
+    def test_lexical_scorer_prefers_shared_words(self):
+        scores = LexicalScorer()("android sleep", ["Shields up.", "I am an android. I do not require sleep."])
+        
+        assert scores[1] > scores[0] == 0.0
+    
+    def test_embedding_scorer_uses_cosine(self):
+        """Should score the candidate embedded like the query highest."""
+        from benchmarks.common import HashingEmbeddings
+        
+        scores = EmbeddingScorer(HashingEmbeddings(64))("warp core", ["tea earl grey", "warp core breach"])
+        
+        assert scores[1] > scores[0]
+        assert scores[1] <= 1.0
+    
+    def test_make_scorer(self):
+        assert isinstance(make_scorer("lexical"), LexicalScorer)
+        with pytest.raises(ValueError, match="Unknown rerank scorer"):
+            make_scorer("magic")
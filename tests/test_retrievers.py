@@ -0,0 +1,151 @@
+"""
+Unit tests for the retrievers module.
+Tests hybrid BM25 + vector retrieval and retriever construction.
+"""
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic fake embeddings that count query embeddings."""
+    
+    def __init__(self):
+        self.fake = DeterministicFakeEmbedding(size=16)
+        self.query_calls = 0
+    
+    def embed_documents(self, texts):
+        return self.fake.embed_documents(texts)
+    
+    def embed_query(self, text):
+        self.query_calls += 1
+        return self.fake.embed_query(text)
+
+
+@pytest.fixture
+def embeddings():
+    return CountingEmbeddings()
+
+
+@pytest.fixture
+def vector_store(embeddings):
+    """A small FAISS store of TNG lines."""
+    from src.vector_store import add_documents_batched
+    
+    texts = [
+        "The Prime Directive is not just a set of rules.",
+        "Tea, Earl Grey, hot.",
+        "Make it so.",
+        "I am an android. I do not require sleep.",
+        "Shields up. Red alert.",
+    ]
+    docs = [Document(page_content=text) for text in texts]
+    return add_documents_batched(None, docs, ids=[f"c{i}" for i in range(5)], embeddings=embeddings)
+
+
+@pytest.fixture
+def retriever(vector_store):
+    from src.bm25 import BM25Index
+    from src.retrievers import HybridRetriever
+    return HybridRetriever(vector_store=vector_store, bm25=BM25Index.from_vector_store(vector_store), k=3)
+
+
+class TestHybridRetriever:
+    """Tests for the HybridRetriever class."""
+    
+    def test_exact_quote_skips_embedding(self, retriever, embeddings):
+        """Should answer a quoted phrase from BM25 without embedding the query."""
+        docs = retriever.invoke('What did Picard say about "the Prime Directive"?')
+        
+        assert embeddings.query_calls == 0
+        assert docs[0].page_content.startswith("The Prime Directive")
+    
+    def test_fuses_lexical_and_dense_results(self, retriever, embeddings):
+        """Should fall back to fused retrieval when the lexical hit isn't conclusive."""
+        docs = retriever.invoke("something about androids and sleep")
+        
+        assert embeddings.query_calls == 1
+        assert len(docs) == 3
+        assert len({doc.id for doc in docs}) == 3
+    
+    def test_shortcut_can_be_disabled(self, retriever, embeddings):
+        """Should always run vector search with the shortcut off."""
+        retriever.lexical_shortcut = False
+        
+        retriever.invoke('"Earl Grey"')
+        
+        assert embeddings.query_calls == 1
+
+
+class TestBuildRetriever:
+    """Tests for the build_retriever function."""
+    
+    def test_uses_hybrid_when_bm25_saved(self, vector_store, tmp_path):
+        from src.bm25 import BM25Index
+        from src.retrievers import HybridRetriever, build_retriever
+        
+        BM25Index.from_vector_store(vector_store).save(str(tmp_path))
+        
+        assert isinstance(build_retriever(vector_store, str(tmp_path), 4), HybridRetriever)
+    
+    def test_falls_back_to_vector_search(self, vector_store, tmp_path):
+        from src.retrievers import HybridRetriever, build_retriever
+        
+        retriever = build_retriever(vector_store, str(tmp_path), 4)
+        
+        assert not isinstance(retriever, HybridRetriever)
+        assert retriever.search_kwargs == {"k": 4}
+
+
+class TestRerankingRetriever:
+    """Tests for the RerankingRetriever class."""
+    
+    def test_reranks_and_trims_candidates(self, retriever):
+        """Should pass on the best scoring candidates only, within top_n."""
+        from src.retrievers import RerankingRetriever
+        from src.rerank import LexicalScorer
+        
+        retriever.k = 5
+        retriever.lexical_shortcut = False
+        reranking = RerankingRetriever(base=retriever, scorer=LexicalScorer(), top_n=2)
+        
+        docs = reranking.invoke("android sleep")
+        
+        assert len(docs) == 2
+        assert docs[0].page_content == "I am an android. I do not require sleep."
+    
+    def test_built_on_top_of_hybrid_retrieval(self, vector_store, tmp_path):
+        """Should over-fetch from the hybrid retriever when reranking is on."""
+        from src.bm25 import BM25Index
+        from src.retrievers import HybridRetriever, RerankingRetriever, build_retriever
+        from src.config import RERANK_FETCH_K
+        
+        BM25Index.from_vector_store(vector_store).save(str(tmp_path))
+        retriever = build_retriever(vector_store, str(tmp_path), 4, rerank=True)
+        
+        assert isinstance(retriever, RerankingRetriever)
+        assert isinstance(retriever.base, HybridRetriever)
+        assert retriever.base.k == RERANK_FETCH_K
+
+
+class TestFilteredVectorRetriever:
+    """Tests for metadata pre-filtering without BM25."""
+    
+    def test_searches_only_named_speaker(self, embeddings, tmp_path):
+        """Should only return chunks of the speaker the query names."""
+        from src.metadata_index import MetadataIndex
+        from src.retrievers import FilteredVectorRetriever, build_retriever
+        from src.vector_store import add_documents_batched
+        
+        docs = [
+            Document(page_content=text, metadata={"episode": "150.txt", "season": 3, "speakers": [speaker]})
+            for text, speaker in [("Make it so.", "PICARD"), ("Shields up.", "WORF"), ("Engage.", "PICARD")]
+        ]
+        store = add_documents_batched(None, docs, embeddings=embeddings)
+        MetadataIndex.from_vector_store(store).save(str(tmp_path))
+        
+        retriever = build_retriever(store, str(tmp_path), 3, hybrid=False)
+        
+        assert isinstance(retriever, FilteredVectorRetriever)
+        assert {doc.page_content for doc in retriever.invoke("What did Picard order?")} == {"Make it so.", "Engage."}
+        assert len(retriever.invoke("What was ordered?")) == 3
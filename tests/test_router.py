@@ -0,0 +1,56 @@
+"""
+Unit tests for the router module.
+Tests the rule-based question classifier and the per-route bookkeeping.
+"""
+import pytest
+from src.router import classify_question, QueryRouter, RETRIEVAL_ROUTE, AGENT_ROUTE
+
+
+class TestClassifyQuestion:
+    """Tests for the classify_question function."""
+    
+    @pytest.mark.parametrize("question", [
+        'Who said "make it so"?',
+        "What did Data say about sleep?",
+        "Which episode has Data's cat?",
+        "What does Picard tell Riker in the ready room scene?",
+    ])
+    def test_script_questions_skip_the_agent(self, question):
+        assert classify_question(question)[0] == RETRIEVAL_ROUTE
+    
+    @pytest.mark.parametrize("question", [
+        "Who played Data?",
+        "What did Brent Spiner say in the latest interview?",
+        "What is a positronic brain?",
+        "Hello!",
+        "Tell me about warp drive",
+        "Ask Picard what a tachyon is",
+        "Who wrote the episode The Measure of a Man?",
+    ])
+    def test_web_and_open_questions_go_to_the_agent(self, question):
+        """Should prefer the agent for outside knowledge, mixed questions and anything unclear."""
+        assert classify_question(question)[0] == AGENT_ROUTE
+    
+    def test_gives_a_reason(self):
+        assert classify_question("Who played Data?")[1] == "web cue 'played'"
+
+
+class TestQueryRouter:
+    """Tests for the QueryRouter class."""
+    
+    def test_routes_and_records_latency(self, caplog):
+        """Should pick the chain for the route, log the decision and keep per-route timings."""
+        import logging
+        
+        router = QueryRouter("agent chain", "retrieval chain")
+        with caplog.at_level(logging.INFO, logger="src.router"):
+            route, reason, chain = router.route("What did Data say?")
+            router.record(route, 0.5)
+            router.record(route, 1.5)
+        
+        assert (route, chain) == (RETRIEVAL_ROUTE, "retrieval chain")
+        assert router.agent == "agent chain"
+        assert router.stats()[RETRIEVAL_ROUTE] == {"count": 2, "seconds": 2.0, "mean_seconds": 1.0}
+        assert router.stats()[AGENT_ROUTE]["mean_seconds"] is None
+        assert "route=retrieval reason=script cue 'say'" in caplog.text
+        assert "route=retrieval latency=1.500s" in caplog.text
@@ -0,0 +1,66 @@
+"""
+Unit tests for the script_reader module.
+Tests memory-mapped reading and the encoding fallbacks.
+"""
+import pytest
+from src.script_reader import read_script, decode_script, ScriptDecoding
+
+
+class TestDecodeScript:
+    """Tests for the decode_script function."""
+    
+    def test_decodes_utf8(self):
+        """Should decode UTF-8 without substitutions."""
+        assert decode_script("DATA\nÇa va.\n".encode("utf-8")) == ("DATA\nÇa va.\n", ScriptDecoding("utf-8", 0))
+    
+    def test_falls_back_to_cp1252(self):
+        """Should decode Windows-1252 text that isn't valid UTF-8."""
+        text, decoding = decode_script("DATA\nIt’s café time.\n".encode("cp1252"))
+        
+        assert text == "DATA\nIt’s café time.\n"
+        assert decoding == ScriptDecoding("cp1252", 0)
+    
+    def test_replaces_undecodable_bytes(self):
+        """Should keep the rest of the script and count the replaced bytes."""
+        # 0x81 is undefined in cp1252 too
+        text, decoding = decode_script(b"DATA\nSo \x81 be it. \xef\xbf\xbd\n")
+        
+        assert text == "DATA\nSo � be it. �\n"
+        assert decoding == ScriptDecoding("utf-8", 1)
+    
+    def test_keeps_utf8_with_a_stray_byte(self):
+        """Should replace a stray byte in a UTF-8 script instead of decoding it all as cp1252."""
+        text, decoding = decode_script("DATA\nÇa va, café, naïve.\n".encode("utf-8") + b"\x92\n")
+        
+        assert text == "DATA\nÇa va, café, naïve.\n\ufffd\n"
+        assert decoding == ScriptDecoding("utf-8", 1)
+    
+    def test_detects_utf16_bom(self):
+        """Should decode UTF-16 when the script starts with its byte order mark."""
+        text, decoding = decode_script("DATA\nEngage.\n".encode("utf-16"))
+        
+        assert text == "DATA\nEngage.\n"
+        assert decoding.encoding == "utf-16"
+    
+    @pytest.mark.parametrize("data", [b"A\r\nB\rC\n", b"A\nB\nC\n"])
+    def test_translates_newlines(self, data):
+        """Should turn \\r\\n and \\r into \\n, as text mode does."""
+        assert decode_script(data)[0] == "A\nB\nC\n"
+
+
+class TestReadScript:
+    """Tests for the read_script function."""
+    
+    def test_reads_file(self, tmp_path):
+        """Should read and decode a script file."""
+        path = tmp_path / "101.txt"
+        path.write_bytes("PICARD\nTea, Earl Grey, hot.\n".encode("cp1252"))
+        
+        assert read_script(str(path)) == ("PICARD\nTea, Earl Grey, hot.\n", ScriptDecoding("utf-8", 0))
+    
+    def test_empty_file(self, tmp_path):
+        """Should return empty text for an empty file, which can't be memory-mapped."""
+        path = tmp_path / "empty.txt"
+        path.write_bytes(b"")
+        
+        assert read_script(str(path)) == ("", ScriptDecoding("utf-8", 0))
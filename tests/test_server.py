@@ -0,0 +1,139 @@
+"""
+Unit tests for the server module.
+Runs the real agent with the offline StubChatModel behind an in-process test server.
+"""
+import asyncio
+import pytest
+from aiohttp.test_utils import TestServer, TestClient
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.chatbot import build_rag_chain, StubChatModel
+from src.server import ChatServer
+
+
+class StaticRetriever(BaseRetriever):
+    """Returns the same line for every query."""
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [Document(page_content="I am an android.")]
+
+
+def make_chain(latency=0.0):
+    chain = build_rag_chain(StaticRetriever(), llm=StubChatModel(latency=latency))
+    chain.verbose = False
+    return chain
+
+
+def serve(server, scenario):
+    """Runs scenario(client) against the server's app and returns its result."""
+    async def run():
+        async with TestClient(TestServer(server.make_app())) as client:
+            return await scenario(client)
+    return asyncio.run(run())
+
+
+class TestChatServer:
+    """Tests for the ChatServer class."""
+
+    def test_chat_answers_over_http(self):
+        """Should run the agent and return its answer, steps and timings."""
+        async def scenario(client):
+            response = await client.post("/chat", json={"question": "What are you?"})
+            return response.status, await response.json()
+
+        status, body = serve(ChatServer(make_chain()), scenario)
+
+        assert status == 200
+        assert body["answer"] == "I am an android."
+        assert body["steps"][0] == "Action: tng_knowledge_base (What are you?)"
+        assert body["cached"] is False
+
+    def test_metrics_cover_answered_turns(self):
+        """Should export per-stage metrics of the turns served and the server's counters."""
+        async def scenario(client):
+            await client.post("/chat", json={"question": "What are you?"})
+            response = await client.get("/metrics")
+            return response.status, await response.text()
+
+        status, text = serve(ChatServer(make_chain()), scenario)
+
+        assert status == 200
+        assert 'chatbot_turns_total{cached="false",route="none",status="ok"} 1' in text
+        assert 'chatbot_stage_duration_seconds_count{name="tng_knowledge_base",stage="tool"} 1' in text
+        assert "chatbot_server_completed 1" in text
+
+    def test_chat_rejects_missing_question(self):
+        async def scenario(client):
+            response = await client.post("/chat", data="not json")
+            return response.status
+
+        assert serve(ChatServer(make_chain()), scenario) == 400
+
+    def test_websocket_streams_tokens(self):
+        """Should stream steps, then answer tokens, then the stats, for each question."""
+        async def scenario(client):
+            ws = await client.ws_connect("/ws")
+            sessions = []
+            for question in ("What are you?", '{"question": "Who are you?"}'):
+                await ws.send_str(question)
+                messages = []
+                while not messages or messages[-1]["type"] not in ("done", "error"):
+                    messages.append(await ws.receive_json())
+                sessions.append(messages)
+            await ws.close()
+            return sessions
+
+        for messages in serve(ChatServer(make_chain()), scenario):
+            types = [m["type"] for m in messages]
+            assert types.index("step") < types.index("token")
+            assert "".join(m["data"] for m in messages if m["type"] == "token") == "I am an android."
+            assert messages[-1]["data"]["output"] == "I am an android."
+
+    def test_turns_away_requests_beyond_the_queue(self):
+        """Should answer what fits in the workers and queue and refuse the rest with 503."""
+        server = ChatServer(make_chain(latency=0.05), workers=1, queue_size=1)
+
+        async def scenario(client):
+            first = asyncio.ensure_future(client.post("/chat", json={"question": "Question 0"}))
+            while server.running == 0:
+                await asyncio.sleep(0.01)
+            responses = await asyncio.gather(first, *[
+                client.post("/chat", json={"question": f"Question {i}"}) for i in range(1, 4)
+            ])
+            health = await (await client.get("/health")).json()
+            return [r.status for r in responses], health
+
+        statuses, health = serve(server, scenario)
+
+        assert sorted(statuses) == [200, 200, 503, 503]
+        assert statuses[0] == 200
+        assert (health["completed"], health["rejected"]) == (2, 2)
+
+    def test_times_out_slow_runs(self):
+        """Should report an error when the agent takes longer than the timeout."""
+        async def scenario(client):
+            response = await client.post("/chat", json={"question": "What are you?"})
+            return response.status, await response.json()
+
+        status, body = serve(ChatServer(make_chain(latency=1.0), timeout=0.1), scenario)
+
+        assert status == 500
+        assert "0.1 seconds" in body["error"]
+
+
+class TestStubChatModel:
+    """Tests for the StubChatModel class."""
+
+    def test_acts_then_answers_from_observation(self):
+        """Should search the knowledge base first and answer with what it found."""
+        from langchain_core.messages import HumanMessage
+
+        model = StubChatModel()
+        first = model.invoke([HumanMessage(content="Begin!\n\nQuestion: Who is Data?\nThought:")])
+        second = model.invoke([HumanMessage(content=(
+            "Begin!\n\nQuestion: Who is Data?\nThought: x\nAction: tng_knowledge_base\n"
+            "Action Input: Who is Data?\nObservation: An android.\nMore.\nThought: "
+        ))])
+
+        assert "Action Input: Who is Data?" in first.content
+        assert second.content.endswith("Final Answer: An android.")
@@ -0,0 +1,243 @@
+"""
+Unit tests for the shards module.
+Builds real sharded FAISS indexes with fake embeddings.
+"""
+import os
+import pytest
+
+
+@pytest.fixture
+def series_dirs(tmp_path):
+    """Two series: TNG with scripts from seasons 3 and 5, DS9 with one script."""
+    tng = tmp_path / "tng"
+    tng.mkdir()
+    (tng / "150.txt").write_text("\nPICARD\nMake it so.\n\nRIKER\nAye, sir.\n\n")
+    (tng / "203.txt").write_text("\nPICARD\nEngage.\n\nWORF\nShields up.\n\n")
+    ds9 = tmp_path / "ds9"
+    ds9.mkdir()
+    (ds9 / "s01e01.txt").write_text("\nSISKO\nWelcome to the station.\n\n")
+    return {"tng": str(tng), "ds9": str(ds9)}
+
+
+def ingest(shards_path, series_dirs, shard_by="season", **kwargs):
+    from src.shards import ingest_shards
+    return ingest_shards(str(shards_path), series_dirs, shard_by, characters=None, workers=1, **kwargs)
+
+
+def versions(shards_path):
+    from src.shards import list_shards
+    return {name: version_path for name, (version_path, _) in list_shards(str(shards_path)).items()}
+
+
+class TestShardName:
+    """Tests for shard_name."""
+
+    def test_by_series_and_season(self):
+        from src.shards import shard_name
+
+        assert shard_name("tng", "150.txt", "series") == "tng"
+        assert shard_name("tng", "150.txt", "season") == "tng-season3"
+        assert shard_name("ds9", "notes.txt", "season") == "ds9-other"
+
+    def test_rejects_unknown_key(self):
+        from src.shards import shard_name
+
+        with pytest.raises(ValueError):
+            shard_name("tng", "150.txt", "episode")
+
+
+class TestIngestShards:
+    """Tests for building, rebuilding and removing shards."""
+
+    def test_builds_one_shard_per_season(self, fake_embeddings, series_dirs, tmp_path):
+        """Should publish a shard for each series and season with its info."""
+        from src.shards import list_shards
+
+        results = ingest(tmp_path / "shards", series_dirs)
+        shards = list_shards(str(tmp_path / "shards"))
+
+        assert sorted(results) == ["ds9-season1", "tng-season3", "tng-season5"]
+        assert sorted(shards) == sorted(results)
+        assert shards["tng-season3"][1] == {"name": "tng-season3", "series": "tng", "seasons": [3]}
+        assert results["tng-season5"].changed_files == ["203.txt"]
+
+    def test_rebuilds_only_changed_shards(self, fake_embeddings, series_dirs, tmp_path):
+        """Should publish a new version of the changed shard only."""
+        ingest(tmp_path / "shards", series_dirs)
+        before = versions(tmp_path / "shards")
+
+        with open(os.path.join(series_dirs["tng"], "150.txt"), "a") as f:
+            f.write("DATA\nIntriguing.\n\n")
+        results = ingest(tmp_path / "shards", series_dirs)
+        after = versions(tmp_path / "shards")
+
+        assert results["tng-season3"].changed_files == ["150.txt"]
+        assert after["tng-season3"] != before["tng-season3"]
+        assert after["tng-season5"] == before["tng-season5"]
+        assert after["ds9-season1"] == before["ds9-season1"]
+
+    def test_only_rebuilds_named_shards(self, fake_embeddings, series_dirs, tmp_path):
+        """Should leave shards that weren't asked for alone, even when stale."""
+        ingest(tmp_path / "shards", series_dirs)
+        before = versions(tmp_path / "shards")
+
+        with open(os.path.join(series_dirs["tng"], "203.txt"), "a") as f:
+            f.write("DATA\nIntriguing.\n\n")
+        results = ingest(tmp_path / "shards", series_dirs, only=["tng-season3"], full=True)
+
+        assert list(results) == ["tng-season3"]
+        assert versions(tmp_path / "shards")["tng-season5"] == before["tng-season5"]
+
+    def test_prunes_old_versions(self, fake_embeddings, series_dirs, tmp_path):
+        """Should keep only the newest versions of a shard on disk."""
+        for _ in range(4):
+            ingest(tmp_path / "shards", series_dirs, only=["tng-season3"], full=True, keep_versions=2)
+
+        shard_path = tmp_path / "shards" / "tng-season3"
+        assert len([entry for entry in os.listdir(shard_path) if entry.startswith("v")]) == 2
+
+    def test_removes_shards_without_scripts(self, fake_embeddings, series_dirs, tmp_path):
+        """Should drop the shard of a season whose scripts were deleted."""
+        ingest(tmp_path / "shards", series_dirs)
+
+        os.remove(os.path.join(series_dirs["tng"], "203.txt"))
+        results = ingest(tmp_path / "shards", series_dirs)
+
+        assert results["tng-season5"] is None
+        assert "tng-season5" not in versions(tmp_path / "shards")
+
+
+class TestShardSet:
+    """Tests for shard selection, lazy loading and hot swapping."""
+
+    @pytest.fixture
+    def shards_path(self, fake_embeddings, series_dirs, tmp_path):
+        ingest(tmp_path / "shards", series_dirs)
+        return str(tmp_path / "shards")
+
+    def make_set(self, shards_path, **kwargs):
+        from src.shards import ShardSet
+
+        loaded = []
+
+        def load(version_path):
+            loaded.append(version_path)
+            return version_path
+
+        return ShardSet(shards_path, load, aliases={"ds9": ["deep space nine"]}, **kwargs), loaded
+
+    def test_selects_shards_a_query_names(self, shards_path):
+        """Should pick shards by the series and seasons a question names."""
+        shards, _ = self.make_set(shards_path)
+
+        assert sorted(shards.select("What did Picard say in season 3?")) == ["tng-season3"]
+        assert sorted(shards.select("Who runs Deep Space Nine?")) == ["ds9-season1"]
+        assert sorted(shards.select("TNG s5")) == ["tng-season5"]
+        assert len(shards.select("Who is Data?")) == 3
+        assert len(shards.select("season 7")) == 3
+
+    def test_loads_shards_on_first_use(self, shards_path):
+        """Should load nothing up front and each shard once."""
+        shards, loaded = self.make_set(shards_path)
+        assert loaded == []
+
+        selected = shards.select("season 3")
+        shards.retriever(selected["tng-season3"])
+        shards.retriever(selected["tng-season3"])
+
+        assert shards.loaded() == ["tng-season3"]
+        assert shards.loads == 1
+
+    def test_swaps_in_rebuilt_shards(self, shards_path, series_dirs):
+        """Should load a rebuilt shard that was in use and drop the old version."""
+        shards, loaded = self.make_set(shards_path)
+        old = shards.select("season 3")["tng-season3"]
+        shards.retriever(old)
+
+        with open(os.path.join(series_dirs["tng"], "150.txt"), "a") as f:
+            f.write("DATA\nIntriguing.\n\n")
+        ingest(shards_path, series_dirs)
+        shards.refresh()
+        new = shards.select("season 3")["tng-season3"]
+
+        assert new != old
+        assert loaded == [old, new]
+        assert shards.swaps == 1
+        assert shards.loaded() == ["tng-season3"]
+
+    def test_searches_do_not_wait_for_rebuilt_shards(self, shards_path, series_dirs):
+        """Should load a rebuilt shard in the background and keep serving the old one meanwhile."""
+        import time
+        from src.shards import ShardSet
+
+        def load(version_path):
+            time.sleep(0.3)
+            return version_path
+
+        shards = ShardSet(shards_path, load, refresh_interval=0)
+        old = shards.select("season 3")["tng-season3"]
+        shards.retriever(old)
+        with open(os.path.join(series_dirs["tng"], "150.txt"), "a") as f:
+            f.write("DATA\nIntriguing.\n\n")
+        ingest(shards_path, series_dirs)
+
+        start = time.perf_counter()
+        refresher = shards.refresh_in_background()
+        assert time.perf_counter() - start < 0.1
+        assert shards.select("season 3")["tng-season3"] == old
+
+        refresher.join()
+        assert shards.select("season 3")["tng-season3"] != old
+        assert shards.swaps == 1
+
+    def test_refresh_waits_for_interval(self, shards_path, series_dirs):
+        """Should not re-read the shards on every search."""
+        shards, _ = self.make_set(shards_path, refresh_interval=3600)
+
+        os.remove(os.path.join(series_dirs["tng"], "203.txt"))
+        ingest(shards_path, series_dirs)
+        shards.refresh(force=False)
+        assert "tng-season5" in shards.names()
+
+        shards.refresh()
+        assert "tng-season5" not in shards.names()
+
+
+class TestShardedRetriever:
+    """End-to-end tests for scatter-gather search over shards."""
+
+    def test_searches_only_the_shards_a_query_needs(self, fake_embeddings, series_dirs, tmp_path):
+        """Should answer from the named season and load no other shard."""
+        from src.shards import build_sharded_retriever
+
+        ingest(tmp_path / "shards", series_dirs)
+        retriever = build_sharded_retriever(str(tmp_path / "shards"), 10)
+
+        docs = retriever.invoke("What did Picard say in season 3?")
+
+        assert {doc.metadata["episode"] for doc in docs} == {"150.txt"}
+        assert retriever.shards.loaded() == ["tng-season3"]
+
+    def test_merges_results_of_every_shard(self, fake_embeddings, series_dirs, tmp_path):
+        """Should interleave the shards' results by rank and keep the top k."""
+        from src.shards import build_sharded_retriever
+
+        ingest(tmp_path / "shards", series_dirs)
+        retriever = build_sharded_retriever(str(tmp_path / "shards"), 2, hybrid=False)
+
+        docs = retriever.invoke("starship")
+
+        assert len(docs) == 2
+        assert len({doc.metadata["episode"] for doc in docs}) == 2
+        assert len(retriever.shards.loaded()) == 3
+
+    def test_reranks_merged_candidates(self, fake_embeddings, series_dirs, tmp_path):
+        """Should rerank the merged candidates when reranking is on."""
+        from src.retrievers import RerankingRetriever
+        from src.shards import build_sharded_retriever
+
+        ingest(tmp_path / "shards", series_dirs)
+        retriever = build_sharded_retriever(str(tmp_path / "shards"), 10, rerank=True)
+
+        assert isinstance(retriever, RerankingRetriever)
+        assert retriever.invoke("Welcome to the station")[0].page_content == "Welcome to the station."
@@ -0,0 +1,146 @@
+"""
+Unit tests for the tracing module.
+"""
+import json
+import pytest
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.chatbot import build_rag_chain, query_chain, stream_chain, StubChatModel
+from src.tracing import Metrics, Tracer, span, set_tracer
+
+
+class StaticRetriever(BaseRetriever):
+    """Returns the same line for every query, from inside a span."""
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        with span("search", "static"):
+            return [Document(page_content="I am an android.")]
+
+
+def make_chain():
+    chain = build_rag_chain(StaticRetriever(), llm=StubChatModel(), prefetch_tools=[])
+    chain.verbose = False
+    return chain
+
+
+class TestMetrics:
+    """Tests for the Metrics class."""
+
+    def test_renders_counters_and_histograms(self):
+        """Should render cumulative buckets, sum and count in the Prometheus format."""
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.inc("chatbot_turns_total", route="agent")
+        metrics.inc("chatbot_turns_total", 2, route="agent")
+        metrics.observe("chatbot_turn_duration_seconds", 0.05, route="agent")
+        metrics.observe("chatbot_turn_duration_seconds", 0.5, route="agent")
+
+        lines = metrics.render({"chatbot_server_running": ("Running requests.", 3)}).splitlines()
+
+        assert "# TYPE chatbot_turns_total counter" in lines
+        assert 'chatbot_turns_total{route="agent"} 3' in lines
+        assert 'chatbot_turn_duration_seconds_bucket{route="agent",le="0.1"} 1' in lines
+        assert 'chatbot_turn_duration_seconds_bucket{route="agent",le="1.0"} 2' in lines
+        assert 'chatbot_turn_duration_seconds_bucket{route="agent",le="+Inf"} 2' in lines
+        assert 'chatbot_turn_duration_seconds_sum{route="agent"} 0.55' in lines
+        assert "chatbot_server_running 3" in lines
+
+    def test_escapes_label_values(self):
+        metrics = Metrics()
+        metrics.inc("errors_total", name='say "hi"\n')
+
+        assert 'errors_total{name="say \\"hi\\"\\n"} 1' in metrics.render()
+
+
+class TestSpan:
+    """Tests for the span context manager."""
+
+    def test_does_nothing_outside_a_turn(self):
+        with span("search", "faiss") as attributes:
+            attributes["hits"] = 1
+
+    def test_nests_spans_and_records_errors(self):
+        """Should link a span to the enclosing one and mark spans that raised."""
+        tracer = Tracer()
+        with tracer.turn("question") as trace:
+            with span("search", "outer"):
+                with pytest.raises(ValueError):
+                    with span("embedding", "query"):
+                        raise ValueError("boom")
+
+        inner, outer = trace.spans
+        assert inner["parent"] == outer["id"]
+        assert inner["error"] == "ValueError"
+        assert outer["parent"] is None
+
+
+class TestTracer:
+    """Tests for tracing whole chat turns."""
+
+    def test_traces_agent_turn(self, isolated_tracer):
+        """Should record the LLM calls, the tool and the search inside it, with tokens."""
+        query_chain(make_chain(), "What are you?")
+
+        metrics = isolated_tracer.metrics
+        assert metrics.value("chatbot_turns_total", route="none", cached="false", status="ok") == 1
+        assert metrics.value("chatbot_stage_duration_seconds", stage="llm", name="StubChatModel") == 2
+        assert metrics.value("chatbot_stage_duration_seconds", stage="tool", name="tng_knowledge_base") == 1
+        assert metrics.value("chatbot_stage_duration_seconds", stage="search", name="static") == 1
+        assert metrics.value("chatbot_llm_tokens_total", type="input") > 0
+        assert metrics.value("chatbot_llm_tokens_total", type="output") > 0
+
+    def test_writes_jsonl_traces(self, tmp_path):
+        """Should append one JSON line per turn with its spans and timings."""
+        path = tmp_path / "traces.jsonl"
+        tracer = Tracer(str(path), include_question=True)
+        set_tracer(tracer)
+
+        events = list(stream_chain(make_chain(), "What are you?"))
+        query_chain(make_chain(), "Who are you?")
+        tracer.flush()
+
+        traces = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [trace["question"] for trace in traces] == ["What are you?", "Who are you?"]
+        assert traces[0]["trace_id"] == events[-1][1]["trace_id"]
+        assert traces[0]["duration"] > 0
+        llm_spans = [span for span in traces[0]["spans"] if span["stage"] == "llm"]
+        assert len(llm_spans) == 2
+        assert "first_token" in llm_spans[0]
+        assert all(span["output_tokens"] > 0 for span in llm_spans)
+        spans = {span["stage"]: span for span in traces[0]["spans"]}
+        assert spans["retriever"]["parent"] == spans["tool"]["id"]
+        assert spans["search"]["parent"] == spans["retriever"]["id"]
+
+    def test_rotates_traces_and_leaves_out_questions(self, tmp_path):
+        """Should start a new file past max_bytes and write questions only when asked to."""
+        path = tmp_path / "traces.jsonl"
+        tracer = Tracer(str(path), max_bytes=1)
+        set_tracer(tracer)
+
+        query_chain(make_chain(), "What are you?")
+        query_chain(make_chain(), "Who are you?")
+        tracer.flush()
+
+        for file_path in (path, tmp_path / "traces.jsonl.1"):
+            traces = [json.loads(line) for line in file_path.read_text().splitlines()]
+            assert len(traces) == 1
+            assert "question" not in traces[0]
+
+    def test_samples_written_traces(self, tmp_path):
+        """Should keep metrics for every turn but write only the sampled ones."""
+        path = tmp_path / "traces.jsonl"
+        tracer = Tracer(str(path), sample_rate=0.0)
+        set_tracer(tracer)
+
+        query_chain(make_chain(), "What are you?")
+
+        tracer.flush()
+        assert not path.exists()
+        assert tracer.metrics.value("chatbot_turns_total", route="none", cached="false", status="ok") == 1
+
+    def test_disabled_tracer_records_nothing(self):
+        tracer = Tracer(enabled=False)
+        set_tracer(tracer)
+
+        query_chain(make_chain(), "What are you?")
+
+        assert tracer.prometheus() == "\n"
@@ -19,20 +19,36 @@ class TestGetEmbeddings:
         mock_instance = MagicMock()
         mock_ollama.return_value = mock_instance
         
-        result = get_embeddings()
+        result = get_embeddings(cached=False)
         
         mock_ollama.assert_called_once_with(model=EMBEDDING_MODEL_NAME)
         assert result == mock_instance
+    
+    @patch('src.vector_store.OllamaEmbeddings')
+    def test_wraps_embeddings_in_cache(self, mock_ollama):
+        """Should wrap the Ollama client in the persistent cache by default."""
+        from src.vector_store import get_embeddings
+        from src.embedding_cache import CachedEmbeddings
+        from src.config import EMBEDDING_MODEL_NAME
+        
+        mock_instance = MagicMock()
+        mock_ollama.return_value = mock_instance
+        
+        result = get_embeddings()
+        
+        assert isinstance(result, CachedEmbeddings)
+        assert result.embeddings == mock_instance
+        assert result.model_name == EMBEDDING_MODEL_NAME
 
 
 class TestCreateIndexSemantic:
     """Tests for the create_index_semantic function."""
     
-    @patch('src.vector_store.FAISS')
+    @patch('src.vector_store.add_documents_batched')
     @patch('src.vector_store.SemanticChunker')
     @patch('src.vector_store.get_embeddings')
-    def test_creates_semantic_index(self, mock_get_embeddings, mock_chunker, mock_faiss):
-        """Should create FAISS index using semantic chunking."""
+    def test_creates_semantic_index(self, mock_get_embeddings, mock_chunker, mock_add_batched):
+        """Should create FAISS index using SemanticChunker when pooling is off."""
         from src.vector_store import create_index_semantic
         
         # Setup mocks
@@ -45,10 +61,10 @@ class TestCreateIndexSemantic:
         mock_chunker.return_value = mock_splitter
         
         mock_vector_store = MagicMock()
-        mock_faiss.from_documents.return_value = mock_vector_store
+        mock_add_batched.return_value = mock_vector_store
         
         # Execute
-        result = create_index_semantic("Test text content")
+        result = create_index_semantic("Test text content", pooled=False)
         
         # Verify
         mock_get_embeddings.assert_called_once()
@@ -57,17 +73,35 @@ class TestCreateIndexSemantic:
             breakpoint_threshold_type="percentile"
         )
         mock_splitter.create_documents.assert_called_once_with(["Test text content"])
-        mock_faiss.from_documents.assert_called_once_with(mock_docs, mock_embeddings)
+        mock_add_batched.assert_called_once_with(None, mock_docs, embeddings=mock_embeddings)
         assert result == mock_vector_store
 
 
+    def test_pooled_embeds_each_sentence_once(self):
+        """Should index pooled chunk vectors without embedding the chunks again."""
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from src.vector_store import create_index_semantic
+        
+        inner = MagicMock(wraps=DeterministicFakeEmbedding(size=16))
+        text = "Make it so. Engage. Tea, Earl Grey, hot. The warp core is stable."
+        with patch('src.vector_store.get_embeddings', return_value=inner):
+            vector_store = create_index_semantic(text)
+        
+        inner.embed_documents.assert_called_once_with(
+            ["Make it so.", "Engage.", "Tea, Earl Grey, hot.", "The warp core is stable."]
+        )
+        chunks = [doc.page_content for doc in vector_store.docstore._dict.values()]
+        assert " ".join(chunks) == text
+        assert vector_store.index.ntotal == len(chunks)
+
+
 class TestCreateIndexRecursive:
     """Tests for the create_index_recursive function."""
     
-    @patch('src.vector_store.FAISS')
+    @patch('src.vector_store.add_documents_batched')
     @patch('src.vector_store.RecursiveCharacterTextSplitter')
     @patch('src.vector_store.get_embeddings')
-    def test_creates_recursive_index(self, mock_get_embeddings, mock_splitter_class, mock_faiss):
+    def test_creates_recursive_index(self, mock_get_embeddings, mock_splitter_class, mock_add_batched):
         """Should create FAISS index using recursive character splitting."""
         from src.vector_store import create_index_recursive
         
@@ -81,7 +115,7 @@ class TestCreateIndexRecursive:
         mock_splitter_class.return_value = mock_splitter
         
         mock_vector_store = MagicMock()
-        mock_faiss.from_documents.return_value = mock_vector_store
+        mock_add_batched.return_value = mock_vector_store
         
         # Execute
         result = create_index_recursive("Test text content")
@@ -94,10 +128,120 @@ class TestCreateIndexRecursive:
             separators=["\n\n", "\n", ".", " ", ""]
         )
         mock_splitter.create_documents.assert_called_once_with(["Test text content"])
-        mock_faiss.from_documents.assert_called_once_with(mock_docs, mock_embeddings)
+        mock_add_batched.assert_called_once_with(None, mock_docs, embeddings=mock_embeddings)
         assert result == mock_vector_store
 
 
+class TestAddDocumentsBatched:
+    """Tests for the batched, concurrent embedding stage."""
+    
+    @pytest.fixture
+    def docs(self):
+        from langchain_core.documents import Document
+        return [Document(page_content=f"Line {i}", metadata={"n": i}) for i in range(10)]
+    
+    def test_builds_index_in_batches(self, docs):
+        """Should embed in batches of batch_size and keep document order."""
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from src.vector_store import add_documents_batched
+        
+        embeddings = MagicMock(wraps=DeterministicFakeEmbedding(size=8))
+        progress = []
+        ids = [f"id{i}" for i in range(10)]
+        
+        store = add_documents_batched(None, iter(docs), ids=ids, embeddings=embeddings,
+                                      batch_size=3, max_in_flight=2, progress=progress.append)
+        
+        assert embeddings.embed_documents.call_count == 4
+        assert progress == [3, 6, 9, 10]
+        assert list(store.index_to_docstore_id.values()) == ids
+        assert store.docstore.search("id4").metadata == {"n": 4}
+    
+    def test_retries_failed_requests(self, docs):
+        """Should retry a failed embedding request."""
+        from src.vector_store import embed_batches
+        
+        embeddings = MagicMock()
+        embeddings.embed_documents.side_effect = [ConnectionError("busy"), [[0.0]] * 2]
+        batches = [[(docs[0], None), (docs[1], None)]]
+        
+        results = list(embed_batches(embeddings, batches, max_in_flight=1, retries=1, retry_delay=0))
+        
+        assert results == [(batches[0], [[0.0]] * 2)]
+        assert embeddings.embed_documents.call_count == 2
+    
+    def test_limits_requests_in_flight(self, docs):
+        """Should never have more than max_in_flight requests outstanding."""
+        import threading
+        import time
+        from src.vector_store import embed_batches
+        
+        lock = threading.Lock()
+        state = {"current": 0, "peak": 0}
+        
+        def slow_embed(texts):
+            with lock:
+                state["current"] += 1
+                state["peak"] = max(state["peak"], state["current"])
+            time.sleep(0.01)
+            with lock:
+                state["current"] -= 1
+            return [[0.0] for _ in texts]
+        
+        embeddings = MagicMock()
+        embeddings.embed_documents.side_effect = slow_embed
+        batches = [[(doc, None)] for doc in docs]
+        
+        results = list(embed_batches(embeddings, batches, max_in_flight=3))
+        
+        assert [batch for batch, _ in results] == batches
+        assert state["peak"] <= 3
+
+
+class TestApproximateIndexes:
+    """Tests for building, updating and loading approximate index types."""
+    
+    @pytest.fixture
+    def docs(self):
+        from langchain_core.documents import Document
+        return [Document(page_content=f"Line {i}") for i in range(40)]
+    
+    def test_trains_ivf_and_persists_config(self, fake_embeddings, docs, tmp_path):
+        """Should train an IVF index, save its config and apply it on load."""
+        from src.index_factory import default_index_config
+        from src.vector_store import add_documents_batched, save_index, load_index
+        
+        config = default_index_config("ivf")
+        config["nprobe"] = 2
+        store = add_documents_batched(None, docs, ids=[str(i) for i in range(40)],
+                                      embeddings=fake_embeddings, batch_size=8, index_config=config)
+        assert store.index.is_trained
+        assert store.index.ntotal == 40
+        
+        save_index(store, str(tmp_path), config)
+        loaded = load_index(str(tmp_path))
+        tuned = load_index(str(tmp_path), nprobe=7)
+        
+        assert loaded.index.nprobe == 2
+        assert tuned.index.nprobe == 7
+        assert loaded.similarity_search("Line 3", k=1)[0].page_content == "Line 3"
+    
+    def test_deletes_from_hnsw_by_rebuilding(self, fake_embeddings, docs):
+        """Should remove documents from an HNSW index."""
+        from src.index_factory import default_index_config
+        from src.vector_store import add_documents_batched, delete_documents
+        
+        config = default_index_config("hnsw")
+        store = add_documents_batched(None, docs[:5], ids=list("abcde"),
+                                      embeddings=fake_embeddings, index_config=config)
+        
+        delete_documents(store, ["b", "d"], config)
+        
+        assert store.index.ntotal == 3
+        assert store.index_to_docstore_id == {0: "a", 1: "c", 2: "e"}
+        assert store.similarity_search("Line 2", k=1)[0].page_content == "Line 2"
+
+
 class TestSaveIndex:
     """Tests for the save_index function."""
     
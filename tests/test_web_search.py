@@ -0,0 +1,107 @@
+"""
+Unit tests for the web_search module.
+Tests the search service cache, timeout and concurrency limit with the offline fixture backend.
+"""
+import json
+import threading
+import time
+import pytest
+from src.web_search import SearchService, FixtureBackend, set_search_service, get_search_service
+
+RESULTS = [{"title": "Data", "href": "https://example.com/data", "body": "An android."}]
+
+
+class TestFixtureBackend:
+    """Tests for the FixtureBackend class."""
+    
+    def test_answers_from_fixtures(self, tmp_path):
+        path = tmp_path / "fixture.json"
+        path.write_text(json.dumps({"Who is Data?": RESULTS, "*": []}))
+        backend = FixtureBackend.from_file(str(path))
+        
+        assert backend.text("who is data", 5) == RESULTS
+        assert backend.text("anything else", 5) == []
+
+
+class TestSearchService:
+    """Tests for the SearchService class."""
+    
+    def test_caches_in_memory(self):
+        backend = FixtureBackend({"*": RESULTS})
+        service = SearchService(backend)
+        
+        assert service.search("Who is Data?") == RESULTS
+        assert service.search("who is data") == RESULTS
+        assert backend.calls == 1
+        assert (service.hits, service.misses) == (1, 1)
+    
+    def test_caches_on_disk(self, tmp_path):
+        path = str(tmp_path / "cache.json")
+        SearchService(FixtureBackend({"*": RESULTS}), cache_path=path).search("Who is Data?")
+        
+        backend = FixtureBackend({})
+        assert SearchService(backend, cache_path=path).search("Who is Data?") == RESULTS
+        assert backend.calls == 0
+    
+    def test_expired_entries_are_refetched(self):
+        backend = FixtureBackend({"*": RESULTS})
+        service = SearchService(backend, cache_ttl=0)
+        service.search("q")
+        time.sleep(0.01)
+        service.search("q")
+        assert backend.calls == 2
+    
+    def test_hard_timeout(self):
+        service = SearchService(FixtureBackend({"*": RESULTS}, latency=0.5), timeout=0.05)
+        with pytest.raises(TimeoutError):
+            service.search("slow query")
+    
+    def test_limits_concurrency(self):
+        """Should never run more than max_concurrent backend calls at once."""
+        lock = threading.Lock()
+        state = {"current": 0, "peak": 0}
+        
+        class SlowBackend:
+            def text(self, query, max_results):
+                with lock:
+                    state["current"] += 1
+                    state["peak"] = max(state["peak"], state["current"])
+                time.sleep(0.02)
+                with lock:
+                    state["current"] -= 1
+                return RESULTS
+        
+        service = SearchService(SlowBackend(), max_concurrent=2)
+        threads = [threading.Thread(target=service.search, args=(f"query {i}",)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert state["peak"] == 2
+    
+    def test_errors_are_not_cached(self):
+        class FlakyBackend:
+            calls = 0
+            def text(self, query, max_results):
+                self.calls += 1
+                if self.calls == 1:
+                    raise ConnectionError("offline")
+                return RESULTS
+        
+        service = SearchService(FlakyBackend())
+        with pytest.raises(ConnectionError):
+            service.search("q")
+        assert service.search("q") == RESULTS
+
+
+class TestSharedService:
+    """Tests for get_search_service and set_search_service."""
+    
+    def test_set_replaces_shared_service(self):
+        service = SearchService(FixtureBackend({"*": RESULTS}))
+        set_search_service(service)
+        try:
+            assert get_search_service() is service
+        finally:
+            set_search_service(None)